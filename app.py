@@ -1,67 +1,378 @@
-from flask import Flask, request, jsonify
-from flask_cors import CORS
-from src.model.QuestionAnswerModel import QuestionAnswerModel, EmbeddingsOptions, ChainOptions, LanguageModelOptions
+import asyncio
+import functools
+import json
+from quart import Quart, Response, request, jsonify
+from quart_cors import cors
+from src.jobs.DirectoryWatcher import DirectoryWatcher
+from src.jobs.IngestJobQueue import IngestJobQueue
+from src.jobs.StartupTask import StartupStage, StartupTask
+from src.inputs.InputFile import InputFileType
 from src.parsers.FileParser import FileParser
-from src.storage.VectorStore import VectorStoreOptions
+from src.storage.TitleIndex import ChunkFilter
 from src.cfg.config import *
 from src.cfg.logging_config import *
 import os
 
-app = Flask(__name__)
-CORS(app, resources={r"/*": {"origins": "http://localhost:3000"}})  # Allow requests from localhost:3000
+# Uploaded documents are stored under paths in this directory, which identify them but are never written
+UPLOAD_DIRECTORY = '../temp'
 
-# Initialize the QuestionAnswerModel
-model = QuestionAnswerModel(EmbeddingsOptions.DEFAULT, ChainOptions.DEFAULT, VectorStoreOptions.DEFAULT,
-                            LanguageModelOptions.DEFAULT)
+app = Quart(__name__)
+app = cors(app, allow_origin="http://localhost:3000")  # Allow requests from localhost:3000
 
-logger.info("Adding setup documents to vector store")
+# The model is loaded by the startup task, so the server binds and answers probes before it is ready
+model = None
 
-setup_docs = FileParser.parse_directory("./data/bumble_documents")
-for doc in setup_docs:
-    model.add_document(doc)
+# Uploads and watched file changes are parsed and embedded in the background so they never hold up queries
+ingest_jobs = IngestJobQueue()
 
-logger.info("Done adding setup documents to vector store")
 
+def load_model():
+    """
+    Initialize the QuestionAnswerModel, importing its backends on first use.
 
-# Route for querying
+    Returns:
+        QuestionAnswerModel: The model.
+    """
+    from src.model.QuestionAnswerModel import QuestionAnswerModel, EmbeddingsOptions, ChainOptions, \
+        LanguageModelOptions
+    from src.rerankers.Reranker import RerankerOptions
+    from src.storage.VectorStore import VectorStoreOptions
+
+    os.environ.setdefault("TIKTOKEN_CACHE_DIR", TIKTOKEN_CACHE_DIR)
+    vector_store_type = VectorStoreOptions(VECTOR_STORE_TYPE)
+    vector_store_config = dict(VECTOR_STORE_CONFIG)
+    if vector_store_type in (VectorStoreOptions.NUMPY, VectorStoreOptions.HNSW):
+        vector_store_config.update(QUANTIZATION_CONFIG)
+    if vector_store_type == VectorStoreOptions.HNSW:
+        vector_store_config.update(HNSW_CONFIG)
+    return QuestionAnswerModel(EmbeddingsOptions(EMBEDDINGS_TYPE), ChainOptions.DEFAULT, vector_store_type,
+                               LanguageModelOptions(LANGUAGE_MODEL_TYPE), persist_directory=PERSIST_DIRECTORY,
+                               embedding_cache_path=EMBEDDING_CACHE_PATH, vector_store_config=vector_store_config,
+                               answer_cache_config=ANSWER_CACHE_CONFIG, reranker=RerankerOptions(RERANKER_TYPE),
+                               rerank_config=RERANK_CONFIG, context_config=CONTEXT_CONFIG,
+                               embeddings_config=EMBEDDINGS_CONFIG, language_model_config=LANGUAGE_MODEL_CONFIG,
+                               run_in_background=ingest_jobs.execute)
+
+
+def on_watched_changes(changed_paths, deleted_paths):
+    """
+    Queue a job bringing the model up to date with changed and deleted watched files.
+
+    Args:
+        changed_paths (list[str]): The paths to the created or modified files.
+        deleted_paths (list[str]): The paths to the deleted files.
+
+    Returns:
+        None
+    """
+    ingest_jobs.submit("Sync {} changed and {} deleted watched files".format(len(changed_paths), len(deleted_paths)),
+                       model.sync_files, changed_paths, deleted_paths, batch_pages=INGEST_BATCH_PAGES,
+                       workers=PARSER_WORKERS)
+
+
+def start_up(task):
+    """
+    Load the model, add the setup documents and start watching them.
+
+    Args:
+        task (StartupTask): The task running the startup, to report progress to.
+
+    Returns:
+        None
+    """
+    global model
+    task.set_stage(StartupStage.LOADING_MODEL)
+    model = load_model()
+
+    # The watcher lists the files before the setup documents are added, so files changed meanwhile are synced later
+    watcher = DirectoryWatcher(DOCUMENT_DIRECTORIES, on_watched_changes, **WATCH_CONFIG)
+
+    task.set_stage(StartupStage.INGESTING)
+    # Files already persisted with the same content are skipped, so only new or changed files are embedded, and
+    # documents of files deleted while the server was down are removed
+    for document_directory in DOCUMENT_DIRECTORIES:
+        model.ingest_directory(document_directory, batch_pages=INGEST_BATCH_PAGES, workers=PARSER_WORKERS,
+                               on_progress=lambda files_done, files_total: task.set_progress(
+                                   directory=document_directory, files_done=files_done, files_total=files_total))
+
+    if WATCH_DOCUMENTS:
+        watcher.start()
+
+
+startup = StartupTask(start_up)
+
+
+@app.before_serving
+async def start_startup():
+    startup.start()
+
+
+def requires_model(route):
+    """
+    Answer requests to a route with 503 Service Unavailable until the startup has finished.
+
+    Args:
+        route (Callable): The route handler, which uses the model.
+
+    Returns:
+        Callable: The guarded route handler.
+    """
+    @functools.wraps(route)
+    async def guarded_route(*args, **kwargs):
+        if not startup.is_ready:
+            return jsonify({'error': 'The model is not ready', 'startup': startup.status()}), 503
+        return await route(*args, **kwargs)
+
+    return guarded_route
+
+
+def read_uploads(uploads):
+    """
+    Read uploaded files into memory, with the supported files of archives.
+
+    Uploads are read straight from the request stream and never written to disk: each is
+    stored under a path in the upload directory, which only identifies the document.
+
+    Args:
+        uploads (list[FileStorage]): The uploaded files.
+
+    Returns:
+        tuple[dict, list[dict]]: A mapping of the path of each accepted file to its content, and
+            the file name and status ('accepted' or 'rejected', with the reason) of each file in
+            the uploads.
+    """
+    contents, results = {}, []
+    for upload in uploads:
+        file_name = os.path.basename(upload.filename or '')
+        try:
+            if FileParser.is_archive(file_name):
+                files = FileParser.read_archive(upload.stream, file_name)
+            else:
+                files = [(file_name, upload.stream.read())]
+                if FileParser.sniff_type(files[0][1], file_name) == InputFileType.UNKNOWN:
+                    raise ValueError("Unsupported file format")
+        except ValueError as e:
+            results.append({'file': file_name, 'status': 'rejected', 'error': str(e)})
+            continue
+        for name, content in files:
+            file_path = os.path.join(UPLOAD_DIRECTORY, name)
+            # Documents are titled by file name, so a name can only be added once per request
+            if file_path in contents:
+                results.append({'file': name, 'status': 'rejected', 'error': 'Duplicate file name'})
+            else:
+                contents[file_path] = content
+                results.append({'file': name, 'status': 'accepted'})
+    return contents, results
+
+
+def add_uploaded_files(contents):
+    """
+    Parse uploaded files in parallel from memory and add them to the model.
+
+    Args:
+        contents (dict): A mapping of the path of each uploaded file to its content.
+
+    Returns:
+        list[dict]: The outcome of each file, as reported by the model.
+    """
+    return model.add_files(list(contents), batch_pages=INGEST_BATCH_PAGES, workers=PARSER_WORKERS,
+                           contents=contents)
+
+
+def add_document_paths(doc_paths):
+    """
+    Parse files already on the server in parallel and add them to the model.
+
+    Args:
+        doc_paths (list[str]): The paths of the files.
+
+    Returns:
+        list[dict]: The outcome of each file, as reported by the model.
+    """
+    return model.add_files(doc_paths, batch_pages=INGEST_BATCH_PAGES, workers=PARSER_WORKERS)
+
+
+def find_document(document_id):
+    """
+    Find a document stored in the model.
+
+    Args:
+        document_id (str): The id of the document.
+
+    Returns:
+        dict: The document as listed by the model, or None if it is not stored.
+    """
+    return next((document for document in model.list_documents() if document['document_id'] == document_id), None)
+
+
+def parse_chunk_filter(data):
+    """
+    Read the optional document and page filter of a query.
+
+    Args:
+        data (dict): The JSON body of the query, which may hold a list of document 'titles' (or a
+            single title) and a 'first_page' and 'last_page'.
+
+    Returns:
+        ChunkFilter: The filter, or None if the query is not restricted.
+
+    Raises:
+        ValueError: If the titles are not strings or the pages are not integers.
+    """
+    titles = data.get('titles')
+    first_page, last_page = data.get('first_page'), data.get('last_page')
+    if titles is None and first_page is None and last_page is None:
+        return None
+    if isinstance(titles, str):
+        titles = [titles]
+    if titles is not None and (not isinstance(titles, list) or not all(isinstance(title, str) for title in titles)):
+        raise ValueError("titles must be a list of document titles")
+    if any(page is not None and (not isinstance(page, int) or isinstance(page, bool))
+           for page in (first_page, last_page)):
+        raise ValueError("first_page and last_page must be page numbers")
+    return ChunkFilter(None if titles is None else tuple(titles), first_page, last_page)
+
+
+# Route for querying, optionally restricted to some documents and pages
 @app.route('/query', methods=['POST'])
-def query():
-    data = request.get_json()
+@requires_model
+async def query():
+    data = await request.get_json()
     question = data['question']
-    answer = model.ask(question)
+    try:
+        chunk_filter = parse_chunk_filter(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    answer = await model.aask(question, chunk_filter)
     return jsonify({'answer': answer})
 
 
-# Route for adding documents
+# Route for asking a batch of questions at once, optionally restricted to some documents and pages
+@app.route('/queryBatch', methods=['POST'])
+@requires_model
+async def query_batch():
+    data = await request.get_json()
+    questions = data.get('questions')
+    if not isinstance(questions, list) or not questions or not all(isinstance(question, str) for question in questions):
+        return jsonify({'error': 'questions must be a non-empty list of questions'}), 400
+    if len(questions) > QUERY_BATCH_CONFIG['max_questions']:
+        return jsonify({'error': 'At most {} questions can be asked at once'.format(
+            QUERY_BATCH_CONFIG['max_questions'])}), 400
+    try:
+        chunk_filter = parse_chunk_filter(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    answers = await model.aask_many(questions, chunk_filter, max_concurrency=QUERY_BATCH_CONFIG['max_concurrency'])
+    return jsonify({'answers': [{'question': question, 'answer': answer}
+                                for question, answer in zip(questions, answers)]})
+
+
+# Route for querying with the answer streamed as server-sent events while it is generated
+@app.route('/query/stream', methods=['POST'])
+@requires_model
+async def query_stream():
+    data = await request.get_json()
+    question = data['question']
+    try:
+        chunk_filter = parse_chunk_filter(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    async def events():
+        async for token in model.aask_stream(question, chunk_filter):
+            yield 'data: {}\n\n'.format(json.dumps({'token': token}))
+        yield 'event: done\ndata: {}\n\n'
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# Route for adding documents: any number of uploaded files and zip or tar archives of them, sent as
+# multipart 'files' (or a single 'file'), or a JSON list of 'documents' already on the server
 @app.route('/addDocuments', methods=['POST'])
-def add_documents():
-    if 'file' in request.files:
-        # If the request contains a file, handle file upload
-        file = request.files['file']
-        if file.filename == '':
-            return jsonify({'error': 'No selected file'})
-        file_path = os.path.join('../temp', file.filename)
-        file.save(file_path)
-        doc = FileParser.parse_file(file_path)
-        model.add_document(doc)
-        os.remove(file_path)
-        return jsonify({'message': 'Document added successfully'})
-    elif 'documents' in request.json:
-        # If the request contains JSON data, handle adding documents from JSON
-        data = request.json
+@requires_model
+async def add_documents():
+    files = await request.files
+    data = await request.get_json(silent=True)
+    uploads = [upload for upload in files.getlist('files') + files.getlist('file') if upload.filename]
+    if uploads:
+        # Read the uploads off the event loop and add them in one background job
+        contents, results = await asyncio.to_thread(read_uploads, uploads)
+        if not contents:
+            return jsonify({'error': 'No supported files', 'files': results}), 400
+        job_id = ingest_jobs.submit("Add {} uploaded files".format(len(contents)), add_uploaded_files, contents)
+        return jsonify({'message': 'Documents accepted for processing', 'job_id': job_id, 'files': results}), 202
+    elif data and 'documents' in data:
+        # If the request contains JSON data, add the listed documents in a background job
         doc_paths = data['documents']
-        docs = []
-        for doc_path in doc_paths:
-            doc = FileParser.parse_file(doc_path)
-            docs.append(doc)
-        for doc in docs:
-            model.add_document(doc)
-        return jsonify({'message': 'Documents added successfully'})
+        job_id = ingest_jobs.submit("Add {} documents".format(len(doc_paths)), add_document_paths, doc_paths)
+        return jsonify({'message': 'Documents accepted for processing', 'job_id': job_id}), 202
+    elif 'file' in files or 'files' in files:
+        return jsonify({'error': 'No selected file'})
     else:
         return jsonify({'error': 'Invalid request'})
 
 
+# Route for listing the stored documents and their ids
+@app.route('/documents', methods=['GET'])
+@requires_model
+async def list_documents():
+    return jsonify({'documents': model.list_documents()})
+
+
+# Route for replacing the content of a stored document, writing only the chunks that changed
+@app.route('/documents/<document_id>', methods=['PUT'])
+@requires_model
+async def replace_document(document_id):
+    document = find_document(document_id)
+    if document is None:
+        return jsonify({'error': 'Unknown document'}), 404
+    files = await request.files
+    if 'file' not in files or files['file'].filename == '':
+        return jsonify({'error': 'No selected file'}), 400
+    file = files['file']
+    file_path = document['path']
+    if os.path.splitext(file.filename)[1].lower() != os.path.splitext(file_path)[1].lower():
+        return jsonify({'error': 'The file type of a document cannot change'}), 400
+    # The new content is only held in memory and never overwrites a file on the server. A file the
+    # document was stored from is detached instead, so a restart keeps the new content.
+    content = await asyncio.to_thread(file.stream.read)
+    job_id = ingest_jobs.submit("Replace document {}".format(document_id), add_uploaded_files, {file_path: content})
+    return jsonify({'message': 'Document accepted for processing', 'job_id': job_id}), 202
+
+
+# Route for deleting a stored document. A file it was stored from is left on the server but never added back.
+@app.route('/documents/<document_id>', methods=['DELETE'])
+@requires_model
+async def delete_document(document_id):
+    document = find_document(document_id)
+    if document is None:
+        return jsonify({'error': 'Unknown document'}), 404
+    job_id = ingest_jobs.submit("Delete document {}".format(document_id), model.delete_document, document_id)
+    return jsonify({'message': 'Document deletion accepted', 'job_id': job_id}), 202
+
+
+# Route for liveness probes, answered as soon as the server is up
+@app.route('/health', methods=['GET'])
+async def health():
+    return jsonify({'status': 'ok'})
+
+
+# Route for readiness probes, answered with 200 once the model is loaded and the setup documents are
+# added, and with 503 and the startup stage and progress until then
+@app.route('/ready', methods=['GET'])
+async def ready():
+    return jsonify(startup.status()), 200 if startup.is_ready else 503
+
+
+# Route for checking the status of a background ingestion job
+@app.route('/jobs/<job_id>', methods=['GET'])
+async def job_status(job_id):
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job)
+
+
 if __name__ == '__main__':
-    # Create a temporary directory for file uploads
-    os.makedirs('../temp', exist_ok=True)
     app.run(port=5000)
@@ -0,0 +1,173 @@
+import argparse
+import time
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from src.inputs.TextInputFile import TextInputFile
+from src.storage.HnswVectorStore import HnswVectorStore
+from src.storage.NumpyVectorStore import NumpyVectorStore, QuantizationOptions
+from src.cfg.logging_config import *
+
+PAGES_PER_FILE = 10_000
+
+
+class SyntheticEmbeddings(Embeddings):
+    """
+    Embeddings looking up precomputed vectors by text, so stores can be benchmarked on synthetic embedding sets.
+
+    Attributes:
+        vectors (dict): A mapping of text to its vector.
+    """
+
+    def __init__(self, vectors: dict):
+        """
+        Initialize a SyntheticEmbeddings object.
+
+        Args:
+            vectors (dict): A mapping of text to its vector.
+        """
+        self.vectors = vectors
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """
+        Look up the vectors of texts.
+
+        Args:
+            texts (list[str]): The texts.
+
+        Returns:
+            list[list[float]]: The vectors.
+        """
+        return [self.vectors[text] for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        """
+        Look up the vector of a query.
+
+        Args:
+            text (str): The query.
+
+        Returns:
+            list[float]: The vector.
+        """
+        return self.vectors[text]
+
+
+def synthetic_embeddings(chunks: int, queries: int, dimension: int, clusters: int) -> tuple:
+    """
+    Draw chunk and query embeddings around random cluster centres, as real embeddings are clustered by topic.
+
+    Args:
+        chunks (int): The number of chunk embeddings.
+        queries (int): The number of query embeddings.
+        dimension (int): The dimension of the embeddings.
+        clusters (int): The number of clusters.
+
+    Returns:
+        tuple: The chunk texts, the query texts, their normalized embeddings as two matrices,
+            and the SyntheticEmbeddings looking them up.
+    """
+    generator = np.random.default_rng(0)
+    centres = generator.standard_normal((clusters, dimension), dtype=np.float32)
+    chunk_vectors = centres[generator.integers(clusters, size=chunks)] + \
+        generator.standard_normal((chunks, dimension), dtype=np.float32)
+    query_vectors = centres[generator.integers(clusters, size=queries)] + \
+        generator.standard_normal((queries, dimension), dtype=np.float32)
+    chunk_vectors = NumpyVectorStore.normalize(chunk_vectors)
+    query_vectors = NumpyVectorStore.normalize(query_vectors)
+    chunk_texts = ["chunk-{}".format(i) for i in range(chunks)]
+    query_texts = ["query-{}".format(i) for i in range(queries)]
+    vectors = dict(zip(chunk_texts, chunk_vectors))
+    vectors.update(zip(query_texts, query_vectors))
+    return chunk_texts, query_texts, chunk_vectors, query_vectors, SyntheticEmbeddings(vectors)
+
+
+def fill(store: NumpyVectorStore, chunk_texts: list[str]) -> float:
+    """
+    Add the chunks to a store.
+
+    Args:
+        store (NumpyVectorStore): The store.
+        chunk_texts (list[str]): The chunk texts, one page each.
+
+    Returns:
+        float: The number of seconds taken.
+    """
+    start = time.perf_counter()
+    for first_page in range(0, len(chunk_texts), PAGES_PER_FILE):
+        store.add_document(TextInputFile(name="synthetic.txt", path="synthetic.txt",
+                                         pages=chunk_texts[first_page:first_page + PAGES_PER_FILE],
+                                         page_offset=first_page))
+    return time.perf_counter() - start
+
+
+def measure(store: NumpyVectorStore, query_texts: list[str], truth: list[set], k: int) -> tuple:
+    """
+    Time the queries against a store and compare the results with the exact nearest neighbours.
+
+    Args:
+        store (NumpyVectorStore): The store.
+        query_texts (list[str]): The query texts.
+        truth (list[set]): The texts of the exact k nearest neighbours of each query.
+        k (int): The number of chunks retrieved per query.
+
+    Returns:
+        tuple: The recall at k, and the median and 95th percentile latency in milliseconds.
+    """
+    timings = []
+    found = 0
+    for query_text, neighbours in zip(query_texts, truth):
+        start = time.perf_counter()
+        docs = store.search(query_text, k, store.published_epoch)
+        timings.append(time.perf_counter() - start)
+        found += len(neighbours.intersection(doc.page_content for doc in docs))
+    return found / (k * len(query_texts)), np.percentile(timings, 50) * 1000, np.percentile(timings, 95) * 1000
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure HNSW and int8 quantization recall against latency on "
+                                                 "synthetic embeddings.")
+    parser.add_argument("--chunks", type=int, default=100_000, help="Number of synthetic chunk embeddings")
+    parser.add_argument("--queries", type=int, default=500, help="Number of synthetic queries")
+    parser.add_argument("--dimension", type=int, default=384, help="Dimension of the embeddings")
+    parser.add_argument("--clusters", type=int, default=1000, help="Number of clusters the embeddings are drawn around")
+    parser.add_argument("--k", type=int, default=4, help="Chunks retrieved per query")
+    parser.add_argument("--m", type=int, nargs="+", default=[8, 16, 32], help="HNSW neighbours per row")
+    parser.add_argument("--ef-construction", type=int, nargs="+", default=[100, 200], help="HNSW build candidates")
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128, 256],
+                        help="HNSW search candidates")
+    parser.add_argument("--rescore-candidates", type=int, nargs="+", default=[8, 16, 32, 64],
+                        help="Rows rescored against full vectors with int8 quantization")
+    args = parser.parse_args()
+
+    chunk_texts, query_texts, chunk_vectors, query_vectors, embeddings = synthetic_embeddings(
+        args.chunks, args.queries, args.dimension, args.clusters)
+    scores = query_vectors @ chunk_vectors.T
+    truth = [set(chunk_texts[row] for row in np.argpartition(-query_scores, args.k - 1)[:args.k])
+             for query_scores in scores]
+    logger.info("Benchmarking {} chunks of dimension {} with {} queries", args.chunks, args.dimension, args.queries)
+
+    exact_store = NumpyVectorStore(embeddings, embedding_concurrency=1)
+    build_seconds = fill(exact_store, chunk_texts)
+    recall, p50, p95 = measure(exact_store, query_texts, truth, args.k)
+    logger.info("exact             | build {:7.2f}s | recall@{} {:.3f} | p50 {:7.3f} ms | p95 {:7.3f} ms",
+                build_seconds, args.k, recall, p50, p95)
+    del exact_store
+
+    quantized_store = NumpyVectorStore(embeddings, embedding_concurrency=1, quantization=QuantizationOptions.INT8)
+    build_seconds = fill(quantized_store, chunk_texts)
+    for rescore_candidates in args.rescore_candidates:
+        quantized_store.rescore_candidates = rescore_candidates
+        recall, p50, p95 = measure(quantized_store, query_texts, truth, args.k)
+        logger.info("int8 rescore {:4} | build {:7.2f}s | recall@{} {:.3f} | p50 {:7.3f} ms | p95 {:7.3f} ms",
+                    rescore_candidates, build_seconds, args.k, recall, p50, p95)
+    del quantized_store
+
+    for m in args.m:
+        for ef_construction in args.ef_construction:
+            store = HnswVectorStore(embeddings, embedding_concurrency=1, hnsw_m=m, hnsw_ef_construction=ef_construction)
+            build_seconds = fill(store, chunk_texts)
+            for ef_search in args.ef_search:
+                store.hnsw_ef_search = ef_search
+                recall, p50, p95 = measure(store, query_texts, truth, args.k)
+                logger.info("M {:3} efC {:4} efS {:4} | build {:7.2f}s | recall@{} {:.3f} | p50 {:7.3f} ms | "
+                            "p95 {:7.3f} ms", m, ef_construction, ef_search, build_seconds, args.k, recall, p50, p95)
@@ -0,0 +1,75 @@
+import argparse
+import time
+import numpy as np
+from src.storage.KeywordIndex import KeywordIndex
+from src.cfg.logging_config import *
+
+CHUNKS_PER_BATCH = 1000
+
+
+def synthetic_chunks(chunks: int, chunk_words: int, vocabulary: int) -> list[str]:
+    """
+    Draw chunk texts from a vocabulary with Zipf-distributed word frequencies, as in natural text.
+
+    Args:
+        chunks (int): The number of chunks.
+        chunk_words (int): The number of words in each chunk.
+        vocabulary (int): The number of distinct words.
+
+    Returns:
+        list[str]: The chunk texts.
+    """
+    generator = np.random.default_rng(0)
+    words = np.array(["w{}".format(word) for word in range(vocabulary)])
+    texts = []
+    for start in range(0, chunks, CHUNKS_PER_BATCH):
+        batch = min(CHUNKS_PER_BATCH, chunks - start)
+        word_ids = (generator.zipf(1.1, size=(batch, chunk_words)) - 1) % vocabulary
+        texts.extend(" ".join(row) for row in words[word_ids])
+    return texts
+
+
+def index_size_mb(index: KeywordIndex) -> float:
+    """
+    Get the size of the postings and per-chunk arrays of an index.
+
+    Args:
+        index (KeywordIndex): The index.
+
+    Returns:
+        float: The size in MB.
+    """
+    return sum(segment.ids.nbytes + segment.lengths.nbytes + segment.term_ids.nbytes + segment.offsets.nbytes +
+               segment.docs.nbytes + segment.frequencies.nbytes for segment in index._segments) / 1e6
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure keyword index build time and BM25 query latency.")
+    parser.add_argument("--chunks", type=int, default=1_000_000, help="Number of synthetic chunks")
+    parser.add_argument("--chunk-words", type=int, default=100, help="Words per chunk")
+    parser.add_argument("--vocabulary", type=int, default=200_000, help="Number of distinct words")
+    parser.add_argument("--queries", type=int, default=500, help="Number of timed queries")
+    parser.add_argument("--query-words", type=int, default=4, help="Words per query, taken from a random chunk")
+    parser.add_argument("--k", type=int, default=20, help="Chunks retrieved per query")
+    args = parser.parse_args()
+
+    logger.info("Benchmarking {} chunks of {} words", args.chunks, args.chunk_words)
+    texts = synthetic_chunks(args.chunks, args.chunk_words, args.vocabulary)
+    index = KeywordIndex()
+    start = time.perf_counter()
+    for first in range(0, args.chunks, CHUNKS_PER_BATCH):
+        index.add(["chunk-{}".format(number) for number in range(first, min(first + CHUNKS_PER_BATCH, args.chunks))],
+                  texts[first:first + CHUNKS_PER_BATCH])
+    build_seconds = time.perf_counter() - start
+
+    generator = np.random.default_rng(1)
+    queries = [" ".join(generator.choice(texts[generator.integers(args.chunks)].split(), args.query_words))
+               for _ in range(args.queries)]
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, args.k)
+        timings.append(time.perf_counter() - start)
+    logger.info("build {:7.1f}s | {} segments | {:7.1f} MB | p50 {:6.2f} ms | p95 {:6.2f} ms", build_seconds,
+                len(index._segments), index_size_mb(index), np.percentile(timings, 50) * 1000,
+                np.percentile(timings, 95) * 1000)
@@ -0,0 +1,74 @@
+import argparse
+import time
+from src.segmenters.SentenceSegmenter import SentenceSegmenter, SentenceSegmenterOptions
+from src.cfg.logging_config import *
+
+SAMPLE_PARAGRAPH = (
+    "Bumble Inc. reported total revenue of $1,051.8 million for the year, an increase of 16.3%. "
+    "Paying users grew to 4.0 million! Mr. Jones, the CFO, noted that Bumble App revenue rose 19.1% "
+    "year over year. Did the Badoo App and Other revenue decline? It decreased 4.6% (see Note 3). "
+    "\"We expect continued growth in 2024,\" management said on the call with the U.S. investors.\n"
+)
+
+
+def load_text(file_paths: list[str], repeat: int) -> str:
+    """
+    Load the benchmark text from files, or repeat a sample paragraph if no files are given.
+
+    Args:
+        file_paths (list[str]): The paths to the text files.
+        repeat (int): The number of times the sample paragraph is repeated.
+
+    Returns:
+        str: The benchmark text.
+    """
+    if not file_paths:
+        return SAMPLE_PARAGRAPH * repeat
+    texts = []
+    for file_path in file_paths:
+        with open(file_path, "r") as file:
+            texts.append(file.read())
+    return "\n".join(texts)
+
+
+def benchmark(option: SentenceSegmenterOptions, text: str, rounds: int) -> None:
+    """
+    Time a sentence segmenter on a text and log its load time, throughput and sentence count.
+
+    Args:
+        option (SentenceSegmenterOptions): The sentence segmenter option.
+        text (str): The benchmark text.
+        rounds (int): The number of timed segmentation rounds.
+
+    Returns:
+        None
+    """
+    start = time.perf_counter()
+    try:
+        segmenter = SentenceSegmenter.get(option)
+    except (ImportError, LookupError) as e:
+        logger.warning("Skipping {} segmenter, it could not be loaded ({})", option.value, type(e).__name__)
+        return
+    load_seconds = time.perf_counter() - start
+
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        sentences = segmenter.tokenize(text)
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    logger.info("{:>6} | load {:7.3f}s | best {:7.3f}s | {:8.1f} MB/s | {} sentences", option.value, load_seconds,
+                best, len(text) / best / 1e6, len(sentences))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare sentence segmenters on large text files.")
+    parser.add_argument("files", nargs="*", help="Text files to segment (defaults to a synthetic corpus)")
+    parser.add_argument("--repeat", type=int, default=20_000, help="Sample paragraph repetitions without files")
+    parser.add_argument("--rounds", type=int, default=3, help="Timed rounds per segmenter")
+    args = parser.parse_args()
+
+    benchmark_text = load_text(args.files, args.repeat)
+    logger.info("Segmenting {:.1f} MB of text", len(benchmark_text) / 1e6)
+    for segmenter_option in (SentenceSegmenterOptions.PUNKT, SentenceSegmenterOptions.REGEX):
+        benchmark(segmenter_option, benchmark_text, args.rounds)
@@ -0,0 +1,62 @@
+import argparse
+import os
+import subprocess
+import sys
+from src.cfg.logging_config import *
+
+# Modules that must only be imported once the startup task loads the model, not when app.py is imported
+LAZY_MODULES = ("langchain", "langchain_openai", "langchain_community", "chromadb", "hnswlib", "PyPDF2", "nltk",
+                "tiktoken", "numpy")
+
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def profile_import(module: str) -> list[tuple[str, int, int]]:
+    """
+    Import a module in a fresh interpreter and collect the time each module took to import.
+
+    Args:
+        module (str): The name of the module imported.
+
+    Returns:
+        list[tuple[str, int, int]]: The name, own import time and cumulative import time in
+            microseconds of each module imported, in import order.
+    """
+    environment = dict(os.environ, PYTHONPATH=REPOSITORY_DIRECTORY)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import {}".format(module)],
+                            cwd=REPOSITORY_DIRECTORY, env=environment, capture_output=True, text=True, check=True)
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        timings.append((name.strip(), int(own), int(cumulative)))
+    return timings
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Report the import time of app.py and check that heavy modules "
+                                                 "are imported lazily.")
+    parser.add_argument("--module", default="app", help="Module to import")
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest top-level imports reported")
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="Fail if importing the module takes longer than this many milliseconds")
+    args = parser.parse_args()
+
+    timings = profile_import(args.module)
+    total_ms = next(cumulative for name, _, cumulative in timings if name == args.module) / 1000
+    logger.info("import {} took {:.1f} ms over {} modules", args.module, total_ms, len(timings))
+    top_level = {}
+    for name, _, cumulative in timings:
+        root = name.split(".")[0]
+        if root != args.module.split(".")[0]:
+            top_level[root] = max(top_level.get(root, 0), cumulative)
+    for root, cumulative in sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        logger.info("{:>9.1f} ms | {}", cumulative / 1000, root)
+
+    eager = sorted({name.split(".")[0] for name, _, _ in timings} & set(LAZY_MODULES))
+    if eager:
+        logger.error("Heavy modules imported eagerly by {}: {}", args.module, ", ".join(eager))
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        logger.error("import {} took {:.1f} ms, over the budget of {:.1f} ms", args.module, total_ms, args.budget_ms)
+    sys.exit(1 if eager or (args.budget_ms is not None and total_ms > args.budget_ms) else 0)
@@ -0,0 +1,184 @@
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from src.inputs.TextInputFile import TextInputFile
+from src.storage.ChromaVectorStore import ChromaVectorStore
+from src.storage.NumpyVectorStore import NumpyVectorStore, QuantizationOptions
+from src.storage.VectorStore import VectorStore, VectorStoreOptions
+from src.cfg.logging_config import *
+
+PAGES_PER_FILE = 1000
+
+
+def resident_memory_mb() -> float:
+    """
+    Get the resident memory of this process. Only supported on Linux.
+
+    Returns:
+        float: The resident set size in MB.
+    """
+    with open("/proc/self/statm", "r") as file:
+        return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+
+def directory_size_mb(directory_path: str) -> float:
+    """
+    Get the size of the files in a directory tree.
+
+    Args:
+        directory_path (str): The path to the directory.
+
+    Returns:
+        float: The total file size in MB.
+    """
+    return sum(os.path.getsize(os.path.join(root, file_name))
+               for root, _, file_names in os.walk(directory_path) for file_name in file_names) / 1e6
+
+
+def corpus_pages(chunks: int) -> list[str]:
+    """
+    Build a synthetic corpus with one short page, and hence one chunk, per chunk requested.
+
+    Args:
+        chunks (int): The number of chunks.
+
+    Returns:
+        list[str]: The pages.
+    """
+    return ["Chunk {} of the benchmark corpus about topic {}.".format(i, i % 97) for i in range(chunks)]
+
+
+def open_store(option: VectorStoreOptions, quantization: QuantizationOptions, dimension: int,
+               persist_directory: str) -> VectorStore:
+    """
+    Open a persisted vector store with fake embeddings.
+
+    Args:
+        option (VectorStoreOptions): The vector store option.
+        quantization (QuantizationOptions): The quantization of the NumPy vector store.
+        dimension (int): The dimension of the embeddings.
+        persist_directory (str): The directory the store is persisted to.
+
+    Returns:
+        VectorStore: The vector store.
+    """
+    embeddings = DeterministicFakeEmbedding(size=dimension)
+    if option == VectorStoreOptions.CHROMA:
+        return ChromaVectorStore(embeddings, persist_directory)
+    return NumpyVectorStore(embeddings, persist_directory, quantization=quantization)
+
+
+def ingest(option: VectorStoreOptions, quantization: QuantizationOptions, chunks: int, dimension: int,
+           persist_directory: str) -> dict:
+    """
+    Add the synthetic corpus to a new persisted vector store and report the ingestion time.
+
+    Args:
+        option (VectorStoreOptions): The vector store option.
+        quantization (QuantizationOptions): The quantization of the NumPy vector store.
+        chunks (int): The number of chunks.
+        dimension (int): The dimension of the embeddings.
+        persist_directory (str): The directory the store is persisted to.
+
+    Returns:
+        dict: The ingestion time.
+    """
+    store = open_store(option, quantization, dimension, persist_directory)
+    pages = corpus_pages(chunks)
+    start = time.perf_counter()
+    for first_page in range(0, chunks, PAGES_PER_FILE):
+        store.add_document(TextInputFile(name="corpus.txt", path="corpus.txt",
+                                         pages=pages[first_page:first_page + PAGES_PER_FILE], page_offset=first_page))
+    return {"ingest_seconds": time.perf_counter() - start}
+
+
+def query(option: VectorStoreOptions, quantization: QuantizationOptions, chunks: int, dimension: int,
+          persist_directory: str, queries: int, k: int) -> dict:
+    """
+    Reopen a persisted vector store, time queries against it and report its memory footprint.
+
+    Args:
+        option (VectorStoreOptions): The vector store option.
+        quantization (QuantizationOptions): The quantization of the NumPy vector store.
+        chunks (int): The number of chunks.
+        dimension (int): The dimension of the embeddings.
+        persist_directory (str): The directory the store is persisted to.
+        queries (int): The number of timed queries.
+        k (int): The number of chunks retrieved per query.
+
+    Returns:
+        dict: The time to open the store, the memory it takes and the query latency percentiles.
+    """
+    baseline_mb = resident_memory_mb()
+    start = time.perf_counter()
+    store = open_store(option, quantization, dimension, persist_directory)
+    retriever = store.as_retriever()
+    retriever.k = k
+    retriever.invoke("warm up")
+    open_seconds = time.perf_counter() - start
+
+    pages = corpus_pages(chunks)
+    timings = []
+    for page in random.Random(0).choices(pages, k=queries):
+        start = time.perf_counter()
+        retriever.invoke(page)
+        timings.append(time.perf_counter() - start)
+    return {"open_seconds": open_seconds, "memory_mb": resident_memory_mb() - baseline_mb,
+            "p50_ms": float(np.percentile(timings, 50)) * 1000, "p95_ms": float(np.percentile(timings, 95)) * 1000}
+
+
+def benchmark(option: VectorStoreOptions, quantization: QuantizationOptions, chunks: int, dimension: int,
+              queries: int, k: int) -> None:
+    """
+    Benchmark a vector store, ingesting and querying in fresh processes so their memory is measured separately.
+
+    Args:
+        option (VectorStoreOptions): The vector store option.
+        quantization (QuantizationOptions): The quantization of the NumPy vector store.
+        chunks (int): The number of chunks.
+        dimension (int): The dimension of the embeddings.
+        queries (int): The number of timed queries.
+        k (int): The number of chunks retrieved per query.
+
+    Returns:
+        None
+    """
+    persist_directory = tempfile.mkdtemp()
+    try:
+        measurements = {}
+        for target, args in ((ingest, (option, quantization, chunks, dimension, persist_directory)),
+                             (query, (option, quantization, chunks, dimension, persist_directory, queries, k))):
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                measurements.update(executor.submit(target, *args).result())
+        name = option.value if option == VectorStoreOptions.CHROMA else "{} {}".format(option.value, quantization.value)
+        logger.info("{:>10} | ingest {:7.2f}s | disk {:7.1f} MB | open {:6.2f}s | memory {:7.1f} MB | "
+                    "p50 {:7.2f} ms | p95 {:7.2f} ms", name, measurements["ingest_seconds"],
+                    directory_size_mb(persist_directory), measurements["open_seconds"], measurements["memory_mb"],
+                    measurements["p50_ms"], measurements["p95_ms"])
+    finally:
+        shutil.rmtree(persist_directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare vector store query latency and memory footprint.")
+    parser.add_argument("--chunks", type=int, default=50_000, help="Number of chunks in the synthetic corpus")
+    parser.add_argument("--dimension", type=int, default=1536, help="Dimension of the fake embeddings")
+    parser.add_argument("--queries", type=int, default=200, help="Timed queries per vector store")
+    parser.add_argument("--k", type=int, default=4, help="Chunks retrieved per query")
+    parser.add_argument("--skip-chroma", action="store_true", help="Only benchmark the NumPy vector store")
+    args = parser.parse_args()
+
+    logger.info("Benchmarking {} chunks of dimension {}", args.chunks, args.dimension)
+    for vector_store_option, quantization_option in ((VectorStoreOptions.NUMPY, QuantizationOptions.NONE),
+                                                     (VectorStoreOptions.NUMPY, QuantizationOptions.INT8),
+                                                     (VectorStoreOptions.CHROMA, QuantizationOptions.NONE)):
+        if args.skip_chroma and vector_store_option == VectorStoreOptions.CHROMA:
+            continue
+        benchmark(vector_store_option, quantization_option, args.chunks, args.dimension, args.queries, args.k)
@@ -17,13 +17,45 @@ function ChatBot() {
         setFile(event.target.files[0]);
     };
 
+    const appendToAnswer = (token) => {
+        setMessages((prevMessages) => {
+            const lastMessage = prevMessages[prevMessages.length - 1];
+            return [...prevMessages.slice(0, -1), { ...lastMessage, content: lastMessage.content + token }];
+        });
+    };
+
     const handleNewMessage = async () => {
         if (query.trim() === '') return;
         try {
-            setMessages((prevMessages) => [...prevMessages, { type: 'question', content: query }]);
+            setMessages((prevMessages) => [
+                ...prevMessages,
+                { type: 'question', content: query },
+                { type: 'answer', content: '' },
+            ]);
             setQuery(''); // Clear out the search bar
-            const response = await axios.post(`${config.backendUrl}/query`, { question: query });
-            setMessages((prevMessages) => [...prevMessages, { type: 'answer', content: response.data.answer }]);
+
+            // Stream the answer as server-sent events and show tokens as they arrive
+            const response = await fetch(`${config.backendUrl}/query/stream`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ question: query }),
+            });
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                const events = buffer.split('\n\n');
+                buffer = events.pop();
+                for (const event of events) {
+                    if (event.startsWith('data: ')) {
+                        const data = JSON.parse(event.slice('data: '.length));
+                        if (data.token !== undefined) appendToAnswer(data.token);
+                    }
+                }
+            }
         } catch (error) {
             console.error('Error querying:', error);
         }
@@ -1,3 +1,125 @@
 import os
 
-os.environ["OPENAI_API_KEY"] = "<OPENAI-API-KEY>"
\ No newline at end of file
+os.environ["OPENAI_API_KEY"] = "<OPENAI-API-KEY>"
+
+# Embeddings backend: "Chat GPT" for OpenAI, "Local" for a sentence-transformers model saved to ./data/embedding_model
+# and run on the CPU (needs sentence-transformers), or "Hashing" for hashed term embeddings needing no model, e.g. for
+# tests ("Default" is Chat GPT). Embeddings of different backends are not comparable, so changing it needs a new
+# PERSIST_DIRECTORY
+EMBEDDINGS_TYPE = "Default"
+
+# Keyword arguments for the embeddings backend, e.g. {"model_directory": "./data/embedding_model", "batch_size": 64}
+# for "Local" or {"dimensions": 384} for "Hashing"
+EMBEDDINGS_CONFIG = {}
+
+# Language model backend: "gpt-3.5-turbo" for OpenAI, "LlamaCpp" for a GGUF model run on the CPU with llama.cpp (needs
+# llama-cpp-python), or "Fake" for a fixed answer, e.g. for tests ("Default" is gpt-3.5-turbo)
+LANGUAGE_MODEL_TYPE = "Default"
+
+# Keyword arguments for the language model backend, e.g. {"model_path": "./data/llama/model.gguf", "n_threads": 8,
+# "max_tokens": 512} for "LlamaCpp"
+LANGUAGE_MODEL_CONFIG = {}
+
+# Vector store backend: "Chroma", "Numpy" for the in-process NumPy store searched exactly, or "Hnsw"
+# for the in-process store searched through an HNSW graph ("Default" is Chroma)
+VECTOR_STORE_TYPE = "Default"
+
+# Directory the vector store is persisted to so restarts only embed new or changed files
+PERSIST_DIRECTORY = "./data/vector_store"
+
+# SQLite database caching embeddings by model and text so identical chunks are only embedded once
+EMBEDDING_CACHE_PATH = "./data/embedding_cache.sqlite"
+
+# Directory the tiktoken encoding counting tokens is loaded from, unless TIKTOKEN_CACHE_DIR is set. It is never
+# downloaded: fill it by running tiktoken.get_encoding("cl100k_base") with TIKTOKEN_CACHE_DIR set to it on a host with
+# network access. Without it, words are counted as tokens when chunking and as 1.4 tokens against the context budget
+TIKTOKEN_CACHE_DIR = "./data/tiktoken"
+
+# Number of worker processes used to parse documents, in one pool started on first use and shared by every ingestion
+PARSER_WORKERS = os.cpu_count()
+
+# Maximum number of pages read from disk before they are added to the vector store
+INGEST_BATCH_PAGES = 64
+
+# Directories whose documents are added on startup
+DOCUMENT_DIRECTORIES = ["./data/bumble_documents"]
+
+# Whether the document directories are watched after startup, so files created, modified or deleted
+# later are added, updated or removed without a restart
+WATCH_DOCUMENTS = True
+
+# Directory watching: seconds between polls, seconds without changes before changed files are
+# ingested together (so a burst of files dropped at once is one batch), and the longest a change waits
+WATCH_CONFIG = {
+    "poll_seconds": 2.0,
+    "debounce_seconds": 5.0,
+    "max_delay_seconds": 60.0,
+}
+
+# Vector store tuning: chunks and estimated tokens per embedding request, requests in flight,
+# the size and overlap in tokens of the chunks pages are split into, and whether chunks are also
+# found by BM25 keyword search, fused with the similarity search by reciprocal rank fusion
+VECTOR_STORE_CONFIG = {
+    "embedding_batch_size": 256,
+    "embedding_batch_tokens": 64_000,
+    "embedding_concurrency": 4,
+    "chunk_tokens": 512,
+    "chunk_overlap_tokens": 64,
+    "hybrid_search": True,
+}
+
+# Embedding compression, used when VECTOR_STORE_TYPE is "Numpy": "none", or "int8" to search codes a quarter
+# of the size and rescore the best candidates against the full embeddings kept on disk. "Hnsw" only uses the
+# codes for filtered and fallback searches; its graph keeps its own float32 copy, so int8 saves it no memory
+QUANTIZATION_CONFIG = {
+    "quantization": "none",
+    "rescore_candidates": 32,
+}
+
+# HNSW graph tuning, used when VECTOR_STORE_TYPE is "Hnsw": neighbours linked per chunk, candidates
+# considered when inserting a chunk and when searching (higher is slower with better recall), and new
+# chunks after which the graph is saved. Use benchmark/benchmark-ann.py to tune them offline
+HNSW_CONFIG = {
+    "hnsw_m": 16,
+    "hnsw_ef_construction": 200,
+    "hnsw_ef_search": 64,
+    "index_save_rows": 10_000,
+}
+
+# Reranking between retrieval and the language model: "None" to prompt with the retrieved chunks as they are,
+# "Lexical" to rerank them by query term coverage, BM25 and phrase matches, "CrossEncoder" to rerank them with a
+# cross-encoder saved to ./data/cross_encoder (needs sentence-transformers), or "Default" for the cross-encoder
+# when it is available and lexical otherwise
+RERANKER_TYPE = "Default"
+
+# Reranking tuning: chunks over-fetched as candidates, and chunks kept for the prompt
+RERANK_CONFIG = {
+    "candidates": 20,
+    "k": 4,
+}
+
+# Context assembly for the prompt: the most tokens of retrieved text stuffed into it per question, the most tokens
+# kept from one chunk (trimmed to its sentences most relevant to the question), and the shingle overlap from which a
+# chunk is dropped as a near-duplicate of a more relevant one
+CONTEXT_CONFIG = {
+    "budget_tokens": 1500,
+    "chunk_tokens": 400,
+    "duplicate_threshold": 0.8,
+}
+
+# Answer cache: the most answers kept, the seconds an answer stays valid, and whether a question also gets the answer
+# of a cached question asking for the same numbers whose embedding is at least similarity_threshold similar. Semantic
+# matching is off by default, since questions differing only in an entity or date can be that similar
+ANSWER_CACHE_CONFIG = {
+    "max_entries": 1024,
+    "ttl_seconds": 3600.0,
+    "semantic_match": False,
+    "similarity_threshold": 0.98,
+}
+
+# Batches of questions sent to /queryBatch: the most questions in one request, and the most language model calls in
+# flight at once while answering them
+QUERY_BATCH_CONFIG = {
+    "max_questions": 100,
+    "max_concurrency": 8,
+}
@@ -0,0 +1,132 @@
+import functools
+import hashlib
+import os
+import re
+from src.cfg.logging_config import *
+
+
+class TokenChunker:
+    """
+    A class splitting pages of text into overlapping chunks of a fixed number of tokens.
+
+    Each page is tokenized once and cut into windows of chunk_tokens tokens, consecutive
+    windows sharing overlap_tokens tokens, so chunking is linear in the length of the text.
+    Chunks never cross page boundaries, so every chunk keeps the number of the page it came from.
+
+    Tokens are counted with the tiktoken encoding used by the OpenAI models when it is in the
+    local tiktoken cache, the directory named by the TIKTOKEN_CACHE_DIR environment variable.
+    The encoding is never downloaded. Otherwise, whitespace delimited words are used as an
+    approximation.
+
+    Attributes:
+        chunk_tokens (int): The maximum number of tokens in a chunk.
+        overlap_tokens (int): The number of tokens shared by consecutive chunks of a page.
+        encoding_name (str): The name of the tiktoken encoding used to count tokens.
+    """
+
+    WORD_PATTERN = re.compile(r"\S+\s*")
+    # tiktoken caches an encoding under the SHA-1 hash of the URL it is downloaded from
+    ENCODING_URL = "https://openaipublic.blob.core.windows.net/encodings/{}.tiktoken"
+
+    def __init__(self, chunk_tokens: int = 512, overlap_tokens: int = 64, encoding_name: str = "cl100k_base"):
+        """
+        Initialize a TokenChunker object.
+
+        Args:
+            chunk_tokens (int): The maximum number of tokens in a chunk.
+            overlap_tokens (int): The number of tokens shared by consecutive chunks of a page.
+            encoding_name (str): The name of the tiktoken encoding used to count tokens.
+
+        Raises:
+            ValueError: If overlap_tokens is not smaller than chunk_tokens.
+        """
+        if not 0 <= overlap_tokens < chunk_tokens:
+            raise ValueError("overlap_tokens must be at least 0 and smaller than chunk_tokens")
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.encoding_name = encoding_name
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def load_encoding(encoding_name: str):
+        """
+        Load a tiktoken encoding from the local tiktoken cache once per process.
+
+        The encoding must be cached in the directory named by TIKTOKEN_CACHE_DIR beforehand, e.g.
+        by calling tiktoken.get_encoding() with that variable set on a host with network access.
+
+        Args:
+            encoding_name (str): The name of the tiktoken encoding.
+
+        Returns:
+            tiktoken.Encoding: The encoding, or None if it is not cached or cannot be loaded.
+        """
+        cache_directory = os.environ.get("TIKTOKEN_CACHE_DIR")
+        cache_key = hashlib.sha1(TokenChunker.ENCODING_URL.format(encoding_name).encode()).hexdigest()
+        if not cache_directory or not os.path.isfile(os.path.join(cache_directory, cache_key)):
+            logger.warning("tiktoken encoding {} is not cached in TIKTOKEN_CACHE_DIR, counting words as tokens",
+                           encoding_name)
+            return None
+        try:
+            import tiktoken
+            return tiktoken.get_encoding(encoding_name)
+        except Exception as e:
+            logger.warning("Could not load tiktoken encoding {} ({}), counting words as tokens", encoding_name, e)
+            return None
+
+    def count_tokens(self, text: str) -> int:
+        """
+        Count the tokens of a text, as they are counted when chunking.
+
+        Args:
+            text (str): The text.
+
+        Returns:
+            int: The number of tokens.
+        """
+        encoding = TokenChunker.load_encoding(self.encoding_name)
+        if encoding is not None:
+            return len(encoding.encode_ordinary(text))
+        return len(TokenChunker.WORD_PATTERN.findall(text))
+
+    def chunk_page(self, page: str) -> list[str]:
+        """
+        Split a page into overlapping chunks of at most chunk_tokens tokens.
+
+        Args:
+            page (str): The text of the page.
+
+        Returns:
+            list[str]: The chunks of the page, in order. A page that fits in one chunk is
+                returned unchanged.
+        """
+        stride = self.chunk_tokens - self.overlap_tokens
+        encoding = TokenChunker.load_encoding(self.encoding_name)
+
+        if encoding is not None:
+            tokens = encoding.encode_ordinary(page)
+            if len(tokens) <= self.chunk_tokens:
+                return [page] if page.strip() else []
+            return [encoding.decode(tokens[start:start + self.chunk_tokens])
+                    for start in range(0, len(tokens) - self.overlap_tokens, stride)]
+
+        # Cut at word boundaries by character offset, so chunks are exact slices of the page
+        starts = [match.start() for match in TokenChunker.WORD_PATTERN.finditer(page)]
+        if len(starts) <= self.chunk_tokens:
+            return [page] if page.strip() else []
+        starts.append(len(page))
+        return [page[starts[start]:starts[min(start + self.chunk_tokens, len(starts) - 1)]].strip()
+                for start in range(0, len(starts) - 1 - self.overlap_tokens, stride)]
+
+    def chunk_pages(self, pages: list[str], page_offset: int = 0) -> list[tuple[str, int]]:
+        """
+        Split pages into chunks, keeping the page number of each chunk.
+
+        Args:
+            pages (list[str]): The text of each page.
+            page_offset (int): The index of the first page within its file.
+
+        Returns:
+            list[tuple[str, int]]: Each chunk with the 1-based number of the page it came from.
+        """
+        return [(chunk, page_offset + i + 1) for i, page in enumerate(pages) for chunk in self.chunk_page(page)]
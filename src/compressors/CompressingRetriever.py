@@ -0,0 +1,71 @@
+import time
+from typing import Any, Optional
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from src.storage.TitleIndex import ChunkFilter
+from src.cfg.logging_config import *
+
+
+class CompressingRetriever(BaseRetriever):
+    """
+    A retriever compressing the chunks of another retriever into a context within a token
+    budget, so the prompt stuffed with them has a bounded size.
+
+    The tokens compression saves are logged for every query.
+
+    Attributes:
+        retriever (BaseRetriever): The retriever fetching the chunks, most relevant first.
+        compressor (Any): The ContextCompressor assembling the context.
+        chunk_filter (ChunkFilter): The filter restricting the chunks retrieved, or None. It is
+            applied by the inner retriever.
+    """
+    retriever: BaseRetriever
+    compressor: Any
+    chunk_filter: Optional[ChunkFilter] = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        """
+        Get the context of a query, compressed from the chunks most relevant to it.
+
+        Args:
+            query (str): The query.
+            run_manager (CallbackManagerForRetrieverRun): The callback manager of the run.
+
+        Returns:
+            list[Document]: The compressed chunks, most relevant first.
+        """
+        retriever = self.retriever
+        if self.chunk_filter is not None:
+            retriever = retriever.copy(update={"chunk_filter": self.chunk_filter})
+        docs = retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        start = time.perf_counter()
+        compressed, stats = self.compressor.compress(query, docs)
+        logger.info("Compressed {} chunks ({} duplicates) to {} in {:.1f} ms: {} of {} tokens, {} saved",
+                    stats.chunks, stats.duplicates, stats.kept, (time.perf_counter() - start) * 1000, stats.tokens,
+                    stats.original_tokens, stats.saved_tokens)
+        return compressed
+
+    def retrieve_many(self, queries: list[str]) -> list[list[Document]]:
+        """
+        Get the context of each of several queries, retrieving the chunks of all queries at once.
+
+        The inner retriever must provide retrieve_many(queries).
+
+        Args:
+            queries (list[str]): The queries.
+
+        Returns:
+            list[list[Document]]: The compressed chunks of each query, most relevant first.
+        """
+        retriever = self.retriever
+        if self.chunk_filter is not None:
+            retriever = retriever.copy(update={"chunk_filter": self.chunk_filter})
+        docs_per_query = retriever.retrieve_many(queries)
+        start = time.perf_counter()
+        results = [self.compressor.compress(query, docs) for query, docs in zip(queries, docs_per_query)]
+        logger.info("Compressed the chunks of {} queries in {:.1f} ms: {} of {} tokens, {} saved", len(queries),
+                    (time.perf_counter() - start) * 1000, sum(stats.tokens for _, stats in results),
+                    sum(stats.original_tokens for _, stats in results),
+                    sum(stats.saved_tokens for _, stats in results))
+        return [compressed for compressed, _ in results]
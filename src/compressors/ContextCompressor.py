@@ -0,0 +1,237 @@
+import math
+from typing import NamedTuple
+import numpy as np
+from langchain_core.documents import Document
+from src.chunkers.TokenChunker import TokenChunker
+from src.rerankers.Reranker import Reranker, RerankerOptions
+from src.segmenters.SentenceSegmenter import SentenceSegmenter
+from src.storage.KeywordIndex import KeywordIndex
+from src.cfg.logging_config import *
+
+
+class CompressionStats(NamedTuple):
+    """
+    The outcome of compressing the retrieved chunks of a query.
+
+    Attributes:
+        chunks (int): The number of chunks retrieved.
+        duplicates (int): The number of chunks dropped as near-duplicates of more relevant ones.
+        kept (int): The number of chunks kept in the context.
+        original_tokens (int): The number of tokens of the chunks retrieved.
+        tokens (int): The number of tokens of the chunks kept.
+    """
+    chunks: int
+    duplicates: int
+    kept: int
+    original_tokens: int
+    tokens: int
+
+    @property
+    def saved_tokens(self) -> int:
+        """
+        Get the number of tokens compression kept out of the prompt.
+        """
+        return self.original_tokens - self.tokens
+
+
+class ContextCompressor:
+    """
+    A class assembling the chunks retrieved for a query into a context of at most a fixed
+    number of tokens, so the size of the prompt, and with it the latency and cost of the
+    language model call, is bounded no matter how long or repetitive the chunks are.
+
+    Chunks are expected most relevant first and keep that order. A chunk whose terms overlap a
+    more relevant chunk's by at least duplicate_threshold is dropped, as are sentences already
+    in the context, e.g. from the overlap of consecutive chunks. Each chunk is then trimmed to
+    its sentences scoring highest against the query, at most chunk_tokens tokens of them in
+    their original order, until the budget is spent.
+
+    Tokens are counted with the tiktoken encoding when it is available. Otherwise each whitespace
+    delimited word is counted as word_tokens tokens, rounded up, since words undercount tokens
+    and the budget must hold against the language model's own count.
+
+    Attributes:
+        budget_tokens (int): The maximum number of tokens in the context.
+        chunk_tokens (int): The maximum number of tokens kept from a chunk.
+        duplicate_threshold (float): The Jaccard similarity of term shingles from which a chunk
+            is a near-duplicate.
+        scorer (Reranker): The reranker scoring sentences against the query.
+        word_tokens (float): The number of tokens counted per word without the tiktoken encoding.
+        chunker (TokenChunker): The chunker counting and cutting tokens.
+        MIN_FRAGMENT_TOKENS (int): The fewest tokens a sentence is cut to when it does not fit whole.
+        SHINGLE_TERMS (int): The number of consecutive terms in a shingle.
+    """
+
+    MIN_FRAGMENT_TOKENS = 16
+    SHINGLE_TERMS = 3
+
+    def __init__(self, budget_tokens: int = 1500, chunk_tokens: int = 400, duplicate_threshold: float = 0.8,
+                 scorer: Reranker = None, encoding_name: str = "cl100k_base", word_tokens: float = 1.4):
+        """
+        Initialize a ContextCompressor object.
+
+        Args:
+            budget_tokens (int): The maximum number of tokens in the context.
+            chunk_tokens (int): The maximum number of tokens kept from a chunk.
+            duplicate_threshold (float): The Jaccard similarity of term shingles from which a
+                chunk is a near-duplicate.
+            scorer (Reranker): The reranker scoring sentences against the query, or None for
+                the lexical reranker.
+            encoding_name (str): The name of the tiktoken encoding used to count tokens.
+            word_tokens (float): The number of tokens counted per word without the tiktoken
+                encoding, at least 1.
+
+        Raises:
+            ValueError: If budget_tokens or chunk_tokens is not positive, or word_tokens is below 1.
+        """
+        if budget_tokens <= 0 or chunk_tokens <= 0:
+            raise ValueError("budget_tokens and chunk_tokens must be positive")
+        if word_tokens < 1:
+            raise ValueError("word_tokens must be at least 1")
+        self.budget_tokens = budget_tokens
+        self.chunk_tokens = chunk_tokens
+        self.duplicate_threshold = duplicate_threshold
+        self.scorer = scorer or Reranker.get(RerankerOptions.LEXICAL)
+        self.word_tokens = word_tokens
+        self.chunker = TokenChunker(encoding_name=encoding_name)
+        if self.encoding is not None:
+            logger.info("Context compressor counts tokens with tiktoken encoding {}", encoding_name)
+        else:
+            logger.warning("Context compressor counts {} tokens per word, tiktoken encoding {} is not available",
+                           word_tokens, encoding_name)
+
+    @property
+    def encoding(self):
+        """
+        Get the tiktoken encoding counting tokens, or None if it is not available.
+        """
+        return TokenChunker.load_encoding(self.chunker.encoding_name)
+
+    def count_tokens(self, text: str) -> int:
+        """
+        Count the tokens of a text against the budget.
+
+        Args:
+            text (str): The text.
+
+        Returns:
+            int: The number of tokens, estimated from its words if the tiktoken encoding is not available.
+        """
+        tokens = self.chunker.count_tokens(text)
+        return tokens if self.encoding is not None else math.ceil(tokens * self.word_tokens)
+
+    def compress(self, query: str, docs: list[Document]) -> tuple[list[Document], CompressionStats]:
+        """
+        Assemble the context of a query from its retrieved chunks.
+
+        Args:
+            query (str): The query.
+            docs (list[Document]): The retrieved chunks, most relevant first.
+
+        Returns:
+            tuple[list[Document], CompressionStats]: Copies of the chunks kept, with their text
+                trimmed, most relevant first, and the outcome of the compression.
+        """
+        original_tokens = sum(self.count_tokens(doc.page_content) for doc in docs)
+        unique_docs = self.deduplicate(docs)
+        sentences = [SentenceSegmenter.get().tokenize(doc.page_content) for doc in unique_docs]
+        # Score all sentences at once, so term weights are shared by every chunk of the query
+        flat_scores = self.scorer.score(query, [sentence for doc_sentences in sentences for sentence in doc_sentences])
+
+        compressed = []
+        remaining = self.budget_tokens
+        seen = set()
+        start = 0
+        for doc, doc_sentences in zip(unique_docs, sentences):
+            scores = flat_scores[start:start + len(doc_sentences)]
+            start += len(doc_sentences)
+            selected = self.select_sentences(doc_sentences, scores, min(self.chunk_tokens, remaining), seen)
+            if selected:
+                text = " ".join(selected)
+                remaining -= self.count_tokens(text)
+                compressed.append(Document(page_content=text, metadata=dict(doc.metadata)))
+            if remaining < ContextCompressor.MIN_FRAGMENT_TOKENS:
+                break
+
+        tokens = sum(self.count_tokens(doc.page_content) for doc in compressed)
+        return compressed, CompressionStats(len(docs), len(docs) - len(unique_docs), len(compressed),
+                                            original_tokens, tokens)
+
+    def deduplicate(self, docs: list[Document]) -> list[Document]:
+        """
+        Drop chunks that are near-duplicates of more relevant chunks.
+
+        Args:
+            docs (list[Document]): The chunks, most relevant first.
+
+        Returns:
+            list[Document]: The chunks kept, in order.
+        """
+        kept = []
+        kept_shingles = []
+        for doc in docs:
+            shingles = ContextCompressor.shingle(doc.page_content)
+            if not any(len(shingles & other) >= self.duplicate_threshold * len(shingles | other)
+                       for other in kept_shingles if shingles or other):
+                kept.append(doc)
+                kept_shingles.append(shingles)
+        return kept
+
+    @staticmethod
+    def shingle(text: str) -> set[tuple[str, ...]]:
+        """
+        Get the shingles of a text, its runs of SHINGLE_TERMS consecutive terms.
+
+        Args:
+            text (str): The text.
+
+        Returns:
+            set[tuple[str, ...]]: The shingles. A text with fewer terms has its terms as one shingle.
+        """
+        terms = KeywordIndex.tokenize(text)
+        if len(terms) <= ContextCompressor.SHINGLE_TERMS:
+            return {tuple(terms)} if terms else set()
+        return set(zip(*(terms[offset:] for offset in range(ContextCompressor.SHINGLE_TERMS))))
+
+    def select_sentences(self, sentences: list[str], scores: np.ndarray, max_tokens: int,
+                         seen: set) -> list[str]:
+        """
+        Select the sentences of a chunk scoring highest against the query, within a number of tokens.
+
+        Sentences are considered from the highest scoring, those scoring the same in their
+        order in the chunk, and skipped if they are already in the context or do not fit. If
+        no sentence fits whole, the highest scoring one is cut to max_tokens tokens.
+
+        Args:
+            sentences (list[str]): The sentences of the chunk, in order.
+            scores (np.ndarray): The score of each sentence.
+            max_tokens (int): The maximum number of tokens selected.
+            seen (set): The normalized sentences already in the context, updated with those selected.
+
+        Returns:
+            list[str]: The sentences selected, in their order in the chunk.
+        """
+        candidates = []
+        for position, sentence in enumerate(sentences):
+            key = " ".join(sentence.lower().split())
+            if key and key not in seen:
+                candidates.append((position, key))
+        candidates.sort(key=lambda candidate: -scores[candidate[0]])
+
+        selected = []
+        used = 0
+        for position, key in candidates:
+            # Sentences after the first are joined by a space, which may take a token of its own
+            tokens = self.count_tokens(sentences[position]) + (1 if selected else 0)
+            if used + tokens <= max_tokens:
+                selected.append(position)
+                seen.add(key)
+                used += tokens
+        if not selected and candidates and max_tokens >= ContextCompressor.MIN_FRAGMENT_TOKENS:
+            position, key = candidates[0]
+            seen.add(key)
+            # Without the encoding, cut to as many words as max_tokens tokens are counted for
+            fragment_tokens = max_tokens if self.encoding is not None else int(max_tokens / self.word_tokens)
+            fragment = TokenChunker(fragment_tokens, 0, self.chunker.encoding_name).chunk_page(sentences[position])[0]
+            return [fragment]
+        return [sentences[position] for position in sorted(selected)]
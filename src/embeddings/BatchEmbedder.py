@@ -0,0 +1,140 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.embeddings import Embeddings
+from src.cfg.logging_config import *
+
+
+class BatchEmbedder:
+    """
+    A class embedding large numbers of texts in fixed-size batches with bounded concurrency.
+
+    Texts are packed into batches capped both by count and by an estimated token count, so
+    one huge document does not become one huge request and many small documents do not become
+    many tiny requests. Several batches are embedded at once, and batches that fail with a
+    throttling or transient error are retried with exponential backoff.
+
+    Attributes:
+        embeddings (Embeddings): The embeddings used to embed each batch.
+        max_batch_size (int): The maximum number of texts in a batch.
+        max_batch_tokens (int): The maximum estimated number of tokens in a batch.
+        max_concurrency (int): The maximum number of batches embedded at once.
+        max_retries (int): The number of times a failed batch is retried.
+        backoff_seconds (float): The delay before the first retry, doubled on each further retry.
+    """
+
+    # Rough number of characters per token for English text
+    CHARS_PER_TOKEN = 4
+    # HTTP status codes of errors worth retrying
+    RETRYABLE_STATUS_CODES = (408, 409, 429, 500, 502, 503, 504)
+
+    def __init__(self, embeddings: Embeddings, max_batch_size: int = 256, max_batch_tokens: int = 64_000,
+                 max_concurrency: int = 4, max_retries: int = 5, backoff_seconds: float = 1.0):
+        """
+        Initialize a BatchEmbedder object.
+
+        Args:
+            embeddings (Embeddings): The embeddings used to embed each batch.
+            max_batch_size (int): The maximum number of texts in a batch.
+            max_batch_tokens (int): The maximum estimated number of tokens in a batch.
+            max_concurrency (int): The maximum number of batches embedded at once.
+            max_retries (int): The number of times a failed batch is retried.
+            backoff_seconds (float): The delay before the first retry, doubled on each further retry.
+        """
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """
+        Estimate the number of tokens in a text.
+
+        Args:
+            text (str): The text.
+
+        Returns:
+            int: The estimated number of tokens.
+        """
+        return len(text) // BatchEmbedder.CHARS_PER_TOKEN + 1
+
+    def make_batches(self, texts: list[str]) -> list[tuple[int, int]]:
+        """
+        Pack consecutive texts into batches within the size and token limits.
+
+        Args:
+            texts (list[str]): The texts to be embedded.
+
+        Returns:
+            list[tuple[int, int]]: The start and stop index into texts of each batch.
+        """
+        batches = []
+        start, batch_tokens = 0, 0
+        for i, text in enumerate(texts):
+            tokens = BatchEmbedder.estimate_tokens(text)
+            if i > start and (i - start >= self.max_batch_size or batch_tokens + tokens > self.max_batch_tokens):
+                batches.append((start, i))
+                start, batch_tokens = i, 0
+            batch_tokens += tokens
+        if start < len(texts):
+            batches.append((start, len(texts)))
+        return batches
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embed a list of texts in concurrent batches.
+
+        Args:
+            texts (list[str]): The texts to embed.
+
+        Returns:
+            list[list[float]]: One embedding per text, in the same order as texts.
+        """
+        batches = self.make_batches(texts)
+        if len(batches) <= 1 or self.max_concurrency <= 1:
+            results = [self._embed_with_retry(texts[start:stop]) for start, stop in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                results = list(executor.map(lambda batch: self._embed_with_retry(texts[batch[0]:batch[1]]), batches))
+        logger.info("Embedded {} texts in {} batches", len(texts), len(batches))
+        return [vector for result in results for vector in result]
+
+    @staticmethod
+    def is_retryable(error: Exception) -> bool:
+        """
+        Check whether an embedding error is a throttling or transient error worth retrying.
+
+        Args:
+            error (Exception): The error raised by the embeddings.
+
+        Returns:
+            bool: True if the batch should be retried.
+        """
+        if isinstance(error, (TimeoutError, ConnectionError)):
+            return True
+        if getattr(error, "status_code", None) in BatchEmbedder.RETRYABLE_STATUS_CODES:
+            return True
+        return type(error).__name__ in ("RateLimitError", "APITimeoutError", "APIConnectionError")
+
+    def _embed_with_retry(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embed one batch, retrying throttling and transient errors with exponential backoff.
+
+        Args:
+            texts (list[str]): The texts in the batch.
+
+        Returns:
+            list[list[float]]: One embedding per text.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.embeddings.embed_documents(texts)
+            except Exception as e:
+                if attempt == self.max_retries or not BatchEmbedder.is_retryable(e):
+                    raise
+                delay = self.backoff_seconds * (2 ** attempt) * (1 + random.random())
+                logger.warning("Embedding batch of {} texts failed ({}), retrying in {:.1f}s", len(texts), e, delay)
+                time.sleep(delay)
@@ -0,0 +1,269 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from langchain_core.embeddings import Embeddings
+from src.cfg.logging_config import *
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    A class wrapping an Embeddings object with a content-addressed embedding cache.
+
+    Embeddings are stored in a local SQLite database keyed by a hash of the model name and
+    the text, so a chunk is only sent to the underlying embeddings once no matter how many
+    times it is added. The cache holds at most max_entries embeddings and evicts the least
+    recently used ones beyond that.
+
+    Cache hits only note when an entry was last used in memory. The notes are written in one
+    transaction before new embeddings are stored, or once LAST_USED_FLUSH_ENTRIES of them or
+    LAST_USED_FLUSH_SECONDS have accumulated, so lookups, queries in particular, do not commit.
+    Notes not yet written when the process stops are lost, which only ages their entries.
+
+    Attributes:
+        embeddings (Embeddings): The underlying embeddings used on cache misses.
+        model_name (str): The model name mixed into every cache key.
+        max_entries (int): The maximum number of embeddings kept in the cache.
+        hits (int): The number of texts served from the cache.
+        misses (int): The number of texts sent to the underlying embeddings.
+    """
+
+    # Maximum number of SQL variables bound in a single statement
+    SQL_BATCH_SIZE = 500
+    LAST_USED_FLUSH_ENTRIES = 1000
+    LAST_USED_FLUSH_SECONDS = 60
+
+    def __init__(self, embeddings: Embeddings, cache_path: str = ":memory:", max_entries: int = 1_000_000):
+        """
+        Initialize a CachedEmbeddings object.
+
+        Args:
+            embeddings (Embeddings): The underlying embeddings used on cache misses.
+            cache_path (str): The path to the SQLite cache database, or ":memory:" for a
+                cache that lives only as long as the process.
+            max_entries (int): The maximum number of embeddings kept in the cache.
+        """
+        self.embeddings = embeddings
+        self.model_name = getattr(embeddings, "model", None) or type(embeddings).__name__
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Times entries were last used, by cache key, not yet written to the database
+        self._last_used = {}
+        self._last_used_flushed = time.monotonic()
+        self._connection = sqlite3.connect(cache_path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings "
+            "(key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._connection.commit()
+
+    def cache_key(self, text: str) -> str:
+        """
+        Compute the cache key of a text for the wrapped model.
+
+        Args:
+            text (str): The text to be embedded.
+
+        Returns:
+            str: The hex digest of the model name and the text.
+        """
+        return hashlib.sha256(f"{self.model_name}\x00{text}".encode("utf-8")).hexdigest()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embed a list of texts, embedding only the texts that are not already cached.
+
+        Args:
+            texts (list[str]): The texts to embed.
+
+        Returns:
+            list[list[float]]: One embedding per text, in the same order as texts.
+        """
+        keys, cached, missing = self._find_missing(texts)
+        vectors = self.embeddings.embed_documents(list(missing.values())) if missing else []
+        return self._complete(keys, cached, missing, vectors)
+
+    def embed_query(self, text: str) -> list[float]:
+        """
+        Embed a query text, using the cache when possible.
+
+        Args:
+            text (str): The query text to embed.
+
+        Returns:
+            list[float]: The embedding of the query.
+        """
+        keys, cached, missing = self._find_missing([text])
+        vectors = [self.embeddings.embed_query(text)] if missing else []
+        return self._complete(keys, cached, missing, vectors)[0]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        """
+        Asynchronously embed a list of texts, embedding only the texts that are not already cached.
+
+        The cache is read and written in a worker thread, so the event loop never waits on SQLite.
+
+        Args:
+            texts (list[str]): The texts to embed.
+
+        Returns:
+            list[list[float]]: One embedding per text, in the same order as texts.
+        """
+        keys, cached, missing = await asyncio.to_thread(self._find_missing, texts)
+        vectors = await self.embeddings.aembed_documents(list(missing.values())) if missing else []
+        return await asyncio.to_thread(self._complete, keys, cached, missing, vectors)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        """
+        Asynchronously embed a query text, using the cache when possible.
+
+        The cache is read and written in a worker thread, so the event loop never waits on SQLite.
+
+        Args:
+            text (str): The query text to embed.
+
+        Returns:
+            list[float]: The embedding of the query.
+        """
+        keys, cached, missing = await asyncio.to_thread(self._find_missing, [text])
+        vectors = [await self.embeddings.aembed_query(text)] if missing else []
+        return (await asyncio.to_thread(self._complete, keys, cached, missing, vectors))[0]
+
+    def stats(self) -> dict:
+        """
+        Get the cache hit/miss counters and current size.
+
+        Returns:
+            dict: The hits, misses, hit rate and number of cached embeddings.
+        """
+        with self._lock:
+            size = self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": size,
+            }
+
+    def _find_missing(self, texts: list[str]) -> tuple[list[str], dict, dict]:
+        """
+        Look up the cached embeddings of texts and collect the texts that must be embedded.
+
+        Args:
+            texts (list[str]): The texts to embed.
+
+        Returns:
+            tuple[list[str], dict, dict]: The cache key of each text, in order, a mapping of cache
+                key to embedding for the texts found in the cache, and a mapping of cache key to
+                text for the distinct texts not found, in order.
+        """
+        keys = [self.cache_key(text) for text in texts]
+        with self._lock:
+            cached = self._lookup(set(keys))
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        return keys, cached, missing
+
+    def _complete(self, keys: list[str], cached: dict, missing: dict, vectors: list[list[float]]) -> list[list[float]]:
+        """
+        Store the embeddings of the texts that were missing and assemble the embeddings of all texts.
+
+        Args:
+            keys (list[str]): The cache key of each text, in order, as found by _find_missing().
+            cached (dict): The embeddings found in the cache, by cache key.
+            missing (dict): The texts not found in the cache, by cache key.
+            vectors (list[list[float]]): The embeddings of the missing texts, in order.
+
+        Returns:
+            list[list[float]]: One embedding per text, in the order of keys.
+        """
+        if missing:
+            # Round to float32 like the stored copies so results do not depend on cache state
+            vectors = [array("f", vector).tolist() for vector in vectors]
+            cached.update(zip(missing.keys(), vectors))
+            with self._lock:
+                self._store(list(zip(missing.keys(), vectors)))
+
+        with self._lock:
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+        logger.info("Embedding cache served {} of {} texts", len(keys) - len(missing), len(keys))
+        return [cached[key] for key in keys]
+
+    def _lookup(self, keys: set[str]) -> dict:
+        """
+        Fetch cached embeddings and note them as recently used. Must be called with the lock held.
+
+        Args:
+            keys (set[str]): The cache keys to look up.
+
+        Returns:
+            dict: A mapping of cache key to embedding for the keys found in the cache.
+        """
+        keys = list(keys)
+        found = {}
+        for start in range(0, len(keys), CachedEmbeddings.SQL_BATCH_SIZE):
+            batch = keys[start:start + CachedEmbeddings.SQL_BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._connection.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch).fetchall()
+            for key, blob in rows:
+                vector = array("f")
+                vector.frombytes(blob)
+                found[key] = vector.tolist()
+
+        if found:
+            now = time.time()
+            self._last_used.update((key, now) for key in found)
+            if len(self._last_used) >= CachedEmbeddings.LAST_USED_FLUSH_ENTRIES or \
+                    time.monotonic() - self._last_used_flushed >= CachedEmbeddings.LAST_USED_FLUSH_SECONDS:
+                self._write_last_used()
+                self._connection.commit()
+        return found
+
+    def _write_last_used(self) -> None:
+        """
+        Write the noted last use times of entries, without committing. Must be called with the lock held.
+
+        Returns:
+            None
+        """
+        if self._last_used:
+            self._connection.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                         [(last_used, key) for key, last_used in self._last_used.items()])
+            self._last_used = {}
+        self._last_used_flushed = time.monotonic()
+
+    def _store(self, entries: list[tuple[str, list[float]]]) -> None:
+        """
+        Store embeddings and evict the least recently used ones beyond max_entries. Must be
+        called with the lock held.
+
+        Args:
+            entries (list[tuple[str, list[float]]]): The cache keys and embeddings to store.
+
+        Returns:
+            None
+        """
+        # Entries must be ordered by their last use before the least recently used are evicted
+        self._write_last_used()
+        now = time.time()
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+            [(key, array("f", vector).tobytes(), now) for key, vector in entries])
+
+        size = self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if size > self.max_entries:
+            self._connection.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (size - self.max_entries,))
+            logger.info("Evicted {} least recently used embeddings from cache", size - self.max_entries)
+        self._connection.commit()
@@ -0,0 +1,64 @@
+import hashlib
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from src.storage.KeywordIndex import KeywordIndex
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    A class embedding texts by hashing their terms and adjacent term pairs into a fixed number
+    of dimensions, without a model.
+
+    Embeddings are deterministic and computed locally without shared state, so they are safe
+    to use from concurrent embedding requests. Texts sharing terms have similar embeddings, so
+    retrieval works lexically, which makes them suitable for tests and for air-gapped hosts
+    without a local model.
+
+    Attributes:
+        dimensions (int): The number of dimensions of the embeddings.
+        model (str): The name of the embeddings, mixed into embedding cache keys.
+    """
+
+    def __init__(self, dimensions: int = 384):
+        """
+        Initialize a HashingEmbeddings object.
+
+        Args:
+            dimensions (int): The number of dimensions of the embeddings.
+        """
+        self.dimensions = dimensions
+        self.model = "hashing-{}".format(dimensions)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embed a batch of texts.
+
+        Args:
+            texts (list[str]): The texts to embed.
+
+        Returns:
+            list[list[float]]: The unit-length embedding of each text, in order. A text without
+                terms is embedded by its whole content.
+        """
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            terms = KeywordIndex.tokenize(text)
+            features = terms + [" ".join(pair) for pair in zip(terms, terms[1:])] or [text]
+            for feature in features:
+                digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+                # The top bit signs the feature, so colliding features cancel out rather than add up
+                vectors[row, digest % self.dimensions] += 1.0 if digest >> 63 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return (vectors / np.where(norms > 0, norms, 1)).tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        """
+        Embed a query.
+
+        Args:
+            text (str): The query.
+
+        Returns:
+            list[float]: The unit-length embedding of the query.
+        """
+        return self.embed_documents([text])[0]
@@ -0,0 +1,97 @@
+import hashlib
+import os
+from langchain_core.embeddings import Embeddings
+from src.cfg.logging_config import *
+
+
+class LocalEmbeddings(Embeddings):
+    """
+    A class embedding texts with a sentence-transformers model run locally on the CPU.
+
+    The model is loaded from a local directory only and is never downloaded, so no text leaves
+    the host, as long as the model has been saved there beforehand, e.g. by calling
+    save('./data/embedding_model') on SentenceTransformer('all-MiniLM-L6-v2'). Texts are
+    encoded in batches of batch_size.
+
+    Attributes:
+        encoder (SentenceTransformer): The loaded model.
+        batch_size (int): The number of texts encoded per forward pass.
+        model (str): The identity of the model, mixed into embedding cache keys: its directory
+            name, a hash of its saved files and its embedding dimension.
+    """
+
+    MODEL_DIRECTORY = "./data/embedding_model"
+
+    def __init__(self, model_directory: str = MODEL_DIRECTORY, batch_size: int = 64):
+        """
+        Initialize a LocalEmbeddings object, loading the model.
+
+        Args:
+            model_directory (str): The directory the model was saved to.
+            batch_size (int): The number of texts encoded per forward pass.
+
+        Raises:
+            ImportError: If sentence-transformers is not installed.
+            LookupError: If the model is not available in model_directory.
+        """
+        from sentence_transformers import SentenceTransformer
+
+        if not os.path.isdir(model_directory):
+            raise LookupError("Embedding model not found in {}".format(model_directory))
+        self.encoder = SentenceTransformer(model_directory, device="cpu")
+        self.batch_size = batch_size
+        # Another model saved to the same directory must not be served the cached embeddings of this one
+        self.model = "local:{}:{}:{}".format(os.path.basename(os.path.normpath(model_directory)),
+                                             LocalEmbeddings.hash_model(model_directory),
+                                             self.encoder.get_sentence_embedding_dimension())
+        logger.info("Loaded embedding model {} from {}", self.model, model_directory)
+
+    @staticmethod
+    def hash_model(model_directory: str) -> str:
+        """
+        Hash the files a model was saved to, i.e. its configuration, tokenizer and weights. The
+        files are read once when the model is loaded, as the model reads them anyway.
+
+        Args:
+            model_directory (str): The directory the model was saved to.
+
+        Returns:
+            str: The hex digest of the relative paths and contents of the files, shortened to 16
+                characters.
+        """
+        digest = hashlib.sha256()
+        for directory, _, file_names in sorted(os.walk(model_directory)):
+            for file_name in sorted(file_names):
+                file_path = os.path.join(directory, file_name)
+                digest.update(os.path.relpath(file_path, model_directory).encode() + b"\0")
+                with open(file_path, "rb") as file:
+                    for block in iter(lambda: file.read(1 << 20), b""):
+                        digest.update(block)
+        return digest.hexdigest()[:16]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embed a batch of texts.
+
+        Args:
+            texts (list[str]): The texts to embed.
+
+        Returns:
+            list[list[float]]: The unit-length embedding of each text, in order.
+        """
+        if not texts:
+            return []
+        return self.encoder.encode(texts, batch_size=self.batch_size, normalize_embeddings=True,
+                                   convert_to_numpy=True, show_progress_bar=False).tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        """
+        Embed a query.
+
+        Args:
+            text (str): The query.
+
+        Returns:
+            list[float]: The unit-length embedding of the query.
+        """
+        return self.embed_documents([text])[0]
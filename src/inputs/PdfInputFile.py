@@ -14,7 +14,8 @@ class PdfInputFile(InputFile):
         pages (list): A list containing the content of each page of the PDF file.
     """
 
-    def __init__(self, name: str, path: str, pages: list):
+    def __init__(self, name: str, path: str, pages: list, page_offset: int = 0, complete: bool = True,
+                 failed: bool = False):
         """
         Initialize a PdfInputFile object.
 
@@ -22,5 +23,12 @@ class PdfInputFile(InputFile):
             name (str): The name of the PDF input file.
             path (str): The path to the PDF input file.
             pages (list): A list containing the content of each page of the PDF file.
+            page_offset (int): The index of the first page in pages within the whole file, when the
+                object holds only a slice of the file's pages.
+            complete (bool): Whether pages runs to the end of the file.
+            failed (bool): Whether the file failed to parse after earlier slices of it, so this
+                slice has no pages and only ends the file.
         """
-        super().__init__(input_file_type=InputFileType.PDF, name=name, path=path, data={"pages": pages})
+        super().__init__(input_file_type=InputFileType.PDF, name=name, path=path,
+                         data={"pages": pages, "page_offset": page_offset, "complete": complete,
+                               "failed": failed})
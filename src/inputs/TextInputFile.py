@@ -14,7 +14,8 @@ class TextInputFile(InputFile):
         pages (list[str]): The content of the text input file, split into pages.
     """
 
-    def __init__(self, name: str, path: str, pages: list[str]):
+    def __init__(self, name: str, path: str, pages: list[str], page_offset: int = 0, complete: bool = True,
+                 failed: bool = False):
         """
         Initialize a TextInputFile object.
 
@@ -22,5 +23,12 @@ class TextInputFile(InputFile):
             name (str): The name of the text input file.
             path (str): The path to the text input file.
             pages (list[str]): The content of the text input file, split into pages.
+            page_offset (int): The index of the first page in pages within the whole file, when the
+                object holds only a slice of the file's pages.
+            complete (bool): Whether pages runs to the end of the file.
+            failed (bool): Whether the file failed to parse after earlier slices of it, so this
+                slice has no pages and only ends the file.
         """
-        super().__init__(input_file_type=InputFileType.TEXT, name=name, path=path, data={"pages": pages})
+        super().__init__(input_file_type=InputFileType.TEXT, name=name, path=path,
+                         data={"pages": pages, "page_offset": page_offset, "complete": complete,
+                               "failed": failed})
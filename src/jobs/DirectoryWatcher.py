@@ -0,0 +1,144 @@
+import os
+import threading
+import time
+from typing import Callable
+from src.cfg.logging_config import *
+
+
+class DirectoryWatcher:
+    """
+    A class watching directories for created, modified and deleted files by polling them.
+
+    Each poll lists the files of the directories with their modification time and size, and
+    files whose time or size changed since the previous poll, or which appeared or disappeared,
+    become pending. Pending changes are reported together once no file has changed for
+    debounce_seconds, so a file still being copied is only reported when it is complete and a
+    burst of files dropped at once is reported as one batch. A steady stream of changes is
+    still reported every max_delay_seconds. Whether a changed file's content really changed is
+    left to the consumer, which compares content hashes.
+
+    Attributes:
+        directories (list[str]): The paths to the directories watched.
+        on_changes (Callable[[list[str], list[str]], None]): The function called with the paths
+            of the changed files and the paths of the deleted files.
+        poll_seconds (float): The number of seconds between polls.
+        debounce_seconds (float): The number of seconds without changes before changes are reported.
+        max_delay_seconds (float): The maximum number of seconds a change waits to be reported.
+        extensions (tuple[str]): The lower case extensions of the files watched, matched in any case.
+    """
+
+    def __init__(self, directories: list[str], on_changes: Callable[[list[str], list[str]], None],
+                 poll_seconds: float = 2.0, debounce_seconds: float = 5.0, max_delay_seconds: float = 60.0,
+                 extensions: tuple = (".pdf", ".txt")):
+        """
+        Initialize a DirectoryWatcher object.
+
+        Args:
+            directories (list[str]): The paths to the directories watched.
+            on_changes (Callable[[list[str], list[str]], None]): The function called with the
+                paths of the changed files and the paths of the deleted files.
+            poll_seconds (float): The number of seconds between polls.
+            debounce_seconds (float): The number of seconds without changes before changes are reported.
+            max_delay_seconds (float): The maximum number of seconds a change waits to be reported.
+            extensions (tuple[str]): The extensions of the files watched.
+        """
+        self.directories = directories
+        self.on_changes = on_changes
+        self.poll_seconds = poll_seconds
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.extensions = tuple(extension.lower() for extension in extensions)
+        self._files = self.scan()
+        # Pending paths map to True if the file exists and False if it was deleted
+        self._pending = {}
+        self._first_change = None
+        self._last_change = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def scan(self) -> dict:
+        """
+        List the watched files.
+
+        Returns:
+            dict: A mapping of file path to its modification time in nanoseconds and size.
+        """
+        files = {}
+        for directory_path in self.directories:
+            if not os.path.isdir(directory_path):
+                continue
+            with os.scandir(directory_path) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.name.lower().endswith(self.extensions):
+                        stat = entry.stat()
+                        files[entry.path] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def poll(self, now: float = None) -> tuple[list[str], list[str]]:
+        """
+        Scan the directories once and take the pending changes if they are due.
+
+        Args:
+            now (float): The current monotonic time. Defaults to time.monotonic().
+
+        Returns:
+            tuple[list[str], list[str]]: The paths of the changed files and of the deleted
+                files, or None if no changes are due.
+        """
+        now = time.monotonic() if now is None else now
+        files = self.scan()
+        changed = [file_path for file_path, state in files.items() if self._files.get(file_path) != state]
+        deleted = [file_path for file_path in self._files if file_path not in files]
+        self._files = files
+        if changed or deleted:
+            self._pending.update((file_path, True) for file_path in changed)
+            self._pending.update((file_path, False) for file_path in deleted)
+            if self._first_change is None:
+                self._first_change = now
+            self._last_change = now
+        if not self._pending or (now - self._last_change < self.debounce_seconds and
+                                 now - self._first_change < self.max_delay_seconds):
+            return None
+        pending, self._pending = self._pending, {}
+        self._first_change = self._last_change = None
+        return ([file_path for file_path, exists in pending.items() if exists],
+                [file_path for file_path, exists in pending.items() if not exists])
+
+    def start(self) -> None:
+        """
+        Start polling in a background thread. Files present when the watcher was created are
+        not reported.
+
+        Returns:
+            None
+        """
+        self._thread = threading.Thread(target=self._run, name="directory-watcher", daemon=True)
+        self._thread.start()
+        logger.info("Watching {} for changed files every {}s", ", ".join(self.directories), self.poll_seconds)
+
+    def stop(self) -> None:
+        """
+        Stop polling and wait for the background thread to finish.
+
+        Returns:
+            None
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        """
+        Poll until stopped, reporting changes as they become due.
+
+        Returns:
+            None
+        """
+        while not self._stopped.wait(self.poll_seconds):
+            try:
+                changes = self.poll()
+                if changes is not None:
+                    logger.info("Detected {} changed and {} deleted files", len(changes[0]), len(changes[1]))
+                    self.on_changes(*changes)
+            except Exception as e:
+                logger.error("Failed to process watched file changes: {}", e)
@@ -0,0 +1,155 @@
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from enum import Enum
+from typing import Callable
+from src.cfg.logging_config import *
+
+
+class JobStatus(Enum):
+    """
+    An enumeration representing the status of a background ingestion job.
+
+    Attributes:
+        QUEUED (str): The job is waiting for a worker.
+        RUNNING (str): The job is being processed.
+        SUCCEEDED (str): The job finished successfully.
+        FAILED (str): The job raised an error.
+    """
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class IngestJobQueue:
+    """
+    A class running document ingestion as background jobs and tracking their status.
+
+    Jobs run on a small pool of worker threads so that request handlers can accept uploads
+    and return immediately. With a single worker, which is the default, jobs are applied one
+    at a time in submission order.
+
+    Attributes:
+        max_finished_jobs (int): The number of finished jobs whose status is kept.
+    """
+
+    def __init__(self, workers: int = 1, max_finished_jobs: int = 1000):
+        """
+        Initialize an IngestJobQueue object.
+
+        Args:
+            workers (int): The number of worker threads running jobs.
+            max_finished_jobs (int): The number of finished jobs whose status is kept.
+        """
+        self.max_finished_jobs = max_finished_jobs
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+        self._jobs = {}
+        self._finished = []
+        self._lock = threading.Lock()
+
+    def submit(self, description: str, function: Callable, *args, **kwargs) -> str:
+        """
+        Submit a job to be run in the background.
+
+        Args:
+            description (str): A human-readable description of the job.
+            function (Callable): The function doing the work. Its return value, if any, is
+                reported as the job result.
+            *args: Positional arguments for function.
+            **kwargs: Keyword arguments for function.
+
+        Returns:
+            str: The id of the job.
+        """
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "description": description,
+                "status": JobStatus.QUEUED.value,
+                "submitted_at": time.time(),
+                "finished_at": None,
+                "result": None,
+                "error": None,
+            }
+        self._executor.submit(self._run, job_id, function, *args, **kwargs)
+        logger.info("Queued ingestion job {}: {}", job_id, description)
+        return job_id
+
+    def execute(self, function: Callable, *args, **kwargs) -> Future:
+        """
+        Run a function on the job workers without tracking it as a job, e.g. housekeeping that
+        must not run on the caller's thread. An error it raises is logged.
+
+        Args:
+            function (Callable): The function to run.
+            *args: Positional arguments for function.
+            **kwargs: Keyword arguments for function.
+
+        Returns:
+            Future: The future of the function's result.
+        """
+        def run():
+            try:
+                return function(*args, **kwargs)
+            except Exception as e:
+                logger.error("Background task {} failed: {}", getattr(function, "__name__", function), e)
+
+        return self._executor.submit(run)
+
+    def get(self, job_id: str) -> dict:
+        """
+        Get the status of a job.
+
+        Args:
+            job_id (str): The id of the job.
+
+        Returns:
+            dict: A copy of the job's status, or None if the job is unknown.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _run(self, job_id: str, function: Callable, *args, **kwargs) -> None:
+        """
+        Run a job on a worker thread and record its outcome.
+
+        Args:
+            job_id (str): The id of the job.
+            function (Callable): The function doing the work.
+            *args: Positional arguments for function.
+            **kwargs: Keyword arguments for function.
+
+        Returns:
+            None
+        """
+        self._update(job_id, status=JobStatus.RUNNING.value)
+        try:
+            result = function(*args, **kwargs)
+            self._update(job_id, status=JobStatus.SUCCEEDED.value, result=result, finished_at=time.time())
+            logger.info("Ingestion job {} succeeded", job_id)
+        except Exception as e:
+            self._update(job_id, status=JobStatus.FAILED.value, error=str(e), finished_at=time.time())
+            logger.error("Ingestion job {} failed: {}", job_id, e)
+
+        with self._lock:
+            self._finished.append(job_id)
+            while len(self._finished) > self.max_finished_jobs:
+                self._jobs.pop(self._finished.pop(0), None)
+
+    def _update(self, job_id: str, **fields) -> None:
+        """
+        Update the status fields of a job.
+
+        Args:
+            job_id (str): The id of the job.
+            **fields: The fields to update.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._jobs[job_id].update(fields)
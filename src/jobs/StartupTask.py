@@ -0,0 +1,149 @@
+import threading
+import time
+from enum import Enum
+from typing import Callable
+from src.cfg.logging_config import *
+
+
+class StartupStage(Enum):
+    """
+    An enumeration representing the stage of the application startup.
+
+    Attributes:
+        STARTING (str): The startup has not begun.
+        LOADING_MODEL (str): The model and its backends are being loaded.
+        INGESTING (str): The setup documents are being added.
+        READY (str): The startup finished and requests can be served.
+        FAILED (str): The startup raised an error.
+    """
+    STARTING = "starting"
+    LOADING_MODEL = "loading_model"
+    INGESTING = "ingesting"
+    READY = "ready"
+    FAILED = "failed"
+
+
+class StartupTask:
+    """
+    A class running the slow part of the application startup in a background thread.
+
+    The server binds its port and answers health probes right away, while the task loads the
+    model and adds the setup documents. The task reports its stage and progress, so readiness
+    probes can tell a slow startup from a failed one.
+    """
+
+    def __init__(self, function: Callable[["StartupTask"], None]):
+        """
+        Initialize a StartupTask object.
+
+        Args:
+            function (Callable[[StartupTask], None]): The function doing the startup. It is called
+                with the task, to report its stage and progress; the task is ready once it returns.
+        """
+        self._function = function
+        self._lock = threading.Lock()
+        self._stage = StartupStage.STARTING
+        self._progress = {}
+        self._error = None
+        self._started_at = None
+        self._finished_at = None
+        self._thread = None
+
+    @property
+    def is_ready(self) -> bool:
+        """
+        Check whether the startup finished successfully.
+        """
+        return self._stage == StartupStage.READY
+
+    def start(self) -> None:
+        """
+        Start the startup function in a background thread.
+
+        Returns:
+            None
+        """
+        self._started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="startup", daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Wait for the startup to finish.
+
+        Args:
+            timeout (float): The maximum number of seconds to wait, or None to wait until it finishes.
+
+        Returns:
+            bool: True if the startup finished successfully.
+        """
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.is_ready
+
+    def set_stage(self, stage: StartupStage) -> None:
+        """
+        Report the stage the startup has reached, clearing the progress of the previous stage.
+
+        Args:
+            stage (StartupStage): The stage.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._stage = stage
+            self._progress = {}
+        logger.info("Startup stage: {}", stage.value)
+
+    def set_progress(self, **progress) -> None:
+        """
+        Report the progress of the current stage.
+
+        Args:
+            **progress: The progress entries to set, e.g. the number of files done and to do.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._progress = dict(self._progress, **progress)
+
+    def status(self) -> dict:
+        """
+        Get the status of the startup.
+
+        Returns:
+            dict: The stage, the progress of the stage, the error if the startup failed and the
+                number of seconds the startup has been running or took.
+        """
+        with self._lock:
+            end = self._finished_at or time.time()
+            return {
+                "stage": self._stage.value,
+                "progress": dict(self._progress),
+                "error": self._error,
+                "elapsed_seconds": None if self._started_at is None else round(end - self._started_at, 3),
+            }
+
+    def _run(self) -> None:
+        """
+        Run the startup function and record its outcome.
+
+        Returns:
+            None
+        """
+        try:
+            self._function(self)
+        except Exception as e:
+            logger.error("Startup failed: {}", e)
+            with self._lock:
+                self._stage = StartupStage.FAILED
+                self._error = str(e)
+                self._finished_at = time.time()
+            return
+        with self._lock:
+            self._stage = StartupStage.READY
+            self._progress = {}
+            self._finished_at = time.time()
+        logger.info("Startup finished in {:.1f}s", self._finished_at - self._started_at)
@@ -1,6 +1,13 @@
+import contextlib
+import io
+import os
 from abc import ABC, abstractmethod
+from typing import BinaryIO, Iterator, Union
 from src.inputs.InputFile import InputFile
 
+# The content of a file: the path to it, its bytes (bytes, bytearray or memoryview) or a binary file object
+FileSource = Union[str, bytes, bytearray, memoryview, BinaryIO]
+
 
 class Loader(ABC):
     """
@@ -9,20 +16,24 @@ class Loader(ABC):
     This class defines an interface for loading files and provides
     a method for loading a single file, which subclasses must implement.
 
+    A file is given as a FileSource: a path, or content already in memory such as an upload,
+    which is read without being written to disk first.
+
     Attributes:
         None
     """
 
     @staticmethod
     @abstractmethod
-    def load_single_file(file_path: str) -> InputFile:
+    def load_single_file(source: FileSource, name: str = None) -> InputFile:
         """
         Load a single file and return an InputFile object.
 
         This method must be implemented by subclasses.
 
         Args:
-            file_path (str): The path to the file.
+            source (FileSource): The path to the file, or its content.
+            name (str): The name of the file. Defaults to the base name of the path.
 
         Returns:
             InputFile: An object representing the loaded file.
@@ -31,3 +42,77 @@ class Loader(ABC):
             FileNotFoundError: If the specified file_path does not exist.
         """
         pass
+
+    @classmethod
+    def iter_pages(cls, source: FileSource) -> Iterator[str]:
+        """
+        Lazily yield the pages of a file one at a time.
+
+        Subclasses that can read a file incrementally should override this method; the
+        default implementation loads the whole file and yields its pages.
+
+        Args:
+            source (FileSource): The path to the file, or its content.
+
+        Yields:
+            str: The content of each page, in document order.
+        """
+        yield from cls.load_single_file(source).data.get("pages")
+
+    @staticmethod
+    def source_name(source: FileSource, name: str = None) -> str:
+        """
+        Get the name of a file.
+
+        Args:
+            source (FileSource): The path to the file, or its content.
+            name (str): The name given for the file, if any.
+
+        Returns:
+            str: The name given, the base name of the path, or "document" for unnamed content.
+        """
+        if name is not None:
+            return name
+        return os.path.basename(source) if isinstance(source, str) else "document"
+
+    @staticmethod
+    @contextlib.contextmanager
+    def open_binary(source: FileSource) -> Iterator[BinaryIO]:
+        """
+        Open the content of a file for binary reading.
+
+        Paths are opened and closed again; bytes-like content is wrapped in a BytesIO, which
+        shares the buffer of a bytes object rather than copying it; file objects are read from
+        their current position and left open.
+
+        Args:
+            source (FileSource): The path to the file, or its content.
+
+        Yields:
+            BinaryIO: The binary file object.
+        """
+        if isinstance(source, str):
+            with open(source, "rb") as file:
+                yield file
+        elif isinstance(source, (bytes, bytearray, memoryview)):
+            yield io.BytesIO(source)
+        else:
+            yield source
+
+    @staticmethod
+    def read_bytes(source: FileSource) -> bytes:
+        """
+        Read the content of a file into memory.
+
+        Args:
+            source (FileSource): The path to the file, or its content.
+
+        Returns:
+            bytes: The content. A bytes object is returned as is.
+        """
+        if isinstance(source, bytes):
+            return source
+        if isinstance(source, (bytearray, memoryview)):
+            return bytes(source)
+        with Loader.open_binary(source) as file:
+            return file.read()
@@ -1,9 +1,7 @@
-import os
-import PyPDF2
-
+from typing import BinaryIO, Iterator
 from src.inputs.PdfInputFile import PdfInputFile
 from src.inputs.InputFile import InputFile
-from src.loaders.Loader import Loader
+from src.loaders.Loader import FileSource, Loader
 from src.cfg.logging_config import *
 
 
@@ -16,26 +14,90 @@ class PdfLoader(Loader):
     """
 
     @staticmethod
-    def load_single_file(file_path: str) -> InputFile:
+    def load_single_file(source: FileSource, name: str = None) -> InputFile:
         """
         Load a single PDF file and create a PdfInputFile object.
 
         Args:
-            file_path (str): The path to the PDF file.
+            source (FileSource): The path to the PDF file, or its content.
+            name (str): The name of the PDF file. Defaults to the base name of the path.
 
         Returns:
-            PdfInputFile: An object representing the loaded PDF file.
+            PdfInputFile: An object representing the loaded PDF file. Its path is the path
+                given, or the name for content in memory.
+
+        Raises:
+            FileNotFoundError: If the specified file_path does not exist.
+        """
+        pdf_title = Loader.source_name(source, name)
+        pages = list(PdfLoader.iter_pages(source))
+
+        logger.info("Successfully read {} to PdfInputFile object", pdf_title)
+        return PdfInputFile(name=pdf_title, path=source if isinstance(source, str) else pdf_title, pages=pages)
+
+    @classmethod
+    def iter_pages(cls, source: FileSource) -> Iterator[str]:
+        """
+        Lazily yield the text of each page of a PDF file, extracting one page at a time.
+
+        Args:
+            source (FileSource): The path to the PDF file, or its content.
+
+        Yields:
+            str: The text of each page, in page order.
 
         Raises:
             FileNotFoundError: If the specified file_path does not exist.
         """
-        with open(file_path, "rb") as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            pdf_title = os.path.basename(file_path)
-            pages = []
+        with Loader.open_binary(source) as file:
+            pdf_reader = PdfLoader.pdf_reader(file)
             for page_num in range(len(pdf_reader.pages)):
-                page_content = pdf_reader.pages[page_num].extract_text()
-                pages.append(page_content)
+                yield pdf_reader.pages[page_num].extract_text()
+
+    @staticmethod
+    def count_pages(source: FileSource) -> int:
+        """
+        Count the pages of a PDF file without extracting their text.
+
+        Args:
+            source (FileSource): The path to the PDF file, or its content.
+
+        Returns:
+            int: The number of pages in the PDF file.
+        """
+        with Loader.open_binary(source) as file:
+            return len(PdfLoader.pdf_reader(file).pages)
+
+    @staticmethod
+    def pdf_reader(file: BinaryIO):
+        """
+        Open a PDF for reading, importing PyPDF2 on first use so that importing the loader stays cheap.
+
+        Args:
+            file (BinaryIO): The binary file object of the PDF.
+
+        Returns:
+            PyPDF2.PdfReader: The reader.
+        """
+        import PyPDF2
 
-            logger.info("Successfully read {} to PdfInputFile object", pdf_title)
-            return PdfInputFile(name=pdf_title, path=file_path, pages=pages)
+        return PyPDF2.PdfReader(file)
+
+    @staticmethod
+    def extract_pages(source: FileSource, start: int, stop: int) -> list[str]:
+        """
+        Extract the text of a range of pages of a PDF file.
+
+        This lets a large PDF be split across worker processes, each extracting its own range.
+
+        Args:
+            source (FileSource): The path to the PDF file, or its content as bytes.
+            start (int): The index of the first page to extract.
+            stop (int): The index one past the last page to extract.
+
+        Returns:
+            list[str]: The text of each page in the range, in page order.
+        """
+        with Loader.open_binary(source) as file:
+            pdf_reader = PdfLoader.pdf_reader(file)
+            return [pdf_reader.pages[page_num].extract_text() for page_num in range(start, stop)]
@@ -1,8 +1,7 @@
-import os
 from src.inputs.TextInputFile import TextInputFile
 from src.inputs.InputFile import InputFile
-from src.loaders.Loader import Loader
-import nltk
+from src.loaders.Loader import FileSource, Loader
+from src.segmenters.SentenceSegmenter import SentenceSegmenter
 from src.cfg.logging_config import *
 
 
@@ -15,26 +14,34 @@ class TextLoader(Loader):
     """
 
     @staticmethod
-    def load_single_file(file_path: str) -> InputFile:
+    def load_single_file(source: FileSource, name: str = None) -> InputFile:
         """
         Load a single text file and create a TextInputFile object.
 
         Args:
-            file_path (str): The path to the text file.
+            source (FileSource): The path to the text file, or its UTF-8 encoded content.
+            name (str): The name of the text file. Defaults to the base name of the path.
 
         Returns:
-            TextInputFile: An object representing the loaded text file.
+            TextInputFile: An object representing the loaded text file. Its path is the path
+                given, or the name for content in memory.
 
         Raises:
             FileNotFoundError: If the specified file_path does not exist.
+            UnicodeDecodeError: If content in memory is not UTF-8 encoded.
         """
-        with open(file_path, "r") as file:
-            text = file.read()
-            text_title = os.path.basename(file_path)
-            pages = TextLoader.chunk_text(text)
-
-            logger.info("Successfully read {} to TextInputFile object", text_title)
-            return TextInputFile(name=text_title, path=file_path, pages=pages)
+        text_title = Loader.source_name(source, name)
+        if isinstance(source, str):
+            with open(source, "r") as file:
+                text = file.read()
+        elif isinstance(source, (bytes, bytearray, memoryview)):
+            text = str(source, "utf-8")
+        else:
+            text = source.read().decode("utf-8")
+        pages = TextLoader.chunk_text(text)
+
+        logger.info("Successfully read {} to TextInputFile object", text_title)
+        return TextInputFile(name=text_title, path=source if isinstance(source, str) else text_title, pages=pages)
 
     @staticmethod
     def chunk_text(text, max_chunk_length=5000):
@@ -48,13 +55,8 @@ class TextLoader(Loader):
         Returns:
             list[str]: A list of text chunks.
         """
-        # Initialize NLTK sentence tokenizer
-        # TODO: Could probably do this somewhere else
-        nltk.download('punkt')
-        tokenizer = nltk.data.load('tokenizers/punkt/english.pickle')
-
-        # Tokenize text into sentences
-        sentences = tokenizer.tokenize(text)
+        # Tokenize text into sentences with the process-wide segmenter, loaded on first use
+        sentences = SentenceSegmenter.get().tokenize(text)
 
         # Initialize chunk list
         chunks = []
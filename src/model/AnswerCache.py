@@ -0,0 +1,220 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from src.cfg.logging_config import *
+
+
+class AnswerCache:
+    """
+    A class caching answers to questions, matched exactly or, optionally, by semantic similarity.
+
+    A question is first looked up by its normalized text. If that misses and semantic matching
+    is turned on, its embedding is compared with the embeddings of the cached questions asking
+    for the same numbers, and the answer of the most similar one is returned if the cosine
+    similarity reaches similarity_threshold. Semantic matching is off by default: questions
+    differing only in an entity, number or date, e.g. "2022 revenue" and "2023 revenue", can be
+    this similar and would get each other's answers. Questions asked in different scopes, e.g.
+    restricted to different documents, never match each other. Entries expire after ttl_seconds
+    and the least recently used entries are evicted beyond max_entries. The cache must be
+    cleared whenever the corpus changes, since cached answers may then be stale.
+
+    Attributes:
+        embeddings (Embeddings): The embeddings used to embed questions.
+        max_entries (int): The maximum number of cached answers. 0 disables the cache.
+        ttl_seconds (float): The number of seconds an answer stays valid.
+        semantic_match (bool): Whether questions are also matched by semantic similarity.
+        similarity_threshold (float): The minimum cosine similarity for a semantic match.
+        hits (int): The number of questions answered from the cache.
+        misses (int): The number of questions not found in the cache.
+        generation (int): The number of times the cache has been cleared.
+    """
+
+    def __init__(self, embeddings: Embeddings, max_entries: int = 1024, ttl_seconds: float = 3600.0,
+                 semantic_match: bool = False, similarity_threshold: float = 0.98):
+        """
+        Initialize an AnswerCache object.
+
+        Args:
+            embeddings (Embeddings): The embeddings used to embed questions.
+            max_entries (int): The maximum number of cached answers. 0 disables the cache.
+            ttl_seconds (float): The number of seconds an answer stays valid.
+            semantic_match (bool): Whether questions are also matched by semantic similarity.
+            similarity_threshold (float): The minimum cosine similarity for a semantic match.
+        """
+        self.embeddings = embeddings
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.semantic_match = semantic_match
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._matrix = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        """
+        Normalize a question for exact matching.
+
+        Args:
+            question (str): The question.
+
+        Returns:
+            str: The question lower-cased, with whitespace collapsed and trailing punctuation removed.
+        """
+        return re.sub(r"\s+", " ", question).strip().rstrip("?!. ").lower()
+
+    @staticmethod
+    def numbers(question: str) -> frozenset:
+        """
+        Get the numbers a question asks about, which a semantically similar question must share.
+
+        Args:
+            question (str): The question.
+
+        Returns:
+            frozenset: The numbers in the question, e.g. years, amounts and ordinals.
+        """
+        return frozenset(re.findall(r"\d+(?:[.,]\d+)*", question))
+
+    def get(self, question: str, scope: str = None) -> str:
+        """
+        Get the cached answer to a question or to a semantically similar question.
+
+        Args:
+            question (str): The question.
+            scope (str): The scope the question is asked in, or None for the whole corpus.
+
+        Returns:
+            str: The cached answer, or None if there is none.
+        """
+        return self.lookup(question, scope)[0]
+
+    def lookup(self, question: str, scope: str = None) -> tuple[str, np.ndarray]:
+        """
+        Get the cached answer to a question or to a semantically similar question, with the
+        embedding of the question, so that put() does not embed it again.
+
+        Args:
+            question (str): The question.
+            scope (str): The scope the question is asked in, or None for the whole corpus.
+
+        Returns:
+            tuple[str, np.ndarray]: The cached answer, or None if there is none, and the
+                normalized embedding of the question, or None if it was not embedded.
+        """
+        if self.max_entries <= 0:
+            return None, None
+        key = (scope, AnswerCache.normalize(question))
+        with self._lock:
+            self._evict_expired()
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._matrix = None
+                self.hits += 1
+                logger.info("Answer cache exact hit for question: {}", question)
+                return self._entries[key]["answer"], None
+            if not self.semantic_match or not self._entries:
+                self.misses += 1
+                return None, None
+
+        vector = self._embed(question)
+        numbers = AnswerCache.numbers(question)
+        with self._lock:
+            if not self._entries:
+                self.misses += 1
+                return None, vector
+            if self._matrix is None:
+                self._matrix = np.stack([entry["vector"] for entry in self._entries.values()])
+            similarities = self._matrix @ vector
+            similarities[[entry_scope != scope or entry["numbers"] != numbers
+                          for (entry_scope, _), entry in self._entries.items()]] = -np.inf
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.similarity_threshold:
+                best_key = list(self._entries.keys())[best]
+                self._entries.move_to_end(best_key)
+                self._matrix = None
+                self.hits += 1
+                logger.info("Answer cache semantic hit ({:.3f}) for question: {}", similarities[best], question)
+                return self._entries[best_key]["answer"], vector
+            self.misses += 1
+            return None, vector
+
+    def put(self, question: str, answer: str, generation: int = None, scope: str = None,
+            vector: np.ndarray = None) -> None:
+        """
+        Cache the answer to a question.
+
+        Args:
+            question (str): The question.
+            answer (str): The answer.
+            generation (int): The cache generation read before the answer was computed. If the
+                cache has been cleared since, the answer may be stale and is not cached.
+            scope (str): The scope the question was asked in, or None for the whole corpus.
+            vector (np.ndarray): The embedding of the question returned by lookup(), or None to
+                embed it here when semantic matching is turned on.
+
+        Returns:
+            None
+        """
+        if self.max_entries <= 0:
+            return
+        if self.semantic_match and vector is None:
+            vector = self._embed(question)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            key = (scope, AnswerCache.normalize(question))
+            self._entries[key] = {"answer": answer, "vector": vector, "numbers": AnswerCache.numbers(question),
+                                  "expires_at": time.monotonic() + self.ttl_seconds}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def clear(self) -> None:
+        """
+        Remove all cached answers, e.g. because the corpus changed.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if self._entries:
+                logger.info("Clearing {} cached answers", len(self._entries))
+            self._entries.clear()
+            self._matrix = None
+            self.generation += 1
+
+    def _embed(self, question: str) -> np.ndarray:
+        """
+        Embed a question as a unit-length vector.
+
+        Args:
+            question (str): The question.
+
+        Returns:
+            np.ndarray: The normalized embedding of the question.
+        """
+        vector = np.asarray(self.embeddings.embed_query(AnswerCache.normalize(question)), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _evict_expired(self) -> None:
+        """
+        Remove expired entries. Must be called with the lock held.
+
+        Returns:
+            None
+        """
+        now = time.monotonic()
+        expired = [key for key, entry in self._entries.items() if entry["expires_at"] <= now]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
@@ -0,0 +1,138 @@
+import asyncio
+import os
+import threading
+from typing import Any, AsyncIterator, Iterator, List, Optional
+from langchain_community.llms import LlamaCpp
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.outputs import GenerationChunk
+from langchain_core.pydantic_v1 import Field, PrivateAttr
+from src.cfg.logging_config import *
+
+
+class LlamaCppLanguageModel(LlamaCpp):
+    """
+    A language model running a GGUF model locally on the CPU with llama.cpp.
+
+    A llama.cpp model holds a single context, so it must not generate for two prompts at once.
+    Generations are serialized on a lock, so one loaded model can be shared by every request.
+    A streamed generation takes and releases the lock on the thread running it, which for
+    astream() is a dedicated thread handing the pieces back to the event loop. The context
+    window defaults to 4096 tokens, large enough for a question and its context.
+
+    Attributes:
+        MODEL_PATH (str): The path the model is loaded from unless another one is given.
+    """
+    MODEL_PATH = "./data/llama/model.gguf"
+
+    n_ctx: int = Field(4096, alias="n_ctx")
+    max_tokens: Optional[int] = 512
+    temperature: Optional[float] = 0.0
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @staticmethod
+    def load(model_path: str = MODEL_PATH, **kwargs) -> "LlamaCppLanguageModel":
+        """
+        Load a model from a local file.
+
+        Args:
+            model_path (str): The path to the GGUF model file.
+            **kwargs: Additional LlamaCpp parameters, such as n_ctx, n_threads or max_tokens.
+
+        Returns:
+            LlamaCppLanguageModel: The loaded model.
+
+        Raises:
+            ImportError: If llama-cpp-python is not installed.
+            LookupError: If the model file does not exist.
+        """
+        if not os.path.isfile(model_path):
+            raise LookupError("Language model not found at {}".format(model_path))
+        language_model = LlamaCppLanguageModel(model_path=model_path, **kwargs)
+        logger.info("Loaded language model from {}", model_path)
+        return language_model
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None,
+              run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> str:
+        """
+        Generate the completion of a prompt, waiting for other generations to finish first.
+
+        Args:
+            prompt (str): The prompt.
+            stop (Optional[List[str]]): The strings stopping the generation when produced.
+            run_manager (Optional[CallbackManagerForLLMRun]): The callback manager of the run.
+
+        Returns:
+            str: The completion.
+        """
+        with self._lock:
+            return super()._call(prompt, stop, run_manager, **kwargs)
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[GenerationChunk]:
+        """
+        Generate the completion of a prompt piece by piece, holding the model until it is complete.
+
+        Args:
+            prompt (str): The prompt.
+            stop (Optional[List[str]]): The strings stopping the generation when produced.
+            run_manager (Optional[CallbackManagerForLLMRun]): The callback manager of the run.
+
+        Yields:
+            GenerationChunk: The next piece of the completion.
+        """
+        with self._lock:
+            yield from super()._stream(prompt, stop, run_manager, **kwargs)
+
+    async def _astream(self, prompt: str, stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[GenerationChunk]:
+        """
+        Generate the completion of a prompt piece by piece without blocking the event loop.
+
+        The whole generation runs on one dedicated thread, which holds the model until the
+        completion is done or the caller stops reading, and queues each piece for the loop.
+
+        Args:
+            prompt (str): The prompt.
+            stop (Optional[List[str]]): The strings stopping the generation when produced.
+            run_manager (Optional[AsyncCallbackManagerForLLMRun]): The callback manager of the run.
+
+        Yields:
+            GenerationChunk: The next piece of the completion.
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        stopped = threading.Event()
+
+        def put(chunk: Optional[GenerationChunk], error: Optional[BaseException] = None) -> None:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, (chunk, error))
+            except RuntimeError:
+                # The loop was closed, so nobody is reading the completion anymore
+                stopped.set()
+
+        def generate() -> None:
+            chunks = self._stream(prompt, stop, run_manager.get_sync() if run_manager else None, **kwargs)
+            try:
+                for chunk in chunks:
+                    if stopped.is_set():
+                        break
+                    put(chunk)
+            except BaseException as e:
+                put(None, e)
+            finally:
+                # Closing the generator on this thread releases the lock on the thread that took it
+                chunks.close()
+            put(None)
+
+        threading.Thread(target=generate, name="llama-cpp-stream", daemon=True).start()
+        try:
+            while True:
+                chunk, error = await queue.get()
+                if error is not None:
+                    raise error
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            stopped.set()
@@ -1,12 +1,26 @@
+import asyncio
+import contextlib
+import functools
+import os
+import threading
 from enum import Enum
+from typing import Any, AsyncIterator, Callable, Iterator, NamedTuple
+from langchain_core.documents import Document
 from langchain_core.embeddings import Embeddings
 from langchain.chains.base import Chain
 from langchain_core.language_models import BaseLanguageModel
-from langchain_openai import ChatOpenAI
-from langchain.chains import RetrievalQA
-from langchain_openai import OpenAIEmbeddings
+from langchain_core.prompt_values import PromptValue
+from langchain_core.retrievers import BaseRetriever
+from src.compressors.CompressingRetriever import CompressingRetriever
+from src.compressors.ContextCompressor import ContextCompressor
+from src.embeddings.CachedEmbeddings import CachedEmbeddings
+from src.model.AnswerCache import AnswerCache
 from src.inputs.InputFile import InputFile
-from src.storage.ChromaVectorStore import ChromaVectorStore
+from src.parsers.FileParser import FileParser
+from src.rerankers.Reranker import Reranker, RerankerOptions
+from src.rerankers.RerankingRetriever import RerankingRetriever
+from src.storage.IngestManifest import IngestManifest
+from src.storage.TitleIndex import ChunkFilter
 from src.storage.VectorStore import VectorStore, VectorStoreOptions
 from src.cfg.logging_config import *
 
@@ -17,9 +31,13 @@ class EmbeddingsOptions(Enum):
 
     Attributes:
         CHAT_GPT (str): Represents Chat GPT embeddings.
+        LOCAL (str): Represents a sentence-transformers model run locally on the CPU.
+        HASHING (str): Represents deterministic hashed term embeddings needing no model, e.g. for tests.
         DEFAULT (str): Represents the default embeddings.
     """
     CHAT_GPT = "Chat GPT"
+    LOCAL = "Local"
+    HASHING = "Hashing"
     DEFAULT = "Default"
 
 
@@ -41,12 +59,28 @@ class LanguageModelOptions(Enum):
 
     Attributes:
         GPT_3_5_TURBO (str): Represents the GPT-3.5-turbo language model.
+        LLAMA_CPP (str): Represents a GGUF model run locally on the CPU with llama.cpp.
+        FAKE (str): Represents a fake language model giving a fixed answer, e.g. for tests.
         DEFAULT (str): Represents the default language model.
     """
     GPT_3_5_TURBO = "gpt-3.5-turbo"
+    LLAMA_CPP = "LlamaCpp"
+    FAKE = "Fake"
     DEFAULT = "Default"
 
 
+class ModelSnapshot(NamedTuple):
+    """
+    An immutable view of the model that a question is answered against.
+
+    Attributes:
+        chain (Chain): The chain answering questions, whose retriever sees the snapshot's epoch.
+        epoch (int): The vector store epoch published when the snapshot was taken.
+    """
+    chain: Chain
+    epoch: int
+
+
 class QuestionAnswerModel:
     """
     A class representing a question-answer model.
@@ -54,20 +88,45 @@ class QuestionAnswerModel:
     This class allows for easy configuration and usage of a question-answer system,
     including options for embeddings, chains, language models, and vector stores.
 
+    Questions are answered against an immutable ModelSnapshot, read without locking. Documents
+    are added by a single writer at a time, which publishes a new snapshot once a whole batch is
+    stored, RCU-style: questions never wait for an upload or see part of one, and chunks
+    superseded by an upload are only deleted once no question is still using an older snapshot.
+
     Attributes:
         embeddings (Embeddings): The embeddings used by the model.
         vector_store (VectorStore): The vector store used by the model.
         vector_store_type (VectorStoreOptions): The type of the vector store.
         language_model (BaseLanguageModel): The language model used by the model.
-        chain (Chain): The chain used by the model.
+        chain (Chain): The chain of the current snapshot.
+        answer_cache (AnswerCache): The cache of answers to recent questions.
+        reranker (Reranker): The reranker of retrieved chunks, or None.
+        rerank_config (dict): The number of candidates over-fetched and of chunks kept when reranking.
+        context_compressor (ContextCompressor): The compressor fitting retrieved chunks into the
+            prompt's token budget, or None.
+        run_in_background (Callable[[Callable[[], Any]], Any]): The function running reclaims of
+            superseded chunks in the background, or None to run them on the thread answering.
+        DEFAULT_RERANK_CONFIG (dict): The rerank settings used unless they are configured.
     """
 
+    DEFAULT_RERANK_CONFIG = {"candidates": 20, "k": 4}
+
     def __init__(
             self,
             embeddings: EmbeddingsOptions,
             chain: ChainOptions,
             vector_store: VectorStoreOptions,
-            language_model: LanguageModelOptions
+            language_model: LanguageModelOptions,
+            persist_directory: str = None,
+            embedding_cache_path: str = None,
+            vector_store_config: dict = None,
+            answer_cache_config: dict = None,
+            reranker: RerankerOptions = RerankerOptions.NONE,
+            rerank_config: dict = None,
+            context_config: dict = None,
+            embeddings_config: dict = None,
+            language_model_config: dict = None,
+            run_in_background: Callable[[Callable[[], Any]], Any] = None
     ):
         """
         Initialize a QuestionAnswerModel object.
@@ -77,59 +136,270 @@ class QuestionAnswerModel:
             chain (ChainOptions): The chain option for the model.
             vector_store (VectorStoreOptions): The vector store option for the model.
             language_model (LanguageModelOptions): The language model option for the model.
+            persist_directory (str): The directory to persist the vector store to. If None, the
+                vector store is kept in memory only.
+            embedding_cache_path (str): The path to the SQLite embedding cache. If None, the
+                cache is kept in memory only.
+            vector_store_config (dict): Additional keyword arguments for the vector store, such as
+                its embedding batch size and concurrency.
+            answer_cache_config (dict): Keyword arguments for the answer cache, such as its size,
+                TTL and whether it matches questions semantically.
+            reranker (RerankerOptions): The reranker option. Unless it is NONE, the retriever
+                over-fetches candidates and the reranker keeps the best of them for the prompt.
+            rerank_config (dict): The number of 'candidates' over-fetched and the number 'k' of
+                chunks kept when reranking.
+            context_config (dict): Keyword arguments for the context compressor, such as its
+                token budget. If None, retrieved chunks are stuffed into the prompt whole.
+            embeddings_config (dict): Keyword arguments for the embeddings backend, such as the
+                directory of a local model. Values must be hashable.
+            language_model_config (dict): Keyword arguments for the language model backend, such
+                as the path of a local model. Values must be hashable.
+            run_in_background (Callable[[Callable[[], Any]], Any]): The function handing superseded
+                chunks to be reclaimed to a background thread once the last question using them
+                is answered, e.g. IngestJobQueue.execute, so questions answered on an event loop
+                never reclaim them there. If None, they are reclaimed by the thread answering the
+                question.
         """
-        self.embeddings = self.initialize_embeddings(embeddings)
-        self.vector_store = self.initialize_vector_store(vector_store)
+        self.embeddings = self.initialize_embeddings(embeddings, embedding_cache_path, embeddings_config)
+        self.vector_store = self.initialize_vector_store(vector_store, persist_directory, vector_store_config)
         self.vector_store_type = vector_store
-        self.language_model = self.initialize_language_model(language_model)
-        self.chain = self.initialize_chain(chain)
+        self.vector_store.defer_reclaim = True
+        self.language_model = self.initialize_language_model(language_model, language_model_config)
+        self.chain_type = chain
+        self.reranker = None if reranker == RerankerOptions.NONE else Reranker.get(reranker)
+        self.rerank_config = dict(QuestionAnswerModel.DEFAULT_RERANK_CONFIG, **(rerank_config or {}))
+        self.context_compressor = None if context_config is None else ContextCompressor(**context_config)
+        self.answer_cache = AnswerCache(self.embeddings, **(answer_cache_config or {}))
+        self._snapshot = ModelSnapshot(self.initialize_chain(chain), self.vector_store.published_epoch)
+        self._write_lock = threading.Lock()
+        self._readers_lock = threading.Lock()
+        self._readers = {}
+        self._pending_reclaim = []
+        self.run_in_background = run_in_background
+
+    @property
+    def chain(self) -> Chain:
+        """
+        Get the chain of the current snapshot.
+        """
+        return self._snapshot.chain
+
+    @contextlib.contextmanager
+    def read_snapshot(self) -> Iterator[ModelSnapshot]:
+        """
+        Take the current snapshot for the duration of a question.
+
+        Returns:
+            Iterator[ModelSnapshot]: A context manager yielding the snapshot.
+        """
+        with self._readers_lock:
+            snapshot = self._snapshot
+            self._readers[snapshot.epoch] = self._readers.get(snapshot.epoch, 0) + 1
+        try:
+            yield snapshot
+        finally:
+            with self._readers_lock:
+                self._readers[snapshot.epoch] -= 1
+                released = self._readers[snapshot.epoch] == 0
+                if released:
+                    del self._readers[snapshot.epoch]
+            # Superseded chunks can only become reclaimable once the last reader of an epoch is done
+            if released and self._pending_reclaim:
+                if self.run_in_background is not None:
+                    self.run_in_background(self._reclaim)
+                else:
+                    self._reclaim()
+
+    def _write(self, write: Callable[[], Any]) -> Any:
+        """
+        Apply a write to the vector store and publish a new snapshot once it is complete.
+
+        A write leaving a file streamed in slices half added is not published, so no snapshot
+        holds part of a file. Its chunks are published with the write adding its last slice. If
+        the write raises, the chunks written for files left half added are dropped instead.
+
+        Args:
+            write (Callable[[], Any]): The function writing to the vector store.
+
+        Returns:
+            Any: The value returned by write.
+        """
+        with self._write_lock:
+            try:
+                result = write()
+            except BaseException:
+                self.vector_store.abort_pending()
+                raise
+            if self.vector_store.pending_ids:
+                return result
+            superseded_ids = self.vector_store.publish()
+            snapshot = ModelSnapshot(self.initialize_chain(self.chain_type), self.vector_store.published_epoch)
+            with self._readers_lock:
+                self._snapshot = snapshot
+                if superseded_ids:
+                    self._pending_reclaim.append((snapshot.epoch, superseded_ids))
+            self.answer_cache.clear()
+        self._reclaim()
+        return result
+
+    @contextlib.contextmanager
+    def _streaming(self) -> Iterator[None]:
+        """
+        Add the batches of a stream of files, dropping the chunks of files left half added if the
+        stream stops partway, so later writes are published.
+
+        Returns:
+            Iterator[None]: A context manager around the loop adding the batches.
+        """
+        try:
+            yield
+        except BaseException:
+            with self._write_lock:
+                self.vector_store.abort_pending()
+            raise
+
+    def _reclaim(self) -> None:
+        """
+        Delete superseded chunks that no question in progress can still retrieve.
+
+        Returns:
+            None
+        """
+        if not self._pending_reclaim or not self._write_lock.acquire(blocking=False):
+            return
+        try:
+            with self._readers_lock:
+                oldest_epoch = min(self._readers, default=None)
+                ready = [(epoch, ids) for epoch, ids in self._pending_reclaim
+                         if oldest_epoch is None or oldest_epoch >= epoch]
+                self._pending_reclaim = [entry for entry in self._pending_reclaim if entry not in ready]
+            for _, ids in ready:
+                self.vector_store.reclaim(ids)
+        finally:
+            self._write_lock.release()
 
     @staticmethod
-    def initialize_embeddings(embeddings: EmbeddingsOptions) -> Embeddings:
+    def initialize_embeddings(embeddings: EmbeddingsOptions, cache_path: str = None,
+                              config: dict = None) -> Embeddings:
         """
         Initialize embeddings based on the selected option.
 
+        The embeddings are wrapped in a content-addressed cache so that text which has been
+        embedded before is never sent to the embeddings backend again.
+
         Args:
             embeddings (EmbeddingsOptions): The embeddings option.
+            cache_path (str): The path to the SQLite embedding cache, or None for an in-memory cache.
+            config (dict): Keyword arguments for the embeddings backend, or None.
 
         Returns:
             Embeddings: The initialized embeddings.
         """
-        if embeddings == EmbeddingsOptions.CHAT_GPT:
-            return OpenAIEmbeddings()
+        base_embeddings = QuestionAnswerModel.load_embeddings(embeddings, tuple(sorted((config or {}).items())))
+        return CachedEmbeddings(base_embeddings, cache_path or ":memory:")
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def load_embeddings(embeddings: EmbeddingsOptions, config: tuple = ()) -> Embeddings:
+        """
+        Load an embeddings backend once per process, so every model using it shares its client
+        or its weights.
+
+        Args:
+            embeddings (EmbeddingsOptions): The embeddings option.
+            config (tuple): The keyword arguments for the backend, as sorted (name, value) pairs.
+
+        Returns:
+            Embeddings: The embeddings backend.
+
+        Raises:
+            ImportError: If LOCAL is requested and sentence-transformers is not installed.
+            LookupError: If LOCAL is requested and its model is not available locally.
+        """
+        # Backends are imported on first use, so only the selected one is ever loaded
+        if embeddings == EmbeddingsOptions.LOCAL:
+            from src.embeddings.LocalEmbeddings import LocalEmbeddings
+            return LocalEmbeddings(**dict(config))
+        elif embeddings == EmbeddingsOptions.HASHING:
+            from src.embeddings.HashingEmbeddings import HashingEmbeddings
+            return HashingEmbeddings(**dict(config))
         else:
-            return OpenAIEmbeddings()
+            from langchain_openai import OpenAIEmbeddings
+            return OpenAIEmbeddings(**dict(config))
 
-    def initialize_vector_store(self, vector_store: VectorStoreOptions) -> VectorStore:
+    def initialize_vector_store(self, vector_store: VectorStoreOptions, persist_directory: str = None,
+                                vector_store_config: dict = None) -> VectorStore:
         """
         Initialize a vector store based on the selected option.
 
         Args:
             vector_store (VectorStoreOptions): The vector store option.
+            persist_directory (str): The directory to persist the vector store to, or None.
+            vector_store_config (dict): Additional keyword arguments for the vector store.
 
         Returns:
             VectorStore: The initialized vector store.
         """
+        # Chroma pulls in chromadb and HNSW pulls in hnswlib, so only the selected store is imported
+        vector_store_config = vector_store_config or {}
         if vector_store == VectorStoreOptions.CHROMA:
-            return ChromaVectorStore(self.embeddings)
+            from src.storage.ChromaVectorStore import ChromaVectorStore
+            return ChromaVectorStore(self.embeddings, persist_directory, **vector_store_config)
+        elif vector_store in (VectorStoreOptions.NUMPY, VectorStoreOptions.HNSW):
+            # Chroma owns the root of the persist directory, so other stores persist to a subdirectory
+            if persist_directory is not None:
+                persist_directory = os.path.join(persist_directory, vector_store.value.lower())
+            if vector_store == VectorStoreOptions.HNSW:
+                from src.storage.HnswVectorStore import HnswVectorStore
+                return HnswVectorStore(self.embeddings, persist_directory, **vector_store_config)
+            from src.storage.NumpyVectorStore import NumpyVectorStore
+            return NumpyVectorStore(self.embeddings, persist_directory, **vector_store_config)
         else:
-            return ChromaVectorStore(self.embeddings)
+            from src.storage.ChromaVectorStore import ChromaVectorStore
+            return ChromaVectorStore(self.embeddings, persist_directory, **vector_store_config)
 
     @staticmethod
-    def initialize_language_model(language_model: LanguageModelOptions) -> BaseLanguageModel:
+    def initialize_language_model(language_model: LanguageModelOptions, config: dict = None) -> BaseLanguageModel:
         """
         Initialize a language model based on the selected option.
 
         Args:
             language_model (LanguageModelOptions): The language model option.
+            config (dict): Keyword arguments for the language model backend, or None.
 
         Returns:
             BaseLanguageModel: The initialized language model.
         """
-        if language_model == LanguageModelOptions.GPT_3_5_TURBO:
-            return ChatOpenAI(model_name="gpt-3.5-turbo")
+        return QuestionAnswerModel.load_language_model(language_model, tuple(sorted((config or {}).items())))
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def load_language_model(language_model: LanguageModelOptions, config: tuple = ()) -> BaseLanguageModel:
+        """
+        Load a language model backend once per process, so every model using it shares its
+        client or its weights.
+
+        Args:
+            language_model (LanguageModelOptions): The language model option.
+            config (tuple): The keyword arguments for the backend, as sorted (name, value) pairs.
+
+        Returns:
+            BaseLanguageModel: The language model.
+
+        Raises:
+            ImportError: If LLAMA_CPP is requested and llama-cpp-python is not installed.
+            LookupError: If LLAMA_CPP is requested and its model file does not exist.
+        """
+        config = dict(config)
+        if language_model == LanguageModelOptions.LLAMA_CPP:
+            from src.model.LlamaCppLanguageModel import LlamaCppLanguageModel
+            return LlamaCppLanguageModel.load(**config)
+        elif language_model == LanguageModelOptions.FAKE:
+            from langchain_core.language_models import FakeListChatModel
+            return FakeListChatModel(responses=[config.get("response", "I don't know.")])
         else:
-            return ChatOpenAI(model_name="gpt-3.5-turbo")
+            from langchain_openai import ChatOpenAI
+            return ChatOpenAI(**dict({"model_name": "gpt-3.5-turbo"}, **config))
 
     def initialize_chain(self, chain: ChainOptions) -> Chain:
         """
@@ -141,10 +411,29 @@ class QuestionAnswerModel:
         Returns:
             Chain: The initialized chain.
         """
+        from langchain.chains import RetrievalQA
+
         if chain == ChainOptions.RetrievalQA:
-            return RetrievalQA.from_chain_type(self.language_model, retriever=self.vector_store.as_retriever())
+            return RetrievalQA.from_chain_type(self.language_model, retriever=self.initialize_retriever())
         else:
-            return RetrievalQA.from_chain_type(self.language_model, retriever=self.vector_store.as_retriever())
+            return RetrievalQA.from_chain_type(self.language_model, retriever=self.initialize_retriever())
+
+    def initialize_retriever(self) -> BaseRetriever:
+        """
+        Initialize the retriever of a chain over the chunks published so far.
+
+        Returns:
+            BaseRetriever: The retriever of the vector store, wrapped in a RerankingRetriever
+                over-fetching candidates from it if the model has a reranker, and in a
+                CompressingRetriever if it has a context compressor.
+        """
+        retriever = self.vector_store.as_retriever()
+        if self.reranker is not None:
+            retriever = RerankingRetriever(retriever=retriever.copy(update={"k": self.rerank_config["candidates"]}),
+                                           reranker=self.reranker, k=self.rerank_config["k"])
+        if self.context_compressor is not None:
+            retriever = CompressingRetriever(retriever=retriever, compressor=self.context_compressor)
+        return retriever
 
     def add_document(self, input_file: InputFile) -> None:
         """
@@ -156,20 +445,521 @@ class QuestionAnswerModel:
         Returns:
             None
         """
-        self.vector_store.add_document(input_file)
-        self.chain.retriever = self.vector_store.as_retriever()
+        self._write(lambda: self.vector_store.add_document(input_file))
+
+    def add_documents(self, input_files: list[InputFile]) -> None:
+        """
+        Add a batch of documents to the model, publishing one new snapshot for the batch once
+        the last slice of each file in it is added.
+
+        Args:
+            input_files (list[InputFile]): InputFiles containing the documents to be added.
+
+        Returns:
+            None
+        """
+        self._write(lambda: self.vector_store.add_documents(input_files))
+
+    def delete_document(self, document_id: str) -> bool:
+        """
+        Delete a document from the model, publishing a new snapshot without it.
+
+        The file the document was stored from is left on disk and detached in the manifest, so
+        ingest_directory() and sync_files() do not add it back. add_files() adds it again.
+
+        Args:
+            document_id (str): The id of the document, as listed by list_documents().
+
+        Returns:
+            bool: True if the document was found and deleted.
+        """
+        def delete() -> bool:
+            file_path = self.vector_store.manifest.find(document_id)
+            if file_path is not None and os.path.isfile(file_path):
+                self.vector_store.manifest.detach(file_path)
+            return self.vector_store.delete_document(document_id)
+
+        return self._write(delete)
+
+    def list_documents(self) -> list[dict]:
+        """
+        List the documents stored from files.
+
+        Returns:
+            list[dict]: The id, file path and number of chunks of each document.
+        """
+        entries = dict(self.vector_store.manifest.entries)
+        return [{"document_id": IngestManifest.document_id(file_path), "path": file_path, "chunks": len(entry["ids"])}
+                for file_path, entry in entries.items()]
+
+    def ingest_directory(self, directory_path: str, batch_pages: int = 64, workers: int = None,
+                         on_progress: Callable[[int, int], None] = None) -> None:
+        """
+        Stream all new or changed files in a directory into the model in bounded batches.
+
+        Each batch of pages is added to the vector store before the next one is read, so the
+        whole directory is never held in memory at once. Files detached from their document in
+        the manifest, because it was deleted or replaced, are skipped. Documents stored from files
+        of the directory that no longer exist, e.g. deleted while the server was down, are
+        deleted first, as sync_files() does.
+
+        Args:
+            directory_path (str): The path to the directory.
+            batch_pages (int): The maximum number of pages read before they are added.
+            workers (int): The number of worker processes extracting PDF pages.
+            on_progress (Callable[[int, int], None]): Optional function called with the number of
+                files done (added or failed) and the number of files to add, before the first
+                batch, after each one and once all files are done.
+
+        Returns:
+            None
+        """
+        # A DirectoryWatcher only reports deletions after its first scan, so earlier ones are found here
+        deleted_paths = [file_path for file_path in list(self.vector_store.manifest.entries)
+                         if os.path.normpath(os.path.dirname(file_path)) == os.path.normpath(directory_path)
+                         and not os.path.isfile(file_path)]
+        if deleted_paths:
+            self.sync_files([], deleted_paths)
+        file_paths = FileParser.list_directory(directory_path, skip_file=self.is_document_skipped)
+        failed = []
+        done = 0
+        if on_progress is not None:
+            on_progress(done, len(file_paths))
+        with self._streaming():
+            for batch in FileParser.stream_files(file_paths, batch_pages, workers=workers,
+                                                 on_error=lambda file_path, e: failed.append(file_path)):
+                self.add_documents(batch)
+                done += sum(1 for input_file in batch
+                            if input_file.data["complete"] and not input_file.data.get("failed", False))
+                if on_progress is not None:
+                    on_progress(done + len(failed), len(file_paths))
+        if on_progress is not None:
+            on_progress(done + len(failed), len(file_paths))
+
+    def sync_files(self, changed_paths: list[str], deleted_paths: list[str], batch_pages: int = 64,
+                   workers: int = None) -> None:
+        """
+        Bring the model up to date with files that changed or were deleted, e.g. as reported by a
+        DirectoryWatcher.
+
+        Deleted files are removed in one write. Changed files whose content is already stored
+        are skipped, and the others are streamed into the model in bounded batches, as
+        ingest_directory() does. Files detached from their document in the manifest are left
+        alone whether they changed or were deleted.
+
+        Args:
+            changed_paths (list[str]): The paths to the created or modified files.
+            deleted_paths (list[str]): The paths to the deleted files.
+            batch_pages (int): The maximum number of pages read before they are added.
+            workers (int): The number of worker processes extracting PDF pages.
+
+        Returns:
+            None
+        """
+        deleted_paths = [file_path for file_path in deleted_paths
+                         if not self.vector_store.manifest.is_detached(file_path)]
+        if deleted_paths:
+            self._write(lambda: [self.vector_store.delete_document(IngestManifest.document_id(file_path))
+                                 for file_path in deleted_paths])
+        changed_paths = [file_path for file_path in changed_paths if not self.is_document_skipped(file_path)]
+        with self._streaming():
+            for batch in FileParser.stream_files(changed_paths, batch_pages, workers=workers):
+                self.add_documents(batch)
+
+    def add_files(self, file_paths: list[str], batch_pages: int = 64, workers: int = None,
+                  contents: dict = None) -> list[dict]:
+        """
+        Stream files into the model in bounded batches and report the outcome of each.
+
+        Files whose content is already stored are not parsed again. The others are parsed in
+        parallel and embedded together in batches of pages, as ingest_directory() does, and a
+        file that fails to parse is reported without stopping the others.
+
+        Files may be given by their content in memory, e.g. uploads, which are parsed without
+        being written to disk. They are stored under their path like files on disk, tracked by
+        the hash of their content, so they can be listed, replaced and deleted the same way.
+        Content in memory given for a file on disk replaces it as the document's content, so
+        the file is detached in the manifest and never added back from disk, while a file added
+        from disk is attached again.
+
+        Args:
+            file_paths (list[str]): The paths to the files.
+            batch_pages (int): The maximum number of pages read before they are added.
+            workers (int): The number of worker processes extracting PDF pages.
+            contents (dict): Optional mapping of file path to the content of the file in memory,
+                as bytes, bytearray or memoryview.
+
+        Returns:
+            list[dict]: The file name, document id and status ('added', 'unchanged' or 'failed')
+                of each file, in the order of file_paths, with the number of chunks stored for it
+                or the error it failed with.
+        """
+        errors = {}
+        content_hashes = {file_path: IngestManifest.hash_content(content)
+                          for file_path, content in (contents or {}).items()}
+        with self._write_lock:
+            for file_path in file_paths:
+                if file_path not in content_hashes:
+                    self.vector_store.manifest.attach(file_path)
+                elif os.path.isfile(file_path):
+                    self.vector_store.manifest.detach(file_path)
+        unchanged = {file_path for file_path in file_paths
+                     if self.is_document_current(file_path, content_hashes.get(file_path))}
+        with self._streaming():
+            for batch in FileParser.stream_files([file_path for file_path in file_paths if file_path not in unchanged],
+                                                 batch_pages, workers=workers,
+                                                 on_error=lambda file_path, e: errors.setdefault(file_path, str(e)),
+                                                 contents=contents):
+                for input_file in batch:
+                    if input_file.path in content_hashes:
+                        input_file.data["content_hash"] = content_hashes[input_file.path]
+                self.add_documents(batch)
+
+        results = []
+        for file_path in file_paths:
+            result = {"file": os.path.basename(file_path), "document_id": IngestManifest.document_id(file_path)}
+            if file_path in errors:
+                result.update(status="failed", error=errors[file_path])
+            else:
+                result.update(status="unchanged" if file_path in unchanged else "added",
+                              chunks=len(self.vector_store.manifest.get_ids(file_path)))
+            results.append(result)
+        return results
+
+    def is_document_current(self, file_path: str, content_hash: str = None) -> bool:
+        """
+        Check whether a file is already stored in the model and unchanged since it was added.
+
+        Args:
+            file_path (str): The path to the file.
+            content_hash (str): The hash of the file's content, if it is held in memory rather than on disk.
+
+        Returns:
+            bool: True if the file does not need to be added again.
+        """
+        return self.vector_store.is_document_current(file_path, content_hash)
+
+    def is_document_skipped(self, file_path: str) -> bool:
+        """
+        Check whether a file on disk is left out when ingesting a directory or syncing changes.
+
+        Args:
+            file_path (str): The path to the file.
 
-    def ask(self, question: str) -> str:
+        Returns:
+            bool: True if the file is detached from its document or already stored unchanged.
+        """
+        return self.vector_store.manifest.is_detached(file_path) or self.is_document_current(file_path)
+
+    def ask(self, question: str, chunk_filter: ChunkFilter = None) -> str:
         """
         Ask a question and get the answer from the model.
 
+        Answers are cached, so a question that was recently asked, or, if the answer cache
+        matches questions semantically, a question similar enough to one, is answered without
+        running the chain.
+
+        Args:
+            question (str): The question to ask.
+            chunk_filter (ChunkFilter): The filter restricting the documents and pages the answer
+                is drawn from, or None to draw it from all documents.
+
+        Returns:
+            str: The answer to the question.
+        """
+        logger.info("Model received question: {}", question)
+        generation = self.answer_cache.generation
+        scope = QuestionAnswerModel.cache_scope(chunk_filter)
+        answer, vector = self.answer_cache.lookup(question, scope)
+        if answer is None:
+            with self.read_snapshot() as snapshot:
+                answer = self.filter_chain(snapshot.chain, chunk_filter).invoke(question).get("result")
+            self.answer_cache.put(question, answer, generation, scope, vector)
+        logger.info("Model return answer: {}", answer)
+        return answer
+
+    async def aask(self, question: str, chunk_filter: ChunkFilter = None) -> str:
+        """
+        Asynchronously ask a question and get the answer from the model.
+
+        The chain is invoked asynchronously, so the caller's event loop keeps serving other
+        requests while the retrieval and LLM calls are in flight.
+
         Args:
             question (str): The question to ask.
+            chunk_filter (ChunkFilter): The filter restricting the documents and pages the answer
+                is drawn from, or None to draw it from all documents.
 
         Returns:
             str: The answer to the question.
         """
         logger.info("Model received question: {}", question)
-        answer = self.chain.invoke(question).get("result")
+        generation = self.answer_cache.generation
+        scope = QuestionAnswerModel.cache_scope(chunk_filter)
+        answer, vector = await asyncio.to_thread(self.answer_cache.lookup, question, scope)
+        if answer is None:
+            with self.read_snapshot() as snapshot:
+                answer = (await self.filter_chain(snapshot.chain, chunk_filter).ainvoke(question)).get("result")
+            await asyncio.to_thread(self.answer_cache.put, question, answer, generation, scope, vector)
         logger.info("Model return answer: {}", answer)
         return answer
+
+    def ask_many(self, questions: list[str], chunk_filter: ChunkFilter = None, max_concurrency: int = 8) -> list[str]:
+        """
+        Ask several questions at once and get their answers in order.
+
+        The questions are embedded in one batch and their chunks retrieved by one batched
+        search, chunks found for several questions being shared. The language model is then
+        called for all of them concurrently, at most max_concurrency calls at a time, so a batch
+        takes about as long as its slowest question. Cached answers are used as in ask(), and a
+        question asked twice is answered once.
+
+        Args:
+            questions (list[str]): The questions to ask.
+            chunk_filter (ChunkFilter): The filter restricting the documents and pages the answers
+                are drawn from, or None to draw them from all documents.
+            max_concurrency (int): The maximum number of language model calls in flight.
+
+        Returns:
+            list[str]: The answer to each question, in order.
+        """
+        logger.info("Model received {} questions", len(questions))
+        if not questions:
+            return []
+        generation = self.answer_cache.generation
+        scope = QuestionAnswerModel.cache_scope(chunk_filter)
+        unique_questions = list(dict.fromkeys(questions))
+        self.embeddings.embed_documents(QuestionAnswerModel.question_texts(unique_questions,
+                                                                           self.answer_cache.semantic_match))
+        answers, vectors = {}, {}
+        for question in unique_questions:
+            answers[question], vectors[question] = self.answer_cache.lookup(question, scope)
+        unanswered = [question for question, answer in answers.items() if answer is None]
+        if unanswered:
+            with self.read_snapshot() as snapshot:
+                chain = self.filter_chain(snapshot.chain, chunk_filter)
+                docs_per_question = QuestionAnswerModel.retrieve_many(chain.retriever, unanswered)
+                combine_documents_chain = chain.combine_documents_chain
+                outputs = combine_documents_chain.batch(
+                    [{"input_documents": docs, "question": question}
+                     for question, docs in zip(unanswered, docs_per_question)],
+                    config={"max_concurrency": max_concurrency})
+            for question, output in zip(unanswered, outputs):
+                answers[question] = output[combine_documents_chain.output_key]
+                self.answer_cache.put(question, answers[question], generation, scope, vectors[question])
+        logger.info("Model answered {} questions, {} from the cache", len(questions),
+                    len(unique_questions) - len(unanswered))
+        return [answers[question] for question in questions]
+
+    async def aask_many(self, questions: list[str], chunk_filter: ChunkFilter = None,
+                        max_concurrency: int = 8) -> list[str]:
+        """
+        Asynchronously ask several questions at once and get their answers in order.
+
+        As ask_many(), with the language model called asynchronously, so the caller's event
+        loop keeps serving other requests while the calls are in flight.
+
+        Args:
+            questions (list[str]): The questions to ask.
+            chunk_filter (ChunkFilter): The filter restricting the documents and pages the answers
+                are drawn from, or None to draw them from all documents.
+            max_concurrency (int): The maximum number of language model calls in flight.
+
+        Returns:
+            list[str]: The answer to each question, in order.
+        """
+        logger.info("Model received {} questions", len(questions))
+        if not questions:
+            return []
+        generation = self.answer_cache.generation
+        scope = QuestionAnswerModel.cache_scope(chunk_filter)
+        unique_questions = list(dict.fromkeys(questions))
+        await self.embeddings.aembed_documents(QuestionAnswerModel.question_texts(unique_questions,
+                                                                                  self.answer_cache.semantic_match))
+        cached = await asyncio.to_thread(lambda: [self.answer_cache.lookup(question, scope)
+                                                  for question in unique_questions])
+        answers = {question: answer for question, (answer, _) in zip(unique_questions, cached)}
+        vectors = {question: vector for question, (_, vector) in zip(unique_questions, cached)}
+        unanswered = [question for question, answer in answers.items() if answer is None]
+        if unanswered:
+            with self.read_snapshot() as snapshot:
+                chain = self.filter_chain(snapshot.chain, chunk_filter)
+                docs_per_question = await asyncio.to_thread(QuestionAnswerModel.retrieve_many, chain.retriever,
+                                                            unanswered)
+                combine_documents_chain = chain.combine_documents_chain
+                outputs = await combine_documents_chain.abatch(
+                    [{"input_documents": docs, "question": question}
+                     for question, docs in zip(unanswered, docs_per_question)],
+                    config={"max_concurrency": max_concurrency})
+            for question, output in zip(unanswered, outputs):
+                answers[question] = output[combine_documents_chain.output_key]
+            await asyncio.to_thread(lambda: [self.answer_cache.put(question, answers[question], generation, scope,
+                                                                   vectors[question])
+                                             for question in unanswered])
+        logger.info("Model answered {} questions, {} from the cache", len(questions),
+                    len(unique_questions) - len(unanswered))
+        return [answers[question] for question in questions]
+
+    @staticmethod
+    def question_texts(questions: list[str], semantic_match: bool = True) -> list[str]:
+        """
+        Get the texts embedded to answer questions: the questions as retrieval searches for them,
+        and as the answer cache looks them up if it matches them semantically.
+
+        Embedding these texts in one batch first means every later embedding of the questions
+        is served from the embedding cache.
+
+        Args:
+            questions (list[str]): The questions.
+            semantic_match (bool): Whether the answer cache embeds the questions.
+
+        Returns:
+            list[str]: The distinct texts.
+        """
+        if not semantic_match:
+            return list(dict.fromkeys(questions))
+        return list(dict.fromkeys(questions + [AnswerCache.normalize(question) for question in questions]))
+
+    @staticmethod
+    def retrieve_many(retriever: BaseRetriever, questions: list[str]) -> list[list[Document]]:
+        """
+        Retrieve the documents of several questions at once.
+
+        Args:
+            retriever (BaseRetriever): The retriever. Retrievers providing retrieve_many(queries)
+                search for all questions together, and others are invoked for each in turn.
+            questions (list[str]): The questions.
+
+        Returns:
+            list[list[Document]]: The documents retrieved for each question.
+        """
+        if hasattr(retriever, "retrieve_many"):
+            return retriever.retrieve_many(questions)
+        return retriever.batch(questions)
+
+    @staticmethod
+    def filter_chain(chain: Chain, chunk_filter: ChunkFilter) -> Chain:
+        """
+        Get a copy of a chain whose retriever is restricted by a chunk filter.
+
+        Args:
+            chain (Chain): The chain.
+            chunk_filter (ChunkFilter): The filter, or None.
+
+        Returns:
+            Chain: The restricted copy of the chain, or the chain itself without a filter.
+        """
+        if chunk_filter is None:
+            return chain
+        retriever = chain.retriever.copy(update={"chunk_filter": chunk_filter})
+        # Chain.copy() leaves out the fields excluded from serialization, the retriever among them
+        return type(chain).construct(**dict(chain.__dict__, retriever=retriever))
+
+    @staticmethod
+    def cache_scope(chunk_filter: ChunkFilter) -> str:
+        """
+        Get the answer cache scope of questions restricted by a chunk filter.
+
+        Args:
+            chunk_filter (ChunkFilter): The filter, or None.
+
+        Returns:
+            str: The scope, or None for questions about all documents.
+        """
+        if chunk_filter is None:
+            return None
+        titles = None if chunk_filter.titles is None else tuple(sorted(chunk_filter.titles))
+        return repr(chunk_filter._replace(titles=titles))
+
+    @staticmethod
+    def build_prompt(chain: Chain, question: str, docs: list[Document]) -> PromptValue:
+        """
+        Build the prompt a chain would send to the language model for a question.
+
+        Args:
+            chain (Chain): The chain whose prompt is used.
+            question (str): The question to ask.
+            docs (list[Document]): The retrieved documents to stuff into the prompt.
+
+        Returns:
+            PromptValue: The formatted prompt.
+        """
+        combine_documents_chain = chain.combine_documents_chain
+        inputs = combine_documents_chain._get_inputs(docs, question=question)
+        return combine_documents_chain.llm_chain.prompt.format_prompt(**inputs)
+
+    @staticmethod
+    def chunk_text(chunk: Any) -> str:
+        """
+        Get the text of a piece of an answer streamed by the language model.
+
+        Args:
+            chunk (Any): The piece, a message chunk from chat models or a string from other models.
+
+        Returns:
+            str: The text of the piece.
+        """
+        return chunk if isinstance(chunk, str) else chunk.content
+
+    def ask_stream(self, question: str, chunk_filter: ChunkFilter = None) -> Iterator[str]:
+        """
+        Ask a question and yield the answer token by token as the language model produces it.
+
+        Args:
+            question (str): The question to ask.
+            chunk_filter (ChunkFilter): The filter restricting the documents and pages the answer
+                is drawn from, or None to draw it from all documents.
+
+        Yields:
+            str: The next piece of the answer.
+        """
+        logger.info("Model received streaming question: {}", question)
+        generation = self.answer_cache.generation
+        scope = QuestionAnswerModel.cache_scope(chunk_filter)
+        answer, vector = self.answer_cache.lookup(question, scope)
+        if answer is not None:
+            yield answer
+            return
+
+        tokens = []
+        with self.read_snapshot() as snapshot:
+            chain = self.filter_chain(snapshot.chain, chunk_filter)
+            docs = chain.retriever.invoke(question)
+            for chunk in self.language_model.stream(self.build_prompt(chain, question, docs)):
+                text = QuestionAnswerModel.chunk_text(chunk)
+                tokens.append(text)
+                yield text
+        self.answer_cache.put(question, "".join(tokens), generation, scope, vector)
+        logger.info("Model streamed answer: {}", "".join(tokens))
+
+    async def aask_stream(self, question: str, chunk_filter: ChunkFilter = None) -> AsyncIterator[str]:
+        """
+        Asynchronously ask a question and yield the answer token by token as the language
+        model produces it.
+
+        Args:
+            question (str): The question to ask.
+            chunk_filter (ChunkFilter): The filter restricting the documents and pages the answer
+                is drawn from, or None to draw it from all documents.
+
+        Yields:
+            str: The next piece of the answer.
+        """
+        logger.info("Model received streaming question: {}", question)
+        generation = self.answer_cache.generation
+        scope = QuestionAnswerModel.cache_scope(chunk_filter)
+        answer, vector = await asyncio.to_thread(self.answer_cache.lookup, question, scope)
+        if answer is not None:
+            yield answer
+            return
+
+        tokens = []
+        with self.read_snapshot() as snapshot:
+            chain = self.filter_chain(snapshot.chain, chunk_filter)
+            docs = await chain.retriever.ainvoke(question)
+            async for chunk in self.language_model.astream(self.build_prompt(chain, question, docs)):
+                text = QuestionAnswerModel.chunk_text(chunk)
+                tokens.append(text)
+                yield text
+        await asyncio.to_thread(self.answer_cache.put, question, "".join(tokens), generation, scope, vector)
+        logger.info("Model streamed answer: {}", "".join(tokens))
@@ -1,7 +1,18 @@
+import multiprocessing
 import os
+import tarfile
+import tempfile
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, wait
+from typing import BinaryIO, Callable, Iterator
+from src.inputs.PdfInputFile import PdfInputFile
+from src.inputs.TextInputFile import TextInputFile
+from src.loaders.Loader import FileSource, Loader
 from src.loaders.PdfLoader import PdfLoader
 from src.loaders.TextLoader import TextLoader
-from src.inputs.InputFile import InputFile
+from src.inputs.InputFile import InputFile, InputFileType
 from src.cfg.logging_config import *
 
 
@@ -10,19 +21,29 @@ class FileParser:
     A class for parsing files and directories to create InputFile objects.
 
     This class provides methods for parsing individual files and entire directories,
-    generating InputFile objects based on their file type.
+    generating InputFile objects based on their file type. A file is given by its path or by
+    its content in memory (see FileSource), and its type is sniffed from its content.
 
     Attributes:
-        None
+        PDF_PAGES_PER_TASK (int): The number of PDF pages extracted by each task in parallel mode.
+        PDF_HEADER_BYTES (int): The number of leading bytes searched for the PDF header.
+        ARCHIVE_EXTENSIONS (tuple[str]): The extensions of the archives files can be extracted from.
     """
 
+    PDF_PAGES_PER_TASK = 16
+    PDF_HEADER_BYTES = 1024
+    ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz")
+    _process_pool = None
+    _process_pool_lock = threading.Lock()
+
     @staticmethod
-    def parse_file(file_path) -> InputFile:
+    def parse_file(source: FileSource, name: str = None) -> InputFile:
         """
         Parse a single file and create an InputFile object.
 
         Args:
-            file_path (str): The path to the file.
+            source (FileSource): The path to the file, or its content.
+            name (str): The name of the file. Defaults to the base name of the path.
 
         Returns:
             InputFile: An object representing the parsed file.
@@ -30,29 +51,374 @@ class FileParser:
         Raises:
             ValueError: If the file format is unsupported.
         """
-        if file_path.endswith(".pdf"):
-            return PdfLoader.load_single_file(file_path)
-        elif file_path.endswith(".txt"):
-            return TextLoader.load_single_file(file_path)
+        return FileParser.loader(source, name).load_single_file(source, name)
+
+    @staticmethod
+    def sniff_type(source: FileSource, name: str = None) -> InputFileType:
+        """
+        Find the type of a file from its content.
+
+        A file is a PDF if its first PDF_HEADER_BYTES bytes hold the %PDF- header, whatever its
+        name; plain text has no signature, so other files are text only if named *.txt, in any
+        case. The
+        position of a file object is left unchanged.
+
+        Args:
+            source (FileSource): The path to the file, or its content.
+            name (str): The name of the file. Defaults to the base name of the path.
+
+        Returns:
+            InputFileType: The type of the file, or UNKNOWN if it is unsupported.
+        """
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            header = bytes(memoryview(source)[:FileParser.PDF_HEADER_BYTES])
+        elif isinstance(source, str):
+            with open(source, "rb") as file:
+                header = file.read(FileParser.PDF_HEADER_BYTES)
+        else:
+            position = source.tell()
+            header = source.read(FileParser.PDF_HEADER_BYTES)
+            source.seek(position)
+        if b"%PDF-" in header:
+            return InputFileType.PDF
+        if Loader.source_name(source, name).lower().endswith(".txt"):
+            return InputFileType.TEXT
+        return InputFileType.UNKNOWN
+
+    @staticmethod
+    def loader(source: FileSource, name: str = None) -> type[Loader]:
+        """
+        Get the loader for a file, by its sniffed type.
+
+        Args:
+            source (FileSource): The path to the file, or its content.
+            name (str): The name of the file. Defaults to the base name of the path.
+
+        Returns:
+            type[Loader]: PdfLoader or TextLoader.
+
+        Raises:
+            ValueError: If the file format is unsupported.
+        """
+        input_file_type = FileParser.sniff_type(source, name)
+        if input_file_type == InputFileType.PDF:
+            return PdfLoader
+        elif input_file_type == InputFileType.TEXT:
+            return TextLoader
         else:
             raise ValueError("Unsupported file format")
 
     @staticmethod
-    def parse_directory(directory_path) -> list[InputFile]:
+    def parse_directory(directory_path, skip_file: Callable[[str], bool] = None,
+                        workers: int = None) -> list[InputFile]:
         """
         Parse all files in a directory and create InputFile objects for each file.
 
         Args:
             directory_path (str): The path to the directory.
+            skip_file (Callable[[str], bool]): Optional predicate called with each file path;
+                files for which it returns True are not parsed.
+            workers (int): The number of worker processes to parse with. If None or 1, files
+                are parsed serially in the calling process.
 
         Returns:
             list[InputFile]: A list of InputFile objects representing the parsed files.
         """
-        parsed_files = []
+        file_paths = FileParser.list_directory(directory_path, skip_file)
+        if workers is not None and workers > 1:
+            parsed_files = FileParser.parse_files_parallel(file_paths, workers)
+        else:
+            parsed_files = [FileParser.parse_file(file_path) for file_path in file_paths]
+        logger.info("Successfully parse files in {} to InputFile objects", directory_path)
+        return parsed_files
+
+    @staticmethod
+    def is_archive(file_name: str) -> bool:
+        """
+        Check whether a file is an archive files can be extracted from.
+
+        Args:
+            file_name (str): The name or path of the file.
+
+        Returns:
+            bool: True if the file has an archive extension.
+        """
+        return file_name.lower().endswith(FileParser.ARCHIVE_EXTENSIONS)
+
+    @staticmethod
+    def read_archive(archive_file: BinaryIO, archive_name: str) -> list[tuple[str, bytes]]:
+        """
+        Read the supported files of a zip or tar archive into memory.
+
+        Members are read straight from the archive stream, so neither the archive nor its
+        members are written to disk. Folders inside the archive are flattened and members of
+        unsupported types are left out.
+
+        Args:
+            archive_file (BinaryIO): The archive content. Zip archives must be seekable.
+            archive_name (str): The file name of the archive, whose extension gives its format.
+
+        Returns:
+            list[tuple[str, bytes]]: The name and content of each supported file, in archive order.
+
+        Raises:
+            ValueError: If the archive format is unsupported or the archive cannot be read.
+        """
+        files = []
+
+        def add(member_name: str, content: bytes) -> None:
+            file_name = os.path.basename(member_name)
+            if not file_name.startswith(".") and FileParser.sniff_type(content, file_name) != InputFileType.UNKNOWN:
+                files.append((file_name, content))
+
+        try:
+            if archive_name.lower().endswith(".zip"):
+                with zipfile.ZipFile(archive_file) as archive:
+                    for member in archive.infolist():
+                        if not member.is_dir() and not member.filename.startswith("__MACOSX/"):
+                            add(member.filename, archive.read(member))
+            elif FileParser.is_archive(archive_name):
+                # Read the tar as a stream so compressed archives are decompressed once, front to back
+                with tarfile.open(fileobj=archive_file, mode="r|*") as archive:
+                    for member in archive:
+                        if member.isfile():
+                            add(member.name, archive.extractfile(member).read())
+            else:
+                raise ValueError("Unsupported archive format")
+        except (zipfile.BadZipFile, tarfile.TarError) as e:
+            raise ValueError("Invalid archive: {}".format(e))
+        logger.info("Read {} files from {}", len(files), archive_name)
+        return files
+
+    @staticmethod
+    def list_directory(directory_path, skip_file: Callable[[str], bool] = None) -> list[str]:
+        """
+        List the files in a directory that should be parsed.
+
+        Args:
+            directory_path (str): The path to the directory.
+            skip_file (Callable[[str], bool]): Optional predicate called with each file path;
+                files for which it returns True are left out.
+
+        Returns:
+            list[str]: The paths of the files to parse.
+        """
+        file_paths = []
         for filename in os.listdir(directory_path):
             file_path = os.path.join(directory_path, filename)
             if os.path.isfile(file_path):
-                parsed_file = FileParser.parse_file(file_path)
-                parsed_files.append(parsed_file)
-        logger.info("Successfully parse files in {} to InputFile objects", directory_path)
+                if skip_file is not None and skip_file(file_path):
+                    logger.info("Skipping unchanged file {}", file_path)
+                    continue
+                file_paths.append(file_path)
+        return file_paths
+
+    @staticmethod
+    def process_pool(workers: int) -> ProcessPoolExecutor:
+        """
+        Get the process pool shared by every parse, creating it on first use.
+
+        Workers are started with forkserver where available, or else spawn, never forked from
+        the caller: the server process runs request, job and embedding threads, and a child
+        forked while one of them holds a lock (e.g. of the logger) could deadlock on it. The pool
+        is long-lived, so workers are started once rather than for every upload or sync. It is
+        created with the number of workers of the first call and recreated if a worker died.
+
+        Args:
+            workers (int): The number of worker processes.
+
+        Returns:
+            ProcessPoolExecutor: The process pool. It must not be shut down by the caller.
+        """
+        with FileParser._process_pool_lock:
+            if FileParser._process_pool is None or FileParser._process_pool._broken:
+                start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                FileParser._process_pool = ProcessPoolExecutor(max_workers=workers,
+                                                               mp_context=multiprocessing.get_context(start_method))
+                logger.info("Started a pool of {} parser processes with {}", workers, start_method)
+            return FileParser._process_pool
+
+    @staticmethod
+    def parse_files_parallel(file_paths: list[str], workers: int) -> list[InputFile]:
+        """
+        Parse files in a process pool, splitting large PDFs into page ranges across workers.
+
+        Files are returned in the order of file_paths with pages in document order. A file
+        that fails to parse is logged and left out of the result instead of aborting the batch.
+
+        Args:
+            file_paths (list[str]): The paths to the files.
+            workers (int): The number of worker processes.
+
+        Returns:
+            list[InputFile]: A list of InputFile objects representing the parsed files.
+        """
+        parsed_files = []
+        executor = FileParser.process_pool(workers)
+        submitted = []
+        for file_path in file_paths:
+            try:
+                is_pdf = FileParser.sniff_type(file_path) == InputFileType.PDF
+                if is_pdf:
+                    page_count = PdfLoader.count_pages(file_path)
+                    futures = [executor.submit(PdfLoader.extract_pages, file_path, start,
+                                               min(start + FileParser.PDF_PAGES_PER_TASK, page_count))
+                               for start in range(0, page_count, FileParser.PDF_PAGES_PER_TASK)]
+                else:
+                    futures = [executor.submit(FileParser.parse_file, file_path)]
+                submitted.append((file_path, is_pdf, futures))
+            except Exception as e:
+                logger.error("Failed to parse {}: {}", file_path, e)
+
+        for file_path, is_pdf, futures in submitted:
+            try:
+                if is_pdf:
+                    pages = [page for future in futures for page in future.result()]
+                    parsed_files.append(PdfInputFile(name=os.path.basename(file_path), path=file_path, pages=pages))
+                    logger.info("Successfully read {} to PdfInputFile object", os.path.basename(file_path))
+                else:
+                    parsed_files.append(futures[0].result())
+            except Exception as e:
+                logger.error("Failed to parse {}: {}", file_path, e)
         return parsed_files
+
+    @staticmethod
+    def iter_pages(source: FileSource, executor: Executor = None, prefetch: int = 1, name: str = None) -> Iterator[str]:
+        """
+        Lazily yield the pages of a single file in document order.
+
+        If an executor is given, PDF page ranges are extracted by it with at most prefetch
+        ranges in flight, so extraction runs ahead of the consumer without reading the whole file.
+        A PDF of a single page range is extracted in the calling thread, as sending it to the
+        executor would only add a round trip. A larger PDF in memory is written to a temporary
+        file once, which every task opens, instead of being sent whole to each task.
+
+        Args:
+            source (FileSource): The path to the file, or its content.
+            executor (Executor): Optional executor to extract PDF page ranges with.
+            prefetch (int): The maximum number of PDF page ranges in flight on the executor.
+            name (str): The name of the file. Defaults to the base name of the path.
+
+        Yields:
+            str: The content of each page.
+
+        Raises:
+            ValueError: If the file format is unsupported.
+        """
+        loader = FileParser.loader(source, name)
+        if loader is not PdfLoader or executor is None:
+            yield from loader.iter_pages(source)
+            return
+        # Worker processes are sent content in memory as bytes, which is what a file object is read into
+        if not isinstance(source, str):
+            source = Loader.read_bytes(source)
+        page_count = PdfLoader.count_pages(source)
+        if page_count <= FileParser.PDF_PAGES_PER_TASK:
+            yield from PdfLoader.extract_pages(source, 0, page_count)
+            return
+        temporary_path = None
+        if not isinstance(source, str):
+            with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as file:
+                file.write(source)
+            source = temporary_path = file.name
+        in_flight = deque()
+        try:
+            for start in range(0, page_count, FileParser.PDF_PAGES_PER_TASK):
+                in_flight.append(executor.submit(PdfLoader.extract_pages, source, start,
+                                                 min(start + FileParser.PDF_PAGES_PER_TASK, page_count)))
+                if len(in_flight) >= max(prefetch, 1):
+                    yield from in_flight.popleft().result()
+            while in_flight:
+                yield from in_flight.popleft().result()
+        finally:
+            # Tasks of an abandoned or failed file may still be reading the temporary file
+            for future in in_flight:
+                future.cancel()
+            wait(in_flight)
+            if temporary_path is not None:
+                os.remove(temporary_path)
+
+    @staticmethod
+    def stream_directory(directory_path, batch_pages: int = 64, skip_file: Callable[[str], bool] = None,
+                         workers: int = None) -> Iterator[list[InputFile]]:
+        """
+        Lazily parse all files in a directory into bounded batches of pages.
+
+        Each batch holds at most batch_pages pages, as InputFile objects that may cover only a
+        slice of a file (see the page_offset and complete entries of their data). Pages are read
+        only as batches are consumed, so memory use is bounded by the batch size rather than by
+        the size of the directory. A file that fails to parse is logged and skipped, as
+        stream_files() describes.
+
+        Args:
+            directory_path (str): The path to the directory.
+            batch_pages (int): The maximum number of pages in each batch.
+            skip_file (Callable[[str], bool]): Optional predicate called with each file path;
+                files for which it returns True are not parsed.
+            workers (int): The number of worker processes extracting PDF pages ahead of the
+                consumer. If None or 1, pages are extracted in the calling process.
+
+        Yields:
+            list[InputFile]: The next batch of file slices.
+        """
+        yield from FileParser.stream_files(FileParser.list_directory(directory_path, skip_file), batch_pages, workers)
+
+    @staticmethod
+    def stream_files(file_paths: list[str], batch_pages: int = 64, workers: int = None,
+                     on_error: Callable[[str, Exception], None] = None,
+                     contents: dict = None) -> Iterator[list[InputFile]]:
+        """
+        Lazily parse files into bounded batches of pages, as stream_directory() does for a directory.
+
+        A file that fails to parse is logged and skipped. If slices of it were already yielded,
+        it is ended by an empty slice with failed set in its data, so the consumer can drop the
+        pages it stored from them.
+
+        Args:
+            file_paths (list[str]): The paths to the files.
+            batch_pages (int): The maximum number of pages in each batch.
+            workers (int): The number of worker processes extracting PDF pages ahead of the
+                consumer. If None or 1, pages are extracted in the calling process.
+            on_error (Callable[[str, Exception], None]): Optional function called with the path
+                and the error of each file that fails to parse.
+            contents (dict): Optional mapping of file path to the content of the file in memory
+                (see FileSource), parsed instead of reading the file, e.g. for uploads that are
+                never written to disk.
+
+        Yields:
+            list[InputFile]: The next batch of file slices.
+        """
+        executor = FileParser.process_pool(workers) if workers is not None and workers > 1 else None
+
+        batch, batch_size = [], 0
+        for file_path in file_paths:
+            source = contents[file_path] if contents is not None and file_path in contents else file_path
+            name = os.path.basename(file_path)
+            pages, page_offset = [], 0
+            try:
+                input_file_class = PdfInputFile if FileParser.loader(source, name) is PdfLoader else TextInputFile
+                for page in FileParser.iter_pages(source, executor, prefetch=2 * (workers or 1), name=name):
+                    pages.append(page)
+                    batch_size += 1
+                    if batch_size >= batch_pages:
+                        batch.append(input_file_class(name=name, path=file_path, pages=pages,
+                                                      page_offset=page_offset, complete=False))
+                        yield batch
+                        page_offset += len(pages)
+                        pages, batch, batch_size = [], [], 0
+            except Exception as e:
+                logger.error("Failed to parse {}: {}", file_path, e)
+                batch_size -= len(pages)
+                if page_offset > 0:
+                    # Earlier slices of the file were yielded, so the consumer is told to drop them
+                    batch.append(input_file_class(name=name, path=file_path, pages=[], page_offset=page_offset,
+                                                  complete=True, failed=True))
+                if on_error is not None:
+                    on_error(file_path, e)
+                continue
+            batch.append(input_file_class(name=name, path=file_path, pages=pages,
+                                          page_offset=page_offset, complete=True))
+            logger.info("Successfully streamed {} pages of {}", page_offset + len(pages), name)
+
+        if batch:
+            yield batch
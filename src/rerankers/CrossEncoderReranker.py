@@ -0,0 +1,59 @@
+import os
+import numpy as np
+from src.rerankers.Reranker import Reranker
+from src.cfg.logging_config import *
+
+
+class CrossEncoderReranker(Reranker):
+    """
+    A class reranking chunks with a cross-encoder model run locally on the CPU.
+
+    The model reads the query and a chunk together, so it judges relevance far better than
+    the similarity of separately computed embeddings, at the cost of one forward pass per
+    candidate; candidates are scored in batches. The model is loaded from a local directory
+    only and is never downloaded, so this works on hosts without network access as long as the
+    model has been saved there beforehand, e.g. by calling save('./data/cross_encoder') on
+    CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2').
+
+    Attributes:
+        model (CrossEncoder): The loaded cross-encoder.
+        batch_size (int): The number of query and chunk pairs scored per forward pass.
+    """
+
+    MODEL_DIRECTORY = "./data/cross_encoder"
+
+    def __init__(self, model_directory: str = MODEL_DIRECTORY, batch_size: int = 32):
+        """
+        Initialize a CrossEncoderReranker object, loading the model.
+
+        Args:
+            model_directory (str): The directory the model was saved to.
+            batch_size (int): The number of query and chunk pairs scored per forward pass.
+
+        Raises:
+            ImportError: If sentence-transformers is not installed.
+            LookupError: If the model is not available in model_directory.
+        """
+        from sentence_transformers import CrossEncoder
+
+        if not os.path.isdir(model_directory):
+            raise LookupError("Cross-encoder model not found in {}".format(model_directory))
+        self.model = CrossEncoder(model_directory, device="cpu")
+        self.batch_size = batch_size
+        logger.info("Loaded cross-encoder from {}", model_directory)
+
+    def score(self, query: str, texts: list[str]) -> np.ndarray:
+        """
+        Score the relevance of texts to a query.
+
+        Args:
+            query (str): The query.
+            texts (list[str]): The texts scored.
+
+        Returns:
+            np.ndarray: The score of each text, higher for more relevant texts.
+        """
+        if not texts:
+            return np.zeros(0)
+        return np.asarray(self.model.predict([(query, text) for text in texts], batch_size=self.batch_size,
+                                             show_progress_bar=False, convert_to_numpy=True))
@@ -0,0 +1,74 @@
+import numpy as np
+from src.rerankers.Reranker import Reranker
+from src.storage.KeywordIndex import KeywordIndex
+
+
+class LexicalReranker(Reranker):
+    """
+    A class reranking chunks by how fully and how closely they match the terms of a query,
+    without a model.
+
+    Each candidate scores the share of the query's term weight it contains, plus its BM25
+    score and the share of the query's adjacent term pairs it contains as phrases, both scaled
+    to the best candidate. Term weights are inverse document frequencies among the candidates
+    themselves, so terms found in every candidate do not tell them apart. Term counts are
+    gathered in one pass over the candidates and scored as a matrix.
+
+    Attributes:
+        k1 (float): The BM25 term frequency saturation.
+        b (float): The BM25 length normalization.
+        bm25_weight (float): The weight of the scaled BM25 score.
+        phrase_weight (float): The weight of the share of query phrases matched.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, bm25_weight: float = 0.5, phrase_weight: float = 0.5):
+        """
+        Initialize a LexicalReranker object.
+
+        Args:
+            k1 (float): The BM25 term frequency saturation.
+            b (float): The BM25 length normalization.
+            bm25_weight (float): The weight of the scaled BM25 score.
+            phrase_weight (float): The weight of the share of query phrases matched.
+        """
+        self.k1 = k1
+        self.b = b
+        self.bm25_weight = bm25_weight
+        self.phrase_weight = phrase_weight
+
+    def score(self, query: str, texts: list[str]) -> np.ndarray:
+        """
+        Score the relevance of texts to a query.
+
+        Args:
+            query (str): The query.
+            texts (list[str]): The texts scored.
+
+        Returns:
+            np.ndarray: The score of each text, higher for more relevant texts. All scores are
+                zero if the query has no terms.
+        """
+        query_terms = list(dict.fromkeys(KeywordIndex.tokenize(query)))
+        if not query_terms or not texts:
+            return np.zeros(len(texts))
+        term_ids = {term: term_id for term_id, term in enumerate(query_terms)}
+        query_phrases = set(zip(query_terms, query_terms[1:]))
+
+        counts = np.zeros((len(texts), len(query_terms)))
+        lengths = np.zeros(len(texts))
+        phrases = np.zeros(len(texts))
+        for position, text in enumerate(texts):
+            terms = KeywordIndex.tokenize(text)
+            lengths[position] = len(terms)
+            matched = [term_ids[term] for term in terms if term in term_ids]
+            np.add.at(counts[position], matched, 1)
+            if query_phrases:
+                phrases[position] = len(query_phrases.intersection(zip(terms, terms[1:]))) / len(query_phrases)
+
+        present = counts > 0
+        document_frequencies = present.sum(axis=0)
+        idf = np.log(1 + (len(texts) - document_frequencies + 0.5) / (document_frequencies + 0.5))
+        coverage = present @ idf / idf.sum()
+        length_norm = 1 - self.b + self.b * lengths / max(lengths.mean(), 1)
+        bm25 = (counts * (self.k1 + 1) / (counts + self.k1 * length_norm[:, None])) @ idf
+        return coverage + self.bm25_weight * bm25 / max(bm25.max(), 1e-9) + self.phrase_weight * phrases
@@ -0,0 +1,131 @@
+import threading
+from abc import ABC, abstractmethod
+from enum import Enum
+import numpy as np
+from langchain_core.documents import Document
+from src.cfg.logging_config import *
+
+
+class RerankerOptions(Enum):
+    """
+    An enumeration representing options for rerankers.
+
+    Attributes:
+        NONE (str): Represents no reranking; retrieved chunks are passed to the chain as they are.
+        LEXICAL (str): Represents the lexical reranker, scoring query term coverage, BM25 and phrases.
+        CROSS_ENCODER (str): Represents a local cross-encoder model.
+        DEFAULT (str): Represents the cross-encoder when its model is available locally, and lexical otherwise.
+    """
+    NONE = "None"
+    LEXICAL = "Lexical"
+    CROSS_ENCODER = "CrossEncoder"
+    DEFAULT = "Default"
+
+
+class Reranker(ABC):
+    """
+    An abstract base class for rerankers, which reorder retrieved chunks by their relevance to a query.
+
+    Rerankers score all candidates of a query in one batched pass, so a retriever can
+    over-fetch cheaply and pass only the best chunks on to the language model. Rerankers are
+    created once per process through get() and shared by every caller, so models are loaded
+    at most once.
+
+    Attributes:
+        None
+    """
+
+    __instances = {}
+    __lock = threading.Lock()
+
+    @abstractmethod
+    def score(self, query: str, texts: list[str]) -> np.ndarray:
+        """
+        Score the relevance of texts to a query.
+
+        This method must be implemented by subclasses.
+
+        Args:
+            query (str): The query.
+            texts (list[str]): The texts scored.
+
+        Returns:
+            np.ndarray: The score of each text, higher for more relevant texts.
+        """
+        pass
+
+    def rerank(self, query: str, docs: list[Document], k: int) -> list[Document]:
+        """
+        Reorder documents by their relevance to a query and keep the best ones.
+
+        Documents scoring the same keep their retrieved order. Each document returned is a
+        copy with its score in the rerank_score entry of its metadata.
+
+        Args:
+            query (str): The query.
+            docs (list[Document]): The retrieved documents.
+            k (int): The maximum number of documents returned.
+
+        Returns:
+            list[Document]: The most relevant documents, most relevant first.
+        """
+        if not docs:
+            return []
+        scores = np.asarray(self.score(query, [doc.page_content for doc in docs]), dtype=np.float64)
+        order = np.argsort(-scores, kind="stable")[:k]
+        return [Document(page_content=docs[position].page_content,
+                         metadata=dict(docs[position].metadata, rerank_score=float(scores[position])))
+                for position in order]
+
+    @staticmethod
+    def get(option: RerankerOptions = RerankerOptions.DEFAULT) -> "Reranker":
+        """
+        Get the process-wide reranker for an option, creating it on first use.
+
+        Args:
+            option (RerankerOptions): The reranker option, other than NONE.
+
+        Returns:
+            Reranker: The shared reranker.
+
+        Raises:
+            ImportError: If CROSS_ENCODER is requested and sentence-transformers is not installed.
+            LookupError: If CROSS_ENCODER is requested and its model is not available locally.
+            ValueError: If NONE is requested.
+        """
+        instance = Reranker.__instances.get(option)
+        if instance is not None:
+            return instance
+
+        with Reranker.__lock:
+            if option not in Reranker.__instances:
+                Reranker.__instances[option] = Reranker.__create(option)
+            return Reranker.__instances[option]
+
+    @staticmethod
+    def __create(option: RerankerOptions) -> "Reranker":
+        """
+        Create a reranker for an option.
+
+        Args:
+            option (RerankerOptions): The reranker option.
+
+        Returns:
+            Reranker: The new reranker.
+        """
+        from src.rerankers.CrossEncoderReranker import CrossEncoderReranker
+        from src.rerankers.LexicalReranker import LexicalReranker
+
+        if option == RerankerOptions.NONE:
+            raise ValueError("No reranker is created for RerankerOptions.NONE")
+        if option == RerankerOptions.LEXICAL:
+            return LexicalReranker()
+        if option == RerankerOptions.CROSS_ENCODER:
+            return CrossEncoderReranker()
+        try:
+            return CrossEncoderReranker()
+        except ImportError:
+            logger.warning("sentence-transformers is not installed, using lexical reranker")
+        except LookupError:
+            logger.warning("Cross-encoder model not found locally, using lexical reranker")
+        return LexicalReranker()
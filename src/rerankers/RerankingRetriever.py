@@ -0,0 +1,78 @@
+import time
+from typing import Any, Optional
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from src.storage.TitleIndex import ChunkFilter
+from src.cfg.logging_config import *
+
+
+class RerankingRetriever(BaseRetriever):
+    """
+    A retriever over-fetching candidates from another retriever and keeping only the k chunks a
+    reranker scores highest, so the prompt holds fewer, better chunks.
+
+    The time spent retrieving and reranking is logged for every query.
+
+    Attributes:
+        retriever (BaseRetriever): The retriever fetching the candidates, with its k set to the
+            number of candidates.
+        reranker (Any): The Reranker scoring the candidates.
+        k (int): The number of documents retrieved.
+        chunk_filter (ChunkFilter): The filter restricting the chunks retrieved, or None. It is
+            applied by the candidate retriever.
+    """
+    retriever: BaseRetriever
+    reranker: Any
+    k: int = 4
+    chunk_filter: Optional[ChunkFilter] = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        """
+        Get the candidates most relevant to a query according to the reranker.
+
+        Args:
+            query (str): The query.
+            run_manager (CallbackManagerForRetrieverRun): The callback manager of the run.
+
+        Returns:
+            list[Document]: The most relevant documents, most relevant first.
+        """
+        retriever = self.retriever
+        if self.chunk_filter is not None:
+            retriever = retriever.copy(update={"chunk_filter": self.chunk_filter})
+        start = time.perf_counter()
+        candidates = retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        retrieved = time.perf_counter()
+        docs = self.reranker.rerank(query, candidates, self.k)
+        reranked = time.perf_counter()
+        logger.info("Retrieved {} candidates in {:.1f} ms, reranked to {} in {:.1f} ms", len(candidates),
+                    (retrieved - start) * 1000, len(docs), (reranked - retrieved) * 1000)
+        return docs
+
+    def retrieve_many(self, queries: list[str]) -> list[list[Document]]:
+        """
+        Get the candidates most relevant to each of several queries according to the reranker,
+        retrieving the candidates of all queries at once.
+
+        The candidate retriever must provide retrieve_many(queries).
+
+        Args:
+            queries (list[str]): The queries.
+
+        Returns:
+            list[list[Document]]: The most relevant documents of each query, most relevant first.
+        """
+        retriever = self.retriever
+        if self.chunk_filter is not None:
+            retriever = retriever.copy(update={"chunk_filter": self.chunk_filter})
+        start = time.perf_counter()
+        candidates = retriever.retrieve_many(queries)
+        retrieved = time.perf_counter()
+        docs = [self.reranker.rerank(query, query_candidates, self.k)
+                for query, query_candidates in zip(queries, candidates)]
+        reranked = time.perf_counter()
+        logger.info("Retrieved {} candidates for {} queries in {:.1f} ms, reranked in {:.1f} ms",
+                    sum(len(query_candidates) for query_candidates in candidates), len(queries),
+                    (retrieved - start) * 1000, (reranked - retrieved) * 1000)
+        return docs
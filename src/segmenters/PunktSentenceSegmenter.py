@@ -0,0 +1,46 @@
+from src.segmenters.SentenceSegmenter import SentenceSegmenter
+from src.cfg.logging_config import *
+
+
+class PunktSentenceSegmenter(SentenceSegmenter):
+    """
+    A class segmenting sentences with the NLTK Punkt tokenizer.
+
+    The Punkt model is loaded from local NLTK data only and is never downloaded, so this works
+    on hosts without network access as long as the model has been fetched beforehand, e.g. with
+    `python -m nltk.downloader -d ./data/nltk_data punkt`. Besides ./data/nltk_data, the usual
+    NLTK data locations and the NLTK_DATA environment variable are searched.
+
+    Attributes:
+        tokenizer (PunktSentenceTokenizer): The loaded Punkt tokenizer.
+    """
+
+    MODEL_PATH = "tokenizers/punkt/english.pickle"
+    LOCAL_DATA_PATH = "./data/nltk_data"
+
+    def __init__(self):
+        """
+        Initialize a PunktSentenceSegmenter object, loading the Punkt model.
+
+        Raises:
+            ImportError: If NLTK is not installed.
+            LookupError: If the Punkt model is not available locally.
+        """
+        import nltk
+
+        if PunktSentenceSegmenter.LOCAL_DATA_PATH not in nltk.data.path:
+            nltk.data.path.append(PunktSentenceSegmenter.LOCAL_DATA_PATH)
+        self.tokenizer = nltk.data.load(PunktSentenceSegmenter.MODEL_PATH)
+        logger.info("Loaded Punkt sentence tokenizer")
+
+    def tokenize(self, text: str) -> list[str]:
+        """
+        Split text into sentences with the Punkt tokenizer.
+
+        Args:
+            text (str): The text to split.
+
+        Returns:
+            list[str]: The sentences of the text, in order.
+        """
+        return self.tokenizer.tokenize(text)
@@ -0,0 +1,64 @@
+import re
+from src.segmenters.SentenceSegmenter import SentenceSegmenter
+
+
+class RegexSentenceSegmenter(SentenceSegmenter):
+    """
+    A class segmenting sentences with regular expressions, without NLTK.
+
+    A sentence ends at ".", "!" or "?" (optionally followed by closing quotes or brackets)
+    when the next non-space character starts a new sentence, unless the terminating word is a
+    known abbreviation or a single-letter initial. Segmentation is a single linear scan.
+
+    Attributes:
+        None
+    """
+
+    ABBREVIATIONS = frozenset([
+        "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc", "e.g", "i.e", "cf", "al",
+        "inc", "corp", "co", "ltd", "llc", "no", "fig", "approx", "est", "dept", "u.s", "u.k",
+        "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec",
+    ])
+    BOUNDARY_PATTERN = re.compile(r"""[.!?]+['")\]]*\s+(?=['"(\[]?[A-Z0-9])""")
+
+    def tokenize(self, text: str) -> list[str]:
+        """
+        Split text into sentences.
+
+        Args:
+            text (str): The text to split.
+
+        Returns:
+            list[str]: The sentences of the text, in order.
+        """
+        sentences = []
+        start = 0
+        for match in RegexSentenceSegmenter.BOUNDARY_PATTERN.finditer(text):
+            if self._is_abbreviation(text, match.start()):
+                continue
+            sentence = text[start:match.end()].strip()
+            if sentence:
+                sentences.append(sentence)
+            start = match.end()
+        sentence = text[start:].strip()
+        if sentence:
+            sentences.append(sentence)
+        return sentences
+
+    @staticmethod
+    def _is_abbreviation(text: str, end: int) -> bool:
+        """
+        Check whether the word ending at a candidate boundary is an abbreviation or initial.
+
+        Args:
+            text (str): The text being split.
+            end (int): The index of the terminating punctuation.
+
+        Returns:
+            bool: True if the punctuation does not end a sentence.
+        """
+        if text[end] != ".":
+            return False
+        word_start = max(text.rfind(" ", 0, end), text.rfind("\n", 0, end)) + 1
+        word = text[word_start:end].lstrip("'\"([").lower()
+        return (len(word) == 1 and word.isalpha()) or word in RegexSentenceSegmenter.ABBREVIATIONS
@@ -0,0 +1,97 @@
+import threading
+from abc import ABC, abstractmethod
+from enum import Enum
+from src.cfg.logging_config import *
+
+
+class SentenceSegmenterOptions(Enum):
+    """
+    An enumeration representing options for sentence segmenters.
+
+    Attributes:
+        PUNKT (str): Represents the NLTK Punkt sentence tokenizer.
+        REGEX (str): Represents the pure-Python regex sentence segmenter.
+        DEFAULT (str): Represents Punkt when its model is available locally, and regex otherwise.
+    """
+    PUNKT = "Punkt"
+    REGEX = "Regex"
+    DEFAULT = "Default"
+
+
+class SentenceSegmenter(ABC):
+    """
+    An abstract base class for sentence segmenters.
+
+    Segmenters are created once per process through get() and shared by every caller, so
+    models are loaded at most once no matter how many files are chunked.
+
+    Attributes:
+        None
+    """
+
+    __instances = {}
+    __lock = threading.Lock()
+
+    @abstractmethod
+    def tokenize(self, text: str) -> list[str]:
+        """
+        Split text into sentences.
+
+        This method must be implemented by subclasses.
+
+        Args:
+            text (str): The text to split.
+
+        Returns:
+            list[str]: The sentences of the text, in order.
+        """
+        pass
+
+    @staticmethod
+    def get(option: SentenceSegmenterOptions = SentenceSegmenterOptions.DEFAULT) -> "SentenceSegmenter":
+        """
+        Get the process-wide sentence segmenter for an option, creating it on first use.
+
+        Args:
+            option (SentenceSegmenterOptions): The sentence segmenter option.
+
+        Returns:
+            SentenceSegmenter: The shared sentence segmenter.
+
+        Raises:
+            LookupError: If PUNKT is requested and the Punkt model is not available locally.
+        """
+        instance = SentenceSegmenter.__instances.get(option)
+        if instance is not None:
+            return instance
+
+        with SentenceSegmenter.__lock:
+            if option not in SentenceSegmenter.__instances:
+                SentenceSegmenter.__instances[option] = SentenceSegmenter.__create(option)
+            return SentenceSegmenter.__instances[option]
+
+    @staticmethod
+    def __create(option: SentenceSegmenterOptions) -> "SentenceSegmenter":
+        """
+        Create a sentence segmenter for an option.
+
+        Args:
+            option (SentenceSegmenterOptions): The sentence segmenter option.
+
+        Returns:
+            SentenceSegmenter: The new sentence segmenter.
+        """
+        from src.segmenters.PunktSentenceSegmenter import PunktSentenceSegmenter
+        from src.segmenters.RegexSentenceSegmenter import RegexSentenceSegmenter
+
+        if option == SentenceSegmenterOptions.REGEX:
+            return RegexSentenceSegmenter()
+        if option == SentenceSegmenterOptions.PUNKT:
+            return PunktSentenceSegmenter()
+        try:
+            return PunktSentenceSegmenter()
+        except ImportError:
+            logger.warning("NLTK is not installed, using regex sentence segmenter")
+        except LookupError:
+            logger.warning("Punkt model not found in local NLTK data, using regex sentence segmenter")
+        return RegexSentenceSegmenter()
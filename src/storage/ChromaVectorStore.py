@@ -1,11 +1,43 @@
-from langchain_core.documents import Document
-from src.inputs.InputFile import InputFile, InputFileType
+import os
+import chromadb
+import chromadb.config
+import numpy as np
+from src.chunkers.TokenChunker import TokenChunker
+from src.embeddings.BatchEmbedder import BatchEmbedder
+from src.inputs.InputFile import InputFile
+from src.storage.HybridRetriever import HybridRetriever
+from src.storage.IngestManifest import IngestManifest
+from src.storage.KeywordIndex import KeywordIndex
+from src.storage.SnapshotRetriever import SnapshotRetriever
+from src.storage.TitleIndex import ChunkFilter
 from src.storage.VectorStore import VectorStore, VectorStoreOptions
+from chromadb.telemetry import Telemetry, TelemetryEvent
 from langchain_community.vectorstores import Chroma
+from overrides import override
+from langchain_core.documents import Document
 from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
 from src.cfg.logging_config import *
 
 
+class OfflineTelemetry(Telemetry):
+    """
+    A Chroma telemetry component dropping every event, so Chroma never tries to send one.
+    """
+
+    @override
+    def capture(self, event: TelemetryEvent) -> None:
+        """
+        Drop a telemetry event.
+
+        Args:
+            event (TelemetryEvent): The event.
+
+        Returns:
+            None
+        """
+
+
 class ChromaVectorStore(VectorStore):
     """
     A class representing a Chroma vector store.
@@ -13,19 +45,77 @@ class ChromaVectorStore(VectorStore):
     This class extends VectorStore and provides specific functionality for storing
     and retrieving documents using the Chroma vector store.
 
+    When a persist directory is given, the collection is stored on disk and reopened on
+    restart, and the IngestManifest is persisted to the same directory, so files already
+    embedded are not embedded again. With hybrid search, the chunks are also
+    added to a KeywordIndex persisted to a subdirectory. The TitleIndex is rebuilt from the
+    collection's metadata on restart.
+
     Attributes:
         vector_store (Chroma): The Chroma vector store.
+        batch_embedder (BatchEmbedder): The embedder used to embed new chunks in concurrent batches.
+        persist_directory (str): The directory the collection is persisted to, or None for in-memory.
     """
 
-    def __init__(self, embeddings: Embeddings):
+    COLLECTION_NAME = "documents"
+    MANIFEST_FILE_NAME = "manifest.json"
+    KEYWORD_INDEX_DIRECTORY_NAME = "keywords"
+    SEARCH_OVERSAMPLING = 4
+
+    def __init__(self, embeddings: Embeddings, persist_directory: str = None, embedding_batch_size: int = 256,
+                 embedding_batch_tokens: int = 64_000, embedding_concurrency: int = 4, chunk_tokens: int = 512,
+                 chunk_overlap_tokens: int = 64, hybrid_search: bool = True):
         """
         Initialize a ChromaVectorStore object.
 
         Args:
             embeddings (Embeddings): The embeddings used by the vector store.
+            persist_directory (str): The directory to persist the collection to. If None, the
+                collection is kept in memory only.
+            embedding_batch_size (int): The maximum number of chunks embedded in one request.
+            embedding_batch_tokens (int): The maximum estimated number of tokens embedded in one request.
+            embedding_concurrency (int): The maximum number of embedding requests in flight.
+            chunk_tokens (int): The maximum number of tokens in a stored chunk.
+            chunk_overlap_tokens (int): The number of tokens shared by consecutive chunks of a page.
+            hybrid_search (bool): Whether chunks are also indexed by keywords, so retrievers fuse
+                keyword and similarity rankings.
         """
-        super().__init__(vector_store_type=VectorStoreOptions.CHROMA, embeddings=embeddings)
-        self.vector_store = Chroma(embedding_function=embeddings)
+        super().__init__(vector_store_type=VectorStoreOptions.CHROMA, embeddings=embeddings,
+                         chunker=TokenChunker(chunk_tokens, chunk_overlap_tokens))
+        self.batch_embedder = BatchEmbedder(embeddings, max_batch_size=embedding_batch_size,
+                                            max_batch_tokens=embedding_batch_tokens,
+                                            max_concurrency=embedding_concurrency)
+        self.persist_directory = persist_directory
+        # Chroma reports usage to its developers unless told not to, and no request may leave the host
+        client_settings = chromadb.config.Settings(anonymized_telemetry=False, chroma_telemetry_impl="{}.{}".format(
+            OfflineTelemetry.__module__, OfflineTelemetry.__name__))
+        if persist_directory is None:
+            self.vector_store = Chroma(embedding_function=embeddings, client=chromadb.Client(client_settings))
+        else:
+            os.makedirs(persist_directory, exist_ok=True)
+            self.vector_store = Chroma(collection_name=ChromaVectorStore.COLLECTION_NAME,
+                                       embedding_function=embeddings, persist_directory=persist_directory,
+                                       client_settings=client_settings)
+            self.manifest = IngestManifest(os.path.join(persist_directory, ChromaVectorStore.MANIFEST_FILE_NAME))
+            stored = self.vector_store._collection.get(include=["metadatas"])
+            self.resume_epoch(max((epoch for metadata in stored["metadatas"]
+                                   for epoch in (metadata.get("epoch", 0), metadata.get("retired", 0))
+                                   if epoch != VectorStore.NEVER_RETIRED), default=0))
+            # Chunks retired but not reclaimed before the store was closed can no longer be read by any snapshot
+            retired_ids = [chunk_id for chunk_id, metadata in zip(stored["ids"], stored["metadatas"])
+                           if metadata.get("retired", VectorStore.NEVER_RETIRED) != VectorStore.NEVER_RETIRED]
+            if retired_ids:
+                logger.info("Removing {} chunks superseded before Chroma Vector Store was closed", len(retired_ids))
+                self.vector_store.delete(retired_ids)
+                self.vector_store.persist()
+                stored = self.vector_store._collection.get(include=["metadatas"])
+            self.title_index.add(stored["ids"], stored["metadatas"])
+            logger.info("Opened persistent Chroma Vector Store in {}", persist_directory)
+        if hybrid_search:
+            self.keyword_index = KeywordIndex(None if persist_directory is None else os.path.join(
+                persist_directory, ChromaVectorStore.KEYWORD_INDEX_DIRECTORY_NAME))
+            if persist_directory is not None:
+                self.keyword_index.sync(stored["ids"], self._get_texts)
 
     def add_document(self, input_file: InputFile) -> None:
         """
@@ -37,37 +127,301 @@ class ChromaVectorStore(VectorStore):
         Returns:
             None
         """
-        input_file_type = input_file.input_file_type
-
-        new_docs = []
-        if input_file_type == InputFileType.PDF:
-            pdf_title = input_file.name
-            pages = input_file.data.get("pages")
-
-            for i in range(len(pages)):
-                page = pages[i]
-                new_docs.append(
-                    Document(text=page, page_content=page, metadata={"title": pdf_title, "page_number": i + 1}))
-        elif input_file_type == InputFileType.TEXT:
-            text_title = input_file.name
-            pages = input_file.data.get("pages")
-
-            for i in range(len(pages)):
-                page = pages[i]
-                new_docs.append(
-                    Document(text=page, page_content=page, metadata={"title": text_title, "page_number": i + 1}))
-        else:
-            logger.error("Unexpected InputFileType {}", input_file.path)
-            raise ValueError("Unsupported file format {}", input_file.path)
+        self.add_documents([input_file])
+
+    def add_documents(self, input_files: list[InputFile]) -> None:
+        """
+        Add a batch of documents to the Chroma vector store.
+
+        The pages of all documents are embedded together by the BatchEmbedder, packed into
+        batches across document boundaries, and written to the collection in a single upsert,
+        except for chunks of changed files that are already stored. The new chunks are
+        published once they are all written, so a retriever never sees part of a batch, unless
+        defer_reclaim is set and the caller publishes them.
+
+        Args:
+            input_files (list[InputFile]): InputFiles containing the documents to be added.
+
+        Returns:
+            None
+        """
+        docs_per_file = [(input_file, self.build_documents(input_file)) for input_file in input_files]
+        docs = [doc for _, file_docs in docs_per_file for doc in file_docs]
+        ids, write_positions, retired_ids = self.assign_ids(docs_per_file)
+
+        if write_positions:
+            new_ids = [ids[position] for position in write_positions]
+            texts = [docs[position].page_content for position in write_positions]
+            metadatas = [dict(docs[position].metadata, epoch=self.write_epoch, retired=VectorStore.NEVER_RETIRED)
+                         for position in write_positions]
+            self.vector_store._collection.upsert(ids=new_ids, embeddings=self.batch_embedder.embed_documents(texts),
+                                                 metadatas=metadatas, documents=texts)
+            self.title_index.add(new_ids, metadatas)
+            if self.keyword_index is not None:
+                self.keyword_index.add(new_ids, texts)
+
+        self.record_documents(input_files, retired_ids)
+        for input_file in input_files:
+            logger.info("Successfully added {} to Chroma Vector Store", input_file.name)
+        logger.info("Wrote {} of {} chunks to Chroma Vector Store", len(write_positions), len(ids))
+
+        if not self.defer_reclaim:
+            self.publish()
+        if self.persist_directory is not None:
+            self.vector_store.persist()
 
-        logger.info("Successfully added {} to Chroma Vector Store", input_file.name)
-        self.vector_store.add_documents(new_docs)
+    def reclaim(self, ids: list[str]) -> None:
+        """
+        Delete superseded chunks from the Chroma vector store.
+
+        Args:
+            ids (list[str]): The ids of the chunks to delete.
+
+        Returns:
+            None
+        """
+        if ids:
+            reclaimed = self.vector_store._collection.get(ids=ids, include=["metadatas"])
+            self.title_index.remove(reclaimed["ids"], reclaimed["metadatas"])
+            self.vector_store.delete(ids)
+            if self.persist_directory is not None:
+                self.vector_store.persist()
+            if self.keyword_index is not None:
+                self.keyword_index.remove(ids)
+            logger.info("Removed {} superseded chunks from Chroma Vector Store", len(ids))
+
+    def is_document_current(self, file_path: str, content_hash: str = None) -> bool:
+        """
+        Check whether a file is already persisted and unchanged since it was added.
+
+        Args:
+            file_path (str): The path to the file.
+            content_hash (str): The hash of the file's content, if it is held in memory rather than on disk.
+
+        Returns:
+            bool: True if the manifest holds the file's current content hash.
+        """
+        return self.persist_directory is not None and self.manifest.is_current(file_path, content_hash)
+
+    def retire(self, ids: list[str], epoch: int) -> None:
+        """
+        Set the retirement epoch of chunks.
+
+        Args:
+            ids (list[str]): The ids of the chunks.
+            epoch (int): The epoch the chunks are retired in.
+
+        Returns:
+            None
+        """
+        if not ids:
+            return
+        retired = self.vector_store._collection.get(ids=ids, include=["metadatas"])
+        if not retired["ids"]:
+            return
+        self.vector_store._collection.update(ids=retired["ids"], metadatas=[dict(metadata, retired=epoch)
+                                                                            for metadata in retired["metadatas"]])
 
-    def as_retriever(self):
+    def delete_document(self, document_id: str) -> bool:
         """
-        Convert the Chroma vector store to a retriever.
+        Delete a document stored from a file, retiring all of its chunks.
+
+        Args:
+            document_id (str): The id of the document.
+
+        Returns:
+            bool: True if the document was found and deleted.
+        """
+        deleted = super().delete_document(document_id)
+        if deleted and self.persist_directory is not None:
+            self.vector_store.persist()
+        return deleted
+
+    def stored_ids(self, ids: list[str]) -> set[str]:
+        """
+        Find which chunks are stored, whether visible, retired or not yet reclaimed.
+
+        Args:
+            ids (list[str]): The chunk ids.
+
+        Returns:
+            set[str]: The ids of the stored chunks.
+        """
+        if not ids:
+            return set()
+        return set(self.vector_store._collection.get(ids=ids, include=[])["ids"])
+
+    def search(self, query: str, k: int, epoch: int, chunk_filter: ChunkFilter = None) -> list[Document]:
+        """
+        Find the chunks most similar to a query among those visible at an epoch.
+
+        Chroma evaluates metadata filters by scanning every chunk's metadata before the vector
+        search, so the chunks are first searched without a filter, fetching a few more than
+        needed, and checked for visibility here. The filtered search is only run when too
+        few of the fetched chunks are visible.
+
+        For the same reason, searches restricted by a chunk filter fetch the embeddings of the
+        chunks the title index finds for it by id and score them here.
+
+        Args:
+            query (str): The query.
+            k (int): The maximum number of chunks returned.
+            epoch (int): The published epoch whose chunks are searched.
+            chunk_filter (ChunkFilter): The filter restricting the chunks searched, or None.
+
+        Returns:
+            list[Document]: The most similar chunks, most similar first.
+        """
+        query_vector = self.embeddings.embed_query(query)
+        if chunk_filter is not None:
+            return self._filtered_search([query_vector], k, epoch, chunk_filter)[0]
+        return self._search_vectors([query_vector], k, epoch)[0]
+
+    def search_many(self, queries: list[str], k: int, epoch: int,
+                    chunk_filter: ChunkFilter = None) -> list[list[Document]]:
+        """
+        Find the chunks most similar to each of several queries among those visible at an epoch.
+
+        The queries are embedded in one batch and searched in one collection query, with the
+        same oversampling and visibility check as search(). Searches restricted by a chunk
+        filter score the chunks it finds for all queries as one matrix product.
+
+        Args:
+            queries (list[str]): The queries.
+            k (int): The maximum number of chunks returned per query.
+            epoch (int): The published epoch whose chunks are searched.
+            chunk_filter (ChunkFilter): The filter restricting the chunks searched, or None.
+
+        Returns:
+            list[list[Document]]: The most similar chunks of each query, most similar first.
+        """
+        if not queries:
+            return []
+        query_vectors = self.embeddings.embed_documents(queries)
+        if chunk_filter is not None:
+            return self._filtered_search(query_vectors, k, epoch, chunk_filter)
+        return self._search_vectors(query_vectors, k, epoch)
+
+    def get_chunks(self, ids: list[str], epoch: int) -> dict[str, Document]:
+        """
+        Get chunks by id, leaving out those not visible at an epoch.
+
+        Args:
+            ids (list[str]): The chunk ids.
+            epoch (int): The published epoch whose chunks are returned.
+
+        Returns:
+            dict[str, Document]: The visible chunks, keyed by id.
+        """
+        if not ids:
+            return {}
+        result = self.vector_store._collection.get(ids=ids, include=["documents", "metadatas"])
+        return {chunk_id: Document(page_content=text, metadata=metadata)
+                for chunk_id, text, metadata in zip(result["ids"], result["documents"], result["metadatas"])
+                if metadata.get("epoch", 0) <= epoch < metadata.get("retired", 0)}
+
+    def as_retriever(self) -> BaseRetriever:
+        """
+        Convert the Chroma vector store to a retriever over the chunks published so far.
+
+        Returns:
+            BaseRetriever: A HybridRetriever with hybrid search, or else a SnapshotRetriever.
+        """
+        if self.keyword_index is not None:
+            return HybridRetriever(vector_store=self, epoch=self.published_epoch)
+        return SnapshotRetriever(vector_store=self, epoch=self.published_epoch)
+
+    def _search_vectors(self, query_vectors: list[list[float]], k: int, epoch: int) -> list[list[Document]]:
+        """
+        Find the chunks most similar to each query embedding among those visible at an epoch.
+
+        The chunks of all queries are fetched in one collection query without a filter. Only
+        the queries with too few visible chunks among them run the filtered search.
+
+        Args:
+            query_vectors (list[list[float]]): The query embeddings.
+            k (int): The maximum number of chunks returned per query.
+            epoch (int): The published epoch whose chunks are searched.
+
+        Returns:
+            list[list[Document]]: The most similar chunks of each query, most similar first.
+        """
+        fetch_k = k * ChromaVectorStore.SEARCH_OVERSAMPLING
+        result = self.vector_store._collection.query(query_embeddings=query_vectors, n_results=fetch_k,
+                                                     include=["documents", "metadatas"])
+        results = []
+        for query_vector, texts, metadatas in zip(query_vectors, result["documents"], result["metadatas"]):
+            visible = [Document(page_content=text, metadata=metadata) for text, metadata in zip(texts, metadatas)
+                       if metadata.get("epoch", 0) <= epoch < metadata.get("retired", 0)]
+            if len(visible) < k and len(texts) == fetch_k:
+                visible = self.vector_store.similarity_search_by_vector(query_vector, k=k, filter={
+                    "$and": [{"epoch": {"$lte": epoch}}, {"retired": {"$gt": epoch}}]})
+            results.append(visible[:k])
+        return results
+
+    def _filtered_search(self, query_vectors: list[list[float]], k: int, epoch: int,
+                         chunk_filter: ChunkFilter) -> list[list[Document]]:
+        """
+        Find the chunks most similar to each query embedding among those visible at an epoch and
+        passing a filter, ranked by the distance the collection is indexed with, as unfiltered
+        searches are.
+
+        Args:
+            query_vectors (list[list[float]]): The query embeddings.
+            k (int): The maximum number of chunks returned per query.
+            epoch (int): The published epoch whose chunks are searched.
+            chunk_filter (ChunkFilter): The filter restricting the chunks searched.
+
+        Returns:
+            list[list[Document]]: The most similar chunks of each query, most similar first.
+        """
+        ids = self.title_index.lookup(chunk_filter)
+        if not ids:
+            return [[] for _ in query_vectors]
+        result = self.vector_store._collection.get(ids=ids, include=["embeddings", "documents", "metadatas"])
+        visible = [position for position, metadata in enumerate(result["metadatas"])
+                   if metadata.get("epoch", 0) <= epoch < metadata.get("retired", 0)]
+        if not visible:
+            return [[] for _ in query_vectors]
+        vectors = np.asarray([result["embeddings"][position] for position in visible], dtype=np.float32)
+        distances = self._distances(vectors, np.asarray(query_vectors, dtype=np.float32))
+        docs = [Document(page_content=result["documents"][position], metadata=result["metadatas"][position])
+                for position in visible]
+        return [[docs[position] for position in np.argsort(distances[:, query], kind="stable")[:k]]
+                for query in range(len(query_vectors))]
+
+    def _distances(self, vectors: np.ndarray, query_vectors: np.ndarray) -> np.ndarray:
+        """
+        Compute the distances between chunk and query embeddings in the space of the collection,
+        squared L2 unless the collection was created with another hnsw:space.
+
+        Args:
+            vectors (np.ndarray): The chunk embeddings, one per row.
+            query_vectors (np.ndarray): The query embeddings, one per row.
+
+        Returns:
+            np.ndarray: The distance of each chunk, by row, to each query, by column.
+        """
+        space = (self.vector_store._collection.metadata or {}).get("hnsw:space", "l2")
+        products = vectors @ query_vectors.T
+        if space == "ip":
+            return 1 - products
+        if space == "cosine":
+            norms = np.outer(np.linalg.norm(vectors, axis=1), np.linalg.norm(query_vectors, axis=1))
+            return 1 - products / np.maximum(norms, np.finfo(np.float32).tiny)
+        return (np.sum(vectors ** 2, axis=1)[:, np.newaxis] + np.sum(query_vectors ** 2, axis=1)[np.newaxis]
+                - 2 * products)
+
+    def _get_texts(self, ids: list[str]) -> list[str]:
+        """
+        Get the texts of chunks by id.
+
+        Args:
+            ids (list[str]): The chunk ids.
 
         Returns:
-            ChromaRetriever: The retriever representation of the Chroma vector store.
+            list[str]: The chunk texts, in the order of their ids.
         """
-        return self.vector_store.as_retriever()
+        result = self.vector_store._collection.get(ids=ids, include=["documents"])
+        texts = dict(zip(result["ids"], result["documents"]))
+        return [texts[chunk_id] for chunk_id in ids]
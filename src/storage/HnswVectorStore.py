@@ -0,0 +1,327 @@
+import copy
+import os
+import threading
+import hnswlib
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from src.storage.NumpyVectorStore import NumpyRows, NumpyVectorStore, QuantizationOptions
+from src.storage.TitleIndex import ChunkFilter
+from src.storage.VectorStore import VectorStoreOptions
+from src.cfg.logging_config import *
+
+
+class HnswVectorStore(NumpyVectorStore):
+    """
+    A class representing an in-process vector store searched through an HNSW graph.
+
+    This class extends NumpyVectorStore, which remains the source of truth for the chunks, with
+    an hnswlib graph labelled by row, so a query visits a small fraction of the rows instead of
+    all of them. Recall is traded for speed with hnsw_m and hnsw_ef_construction when the graph
+    is built and with hnsw_ef_search when it is searched; benchmark/benchmark-ann.py measures
+    both on synthetic embeddings. New rows are inserted into the graph as they are added.
+    Chunks hidden from a snapshot are dropped from an oversampled result, and the exact search
+    of NumpyVectorStore is used when too few are left.
+
+    Searches never lock the graph: hnswlib searches safely while rows are inserted into or
+    deleted from it, and a graph that must grow is copied and the copy resized and published,
+    since resizing is not safe while a graph is searched. The graph's ef is set once, as hnswlib
+    considers at least as many candidates as the rows asked for.
+
+    The graph of a persisted store is saved every index_save_rows new rows and on compaction.
+    Rows added after the last save are inserted again when the store is opened.
+
+    Attributes:
+        hnsw_m (int): The number of neighbours linked to each row in the graph.
+        hnsw_ef_construction (int): The number of candidates considered when inserting a row.
+        hnsw_ef_search (int): The number of candidates considered when searching.
+        index_save_rows (int): The number of new rows after which the graph is saved.
+    """
+
+    GRAPH_FILE_NAME = "hnsw-{}.bin"
+    SEARCH_OVERSAMPLING = 2
+    MIN_CAPACITY = 1024
+
+    def __init__(self, embeddings: Embeddings, persist_directory: str = None, embedding_batch_size: int = 256,
+                 embedding_batch_tokens: int = 64_000, embedding_concurrency: int = 4, chunk_tokens: int = 512,
+                 chunk_overlap_tokens: int = 64, quantization: QuantizationOptions = QuantizationOptions.NONE,
+                 rescore_candidates: int = 32, hybrid_search: bool = True, hnsw_m: int = 16,
+                 hnsw_ef_construction: int = 200, hnsw_ef_search: int = 64, index_save_rows: int = 10_000):
+        """
+        Initialize a HnswVectorStore object.
+
+        Args:
+            embeddings (Embeddings): The embeddings used by the vector store.
+            persist_directory (str): The directory to persist the store to. If None, the store is
+                kept in memory only.
+            embedding_batch_size (int): The maximum number of chunks embedded in one request.
+            embedding_batch_tokens (int): The maximum estimated number of tokens embedded in one request.
+            embedding_concurrency (int): The maximum number of embedding requests in flight.
+            chunk_tokens (int): The maximum number of tokens in a stored chunk.
+            chunk_overlap_tokens (int): The number of tokens shared by consecutive chunks of a page.
+            quantization (QuantizationOptions): How the embeddings searched exactly are compressed, or its value.
+                The graph keeps its own float32 copy, so int8 adds to the memory used rather than saving it.
+            rescore_candidates (int): The number of rows rescored against their full vectors with quantization.
+            hybrid_search (bool): Whether chunks are also indexed by keywords, so retrievers fuse
+                keyword and similarity rankings.
+            hnsw_m (int): The number of neighbours linked to each row in the graph.
+            hnsw_ef_construction (int): The number of candidates considered when inserting a row.
+            hnsw_ef_search (int): The number of candidates considered when searching.
+            index_save_rows (int): The number of new rows after which the graph of a persisted
+                store is saved.
+        """
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construction = hnsw_ef_construction
+        self.hnsw_ef_search = hnsw_ef_search
+        self.index_save_rows = index_save_rows
+        self._graph = None
+        self._saved_rows = 0
+        # Serializes changes to the graph: insertions, deletions and replacing it. Searches never take it
+        self._graph_lock = threading.Lock()
+        super().__init__(embeddings, persist_directory, embedding_batch_size, embedding_batch_tokens,
+                         embedding_concurrency, chunk_tokens, chunk_overlap_tokens, quantization, rescore_candidates,
+                         hybrid_search)
+        self.vector_store_type = VectorStoreOptions.HNSW
+        if self.quantization == QuantizationOptions.INT8:
+            logger.warning("int8 quantization only speeds up filtered and fallback searches of HNSW Vector Store, "
+                           "the graph keeps a float32 copy of every embedding")
+        # Searches read the rows and the graph labelled by them together
+        self._indexed = (self._rows, self._graph)
+
+    def search(self, query: str, k: int, epoch: int, chunk_filter: ChunkFilter = None) -> list[Document]:
+        """
+        Find the chunks most similar to a query among those visible at an epoch.
+
+        Filtered searches score the rows the title index finds for the filter exactly instead,
+        since the graph would have to be walked past every row of other documents.
+
+        Args:
+            query (str): The query.
+            k (int): The maximum number of chunks returned.
+            epoch (int): The published epoch whose chunks are searched.
+            chunk_filter (ChunkFilter): The filter restricting the chunks searched, or None.
+
+        Returns:
+            list[Document]: The most similar chunks, most similar first.
+        """
+        if chunk_filter is not None:
+            return super().search(query, k, epoch, chunk_filter)
+        rows, graph = self._indexed
+        if rows.count == 0:
+            return []
+        query_vector = NumpyVectorStore.normalize(np.asarray(self.embeddings.embed_query(query), dtype=np.float32))
+        return self.graph_search(rows, graph, query_vector[np.newaxis], k, epoch, num_threads=1)[0]
+
+    def search_many(self, queries: list[str], k: int, epoch: int,
+                    chunk_filter: ChunkFilter = None) -> list[list[Document]]:
+        """
+        Find the chunks most similar to each of several queries among those visible at an epoch.
+
+        The queries are embedded in one batch and the graph is searched for all of them in one
+        call, spread over the cores.
+
+        Args:
+            queries (list[str]): The queries.
+            k (int): The maximum number of chunks returned per query.
+            epoch (int): The published epoch whose chunks are searched.
+            chunk_filter (ChunkFilter): The filter restricting the chunks searched, or None.
+
+        Returns:
+            list[list[Document]]: The most similar chunks of each query, most similar first.
+        """
+        if chunk_filter is not None:
+            return super().search_many(queries, k, epoch, chunk_filter)
+        rows, graph = self._indexed
+        if rows.count == 0 or not queries:
+            return [[] for _ in queries]
+        query_vectors = NumpyVectorStore.normalize(np.asarray(self.embeddings.embed_documents(queries),
+                                                              dtype=np.float32))
+        return self.graph_search(rows, graph, query_vectors, k, epoch, num_threads=-1)
+
+    def graph_search(self, rows: NumpyRows, graph: hnswlib.Index, query_vectors: np.ndarray, k: int, epoch: int,
+                     num_threads: int) -> list[list[Document]]:
+        """
+        Find the chunks most similar to each query vector among those visible at an epoch
+        through the graph, falling back to scoring every row for queries it cannot serve.
+
+        Args:
+            rows (NumpyRows): The rows searched.
+            graph (hnswlib.Index): The graph labelled by the rows.
+            query_vectors (np.ndarray): The normalized query embeddings, one per row.
+            k (int): The maximum number of chunks returned per query.
+            epoch (int): The published epoch whose chunks are searched.
+            num_threads (int): The number of threads searching the graph, or -1 for all cores.
+
+        Returns:
+            list[list[Document]]: The most similar chunks of each query, most similar first.
+        """
+        fetch_k = min(k * HnswVectorStore.SEARCH_OVERSAMPLING, rows.count)
+        try:
+            labels, _ = graph.knn_query(query_vectors, k=fetch_k, num_threads=num_threads)
+        except RuntimeError:
+            # The graph cannot return fetch_k rows when too many of them are deleted
+            return self.build_results_many(rows, self.scan_search(rows, query_vectors, k, epoch))
+
+        epochs = rows.epochs
+        results = []
+        for query_vector, query_labels in zip(query_vectors, labels):
+            visible = [label for label in query_labels
+                       if label < rows.count and epochs[label, 0] <= epoch < epochs[label, 1]]
+            if len(visible) < k and fetch_k < rows.count:
+                visible = self.scan_search(rows, query_vector[np.newaxis], k, epoch)[0]
+            results.append(visible[:k])
+        return self.build_results_many(rows, results)
+
+    def reclaim(self, ids: list[str]) -> None:
+        """
+        Hide superseded chunks from every retriever and delete them from the graph.
+
+        Args:
+            ids (list[str]): The ids of the chunks to reclaim.
+
+        Returns:
+            None
+        """
+        rows = [self._row_of_id[chunk_id] for chunk_id in ids if chunk_id in self._row_of_id]
+        with self._graph_lock:
+            for row in rows:
+                self._graph.mark_deleted(row)
+        super().reclaim(ids)
+
+    def _new_graph(self, capacity: int) -> hnswlib.Index:
+        """
+        Create an empty graph.
+
+        Args:
+            capacity (int): The number of rows the graph can hold before it is resized.
+
+        Returns:
+            hnswlib.Index: The graph.
+        """
+        graph = hnswlib.Index(space="ip", dim=self.dimension)
+        graph.init_index(max_elements=max(capacity, HnswVectorStore.MIN_CAPACITY),
+                         ef_construction=self.hnsw_ef_construction, M=self.hnsw_m)
+        graph.set_ef(self.hnsw_ef_search)
+        return graph
+
+    def _insert(self, first_row: int, vectors: np.ndarray) -> None:
+        """
+        Insert rows into the graph, growing it if needed.
+
+        A graph too small for the rows is replaced by a larger copy, so searches still holding
+        the old graph are never disturbed by the resize.
+
+        Args:
+            first_row (int): The index of the first row inserted.
+            vectors (np.ndarray): The normalized embeddings of the rows.
+
+        Returns:
+            None
+        """
+        count = first_row + len(vectors)
+        with self._graph_lock:
+            if self._graph is None:
+                self._graph = self._new_graph(count)
+            elif count > self._graph.get_max_elements():
+                graph = copy.copy(self._graph)
+                graph.resize_index(max(count, 2 * self._graph.get_max_elements()))
+                self._graph = graph
+            self._graph.add_items(vectors, np.arange(first_row, count))
+
+    def _load(self) -> None:
+        """
+        Memory-map the persisted rows and load the graph, inserting any rows added after it was saved.
+
+        Returns:
+            None
+        """
+        super()._load()
+        rows = self._rows
+        if rows.count == 0:
+            return
+        graph_path = self._path(HnswVectorStore.GRAPH_FILE_NAME)
+        if os.path.isfile(graph_path):
+            self._graph = hnswlib.Index(space="ip", dim=self.dimension)
+            self._graph.load_index(graph_path, max_elements=max(rows.count, HnswVectorStore.MIN_CAPACITY))
+            self._graph.set_ef(self.hnsw_ef_search)
+            if self._graph.get_current_count() > rows.count:
+                # Rows a crash left partly written were dropped after the graph was saved
+                self._graph = None
+        indexed = self._graph.get_current_count() if self._graph is not None else 0
+        self._saved_rows = indexed
+        if indexed < rows.count:
+            logger.info("Inserting {} rows added since the HNSW graph was saved", rows.count - indexed)
+            self._insert(indexed, np.asarray(rows.vectors[indexed:rows.count]))
+        for row in np.flatnonzero(rows.epochs[:rows.count, 1] == NumpyVectorStore.RECLAIMED):
+            try:
+                self._graph.mark_deleted(int(row))
+            except RuntimeError:
+                # The row was already deleted when the graph was saved
+                pass
+        self._indexed = (self._rows, self._graph)
+
+    def _append(self, ids: list[str], texts: list[str], metadatas: list[dict], vectors: np.ndarray,
+                epoch: int) -> None:
+        """
+        Append rows to the store and insert them into the graph.
+
+        Args:
+            ids (list[str]): The chunk ids.
+            texts (list[str]): The chunk texts.
+            metadatas (list[dict]): The chunk metadata.
+            vectors (np.ndarray): The normalized embeddings of the chunks.
+            epoch (int): The epoch the chunks are written in.
+
+        Returns:
+            None
+        """
+        first_row = self._rows.count
+        super()._append(ids, texts, metadatas, vectors, epoch)
+        self._insert(first_row, vectors)
+        self._indexed = (self._rows, self._graph)
+        self._save_graph_if_due()
+
+    def _compact(self) -> None:
+        """
+        Rewrite the rows without the reclaimed ones and rebuild the graph over them.
+
+        Returns:
+            None
+        """
+        old_generation = self.generation
+        super()._compact()
+        rows = self._rows
+        graph = self._new_graph(rows.count)
+        if rows.count:
+            graph.add_items(np.asarray(rows.vectors[:rows.count]), np.arange(rows.count))
+        with self._graph_lock:
+            self._graph = graph
+        self._indexed = (rows, self._graph)
+        if self.persist_directory is not None:
+            self._save_graph()
+            old_graph_path = self._path(HnswVectorStore.GRAPH_FILE_NAME, old_generation)
+            if os.path.isfile(old_graph_path):
+                os.remove(old_graph_path)
+
+    def _save_graph_if_due(self) -> None:
+        """
+        Save the graph of a persisted store once index_save_rows rows were added since it was last saved.
+
+        Returns:
+            None
+        """
+        if self.persist_directory is not None and self._rows.count - self._saved_rows >= self.index_save_rows:
+            self._save_graph()
+
+    def _save_graph(self) -> None:
+        """
+        Save the graph atomically.
+
+        Returns:
+            None
+        """
+        graph_path = self._path(HnswVectorStore.GRAPH_FILE_NAME)
+        self._graph.save_index(graph_path + ".tmp")
+        os.replace(graph_path + ".tmp", graph_path)
+        self._saved_rows = self._rows.count
+        logger.info("Saved HNSW graph of {} rows", self._saved_rows)
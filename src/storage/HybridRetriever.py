@@ -0,0 +1,90 @@
+from typing import Any, Optional
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from src.storage.TitleIndex import ChunkFilter
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    A retriever searching a vector store as it was at a published epoch both by similarity and
+    by keywords, fusing the two rankings by reciprocal rank fusion.
+
+    Each chunk scores the sum of 1 / (rrf_k + rank) over the rankings it appears in, so chunks
+    ranked high by either search come first without comparing similarities to BM25 scores.
+
+    The vector store must provide search(query, k, epoch, chunk_filter),
+    search_many(queries, k, epoch, chunk_filter), keyword_search(query, k, epoch, chunk_filter)
+    and keyword_search_many(queries, k, epoch, chunk_filter).
+
+    Attributes:
+        vector_store (Any): The vector store searched.
+        epoch (int): The published epoch the retriever sees.
+        k (int): The number of documents retrieved.
+        chunk_filter (ChunkFilter): The filter restricting the chunks retrieved, or None.
+        candidates (int): The number of chunks taken from each ranking before fusing them.
+        rrf_k (int): The constant added to ranks, which flattens the weight of the first ranks.
+    """
+    vector_store: Any
+    epoch: int
+    k: int = 4
+    chunk_filter: Optional[ChunkFilter] = None
+    candidates: int = 20
+    rrf_k: int = 60
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        """
+        Get the documents ranked highest by the fused similarity and keyword rankings.
+
+        Args:
+            query (str): The query.
+            run_manager (CallbackManagerForRetrieverRun): The callback manager of the run.
+
+        Returns:
+            list[Document]: The highest ranked documents, highest first.
+        """
+        candidates = max(self.k, self.candidates)
+        rankings = [self.vector_store.search(query, candidates, self.epoch, self.chunk_filter),
+                    self.vector_store.keyword_search(query, candidates, self.epoch, self.chunk_filter)]
+        return self.fuse(rankings, self.k, self.rrf_k)
+
+    def retrieve_many(self, queries: list[str]) -> list[list[Document]]:
+        """
+        Get the documents ranked highest for each of several queries, running their similarity
+        searches at once and their keyword searches at once.
+
+        Args:
+            queries (list[str]): The queries.
+
+        Returns:
+            list[list[Document]]: The highest ranked documents of each query, highest first.
+        """
+        candidates = max(self.k, self.candidates)
+        similar = self.vector_store.search_many(queries, candidates, self.epoch, self.chunk_filter)
+        keywords = self.vector_store.keyword_search_many(queries, candidates, self.epoch, self.chunk_filter)
+        return [self.fuse(rankings, self.k, self.rrf_k) for rankings in zip(similar, keywords)]
+
+    @staticmethod
+    def fuse(rankings: list[list[Document]], k: int, rrf_k: int) -> list[Document]:
+        """
+        Fuse rankings of documents by reciprocal rank fusion.
+
+        Documents with the same title, page number and content are the same chunk. Ties keep
+        the order of the first ranking.
+
+        Args:
+            rankings (list[list[Document]]): The rankings, highest ranked document first.
+            k (int): The maximum number of documents returned.
+            rrf_k (int): The constant added to ranks.
+
+        Returns:
+            list[Document]: The documents with the highest fused scores, highest first.
+        """
+        scores = {}
+        docs = {}
+        for ranking in rankings:
+            for rank, doc in enumerate(ranking, start=1):
+                key = (doc.metadata.get("title"), doc.metadata.get("page_number"), doc.page_content)
+                docs.setdefault(key, doc)
+                scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+        return [docs[key] for key in sorted(scores, key=scores.get, reverse=True)[:k]]
@@ -0,0 +1,218 @@
+import hashlib
+import json
+import os
+from src.cfg.logging_config import *
+
+
+class IngestManifest:
+    """
+    A class tracking which files have already been ingested into a vector store.
+
+    Each entry is keyed by file path and records the SHA-256 hash of the file content at
+    ingestion time along with the ids of the chunks written for it, so unchanged files can
+    be skipped on restart and changed files can have their stale chunks removed. A file is
+    identified by a document id derived from its path, which stays the same across changes.
+
+    A file on disk whose document was deleted, or replaced by content in memory, is marked as
+    detached, so the service never adds it back from disk on restart or when it changes.
+
+    Attributes:
+        manifest_path (str): The path to the JSON file backing the manifest, or None for in-memory.
+        entries (dict): A mapping of file path to {"hash": str, "ids": list[str]}.
+        detached (set[str]): The paths to the files on disk that are not added from disk.
+    """
+
+    def __init__(self, manifest_path: str = None):
+        """
+        Initialize an IngestManifest object, loading existing entries from disk if present.
+
+        Args:
+            manifest_path (str): The path to the JSON file backing the manifest. If None, the
+                manifest is kept in memory only.
+        """
+        self.manifest_path = manifest_path
+        self.entries = {}
+        self.detached = set()
+        if manifest_path is not None and os.path.isfile(manifest_path):
+            with open(manifest_path, "r") as file:
+                data = json.load(file)
+            if set(data) == {"entries", "detached"}:
+                self.entries, self.detached = data["entries"], set(data["detached"])
+            else:
+                # Manifests written before files could be detached only hold the entries
+                self.entries = data
+            logger.info("Loaded ingest manifest with {} entries from {}", len(self.entries), manifest_path)
+
+    @staticmethod
+    def hash_file(file_path: str) -> str:
+        """
+        Compute the SHA-256 hash of a file's content.
+
+        Args:
+            file_path (str): The path to the file.
+
+        Returns:
+            str: The hex digest of the file content.
+        """
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def hash_content(content) -> str:
+        """
+        Compute the SHA-256 hash of file content held in memory, as hash_file() does for a file.
+
+        Args:
+            content (bytes): The file content, as bytes, bytearray or memoryview.
+
+        Returns:
+            str: The hex digest of the content.
+        """
+        return hashlib.sha256(content).hexdigest()
+
+    @staticmethod
+    def document_id(file_path: str) -> str:
+        """
+        Get the stable id of the document stored from a file.
+
+        Args:
+            file_path (str): The path to the file.
+
+        Returns:
+            str: The hex digest of the normalized path, shortened to 16 characters.
+        """
+        return hashlib.sha256(os.path.normpath(file_path).encode()).hexdigest()[:16]
+
+    def find(self, document_id: str) -> str:
+        """
+        Find the file a document was stored from.
+
+        Args:
+            document_id (str): The id of the document.
+
+        Returns:
+            str: The path to the file, or None if no file recorded has that document id.
+        """
+        for file_path in list(self.entries):
+            if IngestManifest.document_id(file_path) == document_id:
+                return file_path
+        return None
+
+    def is_current(self, file_path: str, content_hash: str = None) -> bool:
+        """
+        Check whether a file has been ingested and is unchanged since.
+
+        Args:
+            file_path (str): The path to the file.
+            content_hash (str): The hash of the file's content, if it is held in memory rather
+                than on disk. Defaults to the hash of the file at file_path.
+
+        Returns:
+            bool: True if the manifest holds the file's current content hash.
+        """
+        entry = self.entries.get(file_path)
+        if entry is None:
+            return False
+        if content_hash is None:
+            if not os.path.isfile(file_path):
+                return False
+            content_hash = IngestManifest.hash_file(file_path)
+        return entry["hash"] == content_hash
+
+    def get_ids(self, file_path: str) -> list[str]:
+        """
+        Get the chunk ids recorded for a file.
+
+        Args:
+            file_path (str): The path to the file.
+
+        Returns:
+            list[str]: The chunk ids, or an empty list if the file is unknown.
+        """
+        entry = self.entries.get(file_path)
+        return list(entry["ids"]) if entry else []
+
+    def record(self, file_path: str, content_hash: str, ids: list[str]) -> None:
+        """
+        Record a file as ingested and write the manifest to disk.
+
+        Args:
+            file_path (str): The path to the file.
+            content_hash (str): The hash of the ingested content.
+            ids (list[str]): The ids of the chunks written for the file.
+
+        Returns:
+            None
+        """
+        self.entries[file_path] = {"hash": content_hash, "ids": ids}
+        self.save()
+
+    def remove(self, file_path: str) -> None:
+        """
+        Forget a file and write the manifest to disk.
+
+        Args:
+            file_path (str): The path to the file.
+
+        Returns:
+            None
+        """
+        if self.entries.pop(file_path, None) is not None:
+            self.save()
+
+    def is_detached(self, file_path: str) -> bool:
+        """
+        Check whether a file on disk is detached from its document.
+
+        Args:
+            file_path (str): The path to the file.
+
+        Returns:
+            bool: True if the file must not be added from disk on restart or when it changes.
+        """
+        return file_path in self.detached
+
+    def detach(self, file_path: str) -> None:
+        """
+        Mark a file on disk as detached from its document and write the manifest to disk.
+
+        Args:
+            file_path (str): The path to the file.
+
+        Returns:
+            None
+        """
+        if file_path not in self.detached:
+            self.detached.add(file_path)
+            self.save()
+
+    def attach(self, file_path: str) -> None:
+        """
+        Let a detached file be added from disk again and write the manifest to disk.
+
+        Args:
+            file_path (str): The path to the file.
+
+        Returns:
+            None
+        """
+        if file_path in self.detached:
+            self.detached.discard(file_path)
+            self.save()
+
+    def save(self) -> None:
+        """
+        Write the manifest to disk atomically, unless it is kept in memory only.
+
+        Returns:
+            None
+        """
+        if self.manifest_path is None:
+            return
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump({"entries": self.entries, "detached": sorted(self.detached)}, file)
+        os.replace(tmp_path, self.manifest_path)
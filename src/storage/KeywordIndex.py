@@ -0,0 +1,478 @@
+import json
+import os
+import re
+from collections import Counter
+from typing import Callable, NamedTuple
+import numpy as np
+from src.cfg.logging_config import *
+
+
+class KeywordSegment(NamedTuple):
+    """
+    An immutable batch of chunks in a KeywordIndex, with their postings grouped by term.
+
+    The postings of the term term_ids[i] are docs[offsets[i]:offsets[i + 1]], in increasing
+    order, with the number of times the term occurs in each of them in the same slice of
+    frequencies.
+
+    Attributes:
+        ids (np.ndarray): The chunk ids, as bytes.
+        lengths (np.ndarray): The int32 number of terms in each chunk.
+        term_ids (np.ndarray): The sorted int32 ids of the terms occurring in the segment.
+        offsets (np.ndarray): The int64 start of the postings of each term, followed by their end.
+        docs (np.ndarray): The int32 positions in the segment of the chunks in each posting.
+        frequencies (np.ndarray): The uint16 number of occurrences of the term in each posting.
+        deleted (np.ndarray): Whether each chunk was removed, the only part changed in place.
+        total_length (int): The number of terms in all chunks.
+        file_name (str): The file the segment is persisted to, or None.
+    """
+    ids: np.ndarray
+    lengths: np.ndarray
+    term_ids: np.ndarray
+    offsets: np.ndarray
+    docs: np.ndarray
+    frequencies: np.ndarray
+    deleted: np.ndarray
+    total_length: int
+    file_name: str = None
+
+
+class KeywordIndex:
+    """
+    A class representing an inverted index ranking chunks by BM25 keyword relevance.
+
+    Exact terms such as tickers, figures and form names are often missed by embedding
+    similarity, so this index complements a vector store. Chunks are added in batches, each
+    becoming an immutable segment of compact postings arrays; segments of similar size are
+    merged as they accumulate, so a query looks terms up in a logarithmic number of segments.
+    Searches read the tuple of segments in use without locking while a single writer adds
+    chunks and swaps in a new tuple.
+
+    Removed chunks are only flagged until their segment is merged or mostly removed. The
+    index does not know which epoch chunks are visible in; callers check the chunks returned.
+
+    When a directory is given, each segment is saved to its own file, the terms to an
+    append-only file, and the segments in use to an index file replaced atomically. Removals
+    are not saved, so the owner calls sync() on open to drop removed chunks and add any
+    chunks it stored after the index was last saved.
+
+    Attributes:
+        directory (str): The directory the index is persisted to, or None for in-memory.
+    """
+
+    INDEX_FILE_NAME = "index.json"
+    TERMS_FILE_NAME = "terms.txt"
+    SEGMENT_FILE_NAME = "segment-{}.npz"
+    # Words joined by hyphens or dots are kept together, so "8-K" and "3.5" stay one term
+    TOKEN_PATTERN = re.compile(r"\w+(?:[-.]\w+)*")
+    STOP_WORDS = frozenset("a an and are as at be but by can do does did for from had has have how i if in into is "
+                           "it its of on or our so than that the their there these this those to was we were what "
+                           "when where which who why will with you your".split())
+    # BM25 term frequency saturation and length normalization
+    K1 = 1.2
+    B = 0.75
+    # Query terms in more of the chunks have the longest postings but barely change the ranking,
+    # so once they occur in more than MIN_PRUNED_POSTINGS chunks, they are only added to the
+    # scores of the COMMON_TERM_CANDIDATES chunks ranked highest by the rarer terms of the query
+    MAX_DOCUMENT_FREQUENCY = 0.05
+    MIN_PRUNED_POSTINGS = 10_000
+    COMMON_TERM_CANDIDATES = 1000
+    # A segment is merged into the one before it once that one is at most this many times larger
+    MERGE_FACTOR = 2
+    PURGE_RATIO = 0.5
+    SYNC_BATCH_SIZE = 10_000
+
+    def __init__(self, directory: str = None):
+        """
+        Initialize a KeywordIndex object, loading the persisted segments if present.
+
+        Args:
+            directory (str): The directory to persist the index to. If None, the index is kept
+                in memory only.
+        """
+        self.directory = directory
+        self._segments = ()
+        self._term_ids = {}
+        self._terms = []
+        self._saved_terms = 0
+        self._next_segment = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self._load()
+
+    @staticmethod
+    def tokenize(text: str) -> list[str]:
+        """
+        Split a text into lowercase terms, leaving out stop words.
+
+        Args:
+            text (str): The text.
+
+        Returns:
+            list[str]: The terms, in order.
+        """
+        return [term for term in KeywordIndex.TOKEN_PATTERN.findall(text.lower())
+                if term not in KeywordIndex.STOP_WORDS]
+
+    def count(self) -> int:
+        """
+        Count the chunks in the index, excluding removed chunks.
+
+        Returns:
+            int: The number of chunks.
+        """
+        return sum(len(segment.ids) - int(np.count_nonzero(segment.deleted)) for segment in self._segments)
+
+    def add(self, ids: list[str], texts: list[str]) -> None:
+        """
+        Add chunks to the index as a new segment.
+
+        Args:
+            ids (list[str]): The chunk ids.
+            texts (list[str]): The chunk texts.
+
+        Returns:
+            None
+        """
+        if not ids:
+            return
+        segments = list(self._segments) + [self._build_segment(ids, texts)]
+        while len(segments) > 1 and KeywordIndex._live_count(segments[-2]) <= \
+                KeywordIndex.MERGE_FACTOR * KeywordIndex._live_count(segments[-1]):
+            segments[-2:] = [KeywordIndex._merge(segments[-2:])]
+        self._commit(tuple(segments))
+
+    def remove(self, ids: list[str]) -> None:
+        """
+        Remove chunks from the index, rewriting the segments left mostly removed.
+
+        Args:
+            ids (list[str]): The ids of the chunks to remove.
+
+        Returns:
+            None
+        """
+        if not ids:
+            return
+        removed_ids = np.array([chunk_id.encode() for chunk_id in ids])
+        segments = []
+        purged = False
+        for segment in self._segments:
+            segment.deleted[np.isin(segment.ids, removed_ids)] = True
+            if np.count_nonzero(segment.deleted) >= KeywordIndex.PURGE_RATIO * len(segment.ids):
+                segment = KeywordIndex._merge([segment])
+                purged = True
+            if len(segment.ids):
+                segments.append(segment)
+        if purged:
+            self._commit(tuple(segments))
+
+    def sync(self, live_ids: list[str], get_texts: Callable[[list[str]], list[str]]) -> None:
+        """
+        Bring the index in line with the chunks its owner stores, removing chunks no longer
+        stored and adding chunks stored since the index was last saved.
+
+        Args:
+            live_ids (list[str]): The ids of all chunks stored.
+            get_texts (Callable[[list[str]], list[str]]): A function returning the texts of chunks by id.
+
+        Returns:
+            None
+        """
+        live = np.array([chunk_id.encode() for chunk_id in live_ids], dtype=bytes)
+        indexed = []
+        stale_ids = []
+        for segment in self._segments:
+            stale = ~segment.deleted & ~np.isin(segment.ids, live)
+            stale_ids.extend(chunk_id.decode() for chunk_id in segment.ids[stale])
+            indexed.append(segment.ids[~segment.deleted & ~stale])
+        self.remove(stale_ids)
+
+        missing = live[~np.isin(live, np.concatenate(indexed))] if indexed else live
+        if len(missing):
+            logger.info("Indexing keywords of {} chunks stored since the keyword index was saved", len(missing))
+        for start in range(0, len(missing), KeywordIndex.SYNC_BATCH_SIZE):
+            ids = [chunk_id.decode() for chunk_id in missing[start:start + KeywordIndex.SYNC_BATCH_SIZE]]
+            self.add(ids, get_texts(ids))
+
+    def search(self, query: str, k: int, ids: list[str] = None) -> list[tuple[str, float]]:
+        """
+        Find the chunks most relevant to the terms of a query by BM25.
+
+        Args:
+            query (str): The query.
+            k (int): The maximum number of chunks returned.
+            ids (list[str]): The ids of the only chunks that may be returned, or None for all chunks.
+                Other chunks are dropped before the best candidates are taken, so the search
+                still returns k of these chunks when they match.
+
+        Returns:
+            list[tuple[str, float]]: The ids and scores of the most relevant chunks, most relevant first.
+        """
+        segments = self._segments
+        count = sum(len(segment.ids) for segment in segments)
+        term_ids = np.array(sorted({self._term_ids[term] for term in KeywordIndex.tokenize(query)
+                                    if term in self._term_ids}), dtype=np.int32)
+        if count == 0 or len(term_ids) == 0:
+            return []
+
+        # Locate the postings of each query term in each segment
+        postings = []
+        document_frequencies = np.zeros(len(term_ids), dtype=np.int64)
+        for segment in segments:
+            positions = np.minimum(np.searchsorted(segment.term_ids, term_ids), len(segment.term_ids) - 1)
+            found = segment.term_ids[positions] == term_ids if len(segment.term_ids) else np.zeros(len(term_ids), bool)
+            starts = np.where(found, segment.offsets[positions], 0)
+            stops = np.where(found, segment.offsets[positions + 1], 0)
+            document_frequencies += stops - starts
+            postings.append((starts, stops))
+        if not document_frequencies.any():
+            return []
+        idfs = np.log(1 + (count - document_frequencies + 0.5) / (document_frequencies + 0.5))
+        common = (document_frequencies > KeywordIndex.MAX_DOCUMENT_FREQUENCY * count) & \
+            (document_frequencies > KeywordIndex.MIN_PRUNED_POSTINGS)
+        rare = (document_frequencies > 0) & ~common
+        if not rare.any():
+            rare = document_frequencies == document_frequencies.min(where=document_frequencies > 0, initial=count)
+            common &= ~rare
+        average_length = sum(segment.total_length for segment in segments) / count
+        allowed = None if ids is None else np.array([chunk_id.encode() for chunk_id in ids])
+
+        hits = []
+        for segment, (starts, stops) in zip(segments, postings):
+            # Chunks with a rare term are candidates
+            docs, weights = [], []
+            for term in np.flatnonzero(rare & (stops > starts)):
+                docs.append(segment.docs[starts[term]:stops[term]])
+                weights.append(KeywordIndex._weights(segment, np.arange(starts[term], stops[term]), idfs[term],
+                                                     average_length))
+            if not docs:
+                continue
+            docs, weights = np.concatenate(docs), np.concatenate(weights)
+            if len(docs) * 8 > len(segment.ids):
+                scores = np.bincount(docs, weights=weights, minlength=len(segment.ids))
+                candidates = np.flatnonzero(scores)
+                scores = scores[candidates]
+            else:
+                candidates, inverse = np.unique(docs, return_inverse=True)
+                scores = np.bincount(inverse, weights=weights)
+            live = ~segment.deleted[candidates]
+            if allowed is not None:
+                live &= np.isin(segment.ids[candidates], allowed)
+            candidates, scores = candidates[live], scores[live]
+            common_terms = np.flatnonzero(common & (stops > starts))
+            if len(common_terms) and len(candidates) > KeywordIndex.COMMON_TERM_CANDIDATES:
+                top = np.sort(np.argpartition(-scores, KeywordIndex.COMMON_TERM_CANDIDATES - 1)[
+                              :KeywordIndex.COMMON_TERM_CANDIDATES])
+                candidates, scores = candidates[top], scores[top]
+            for term in common_terms:
+                term_docs = segment.docs[starts[term]:stops[term]]
+                positions = np.minimum(np.searchsorted(term_docs, candidates), len(term_docs) - 1)
+                matched = term_docs[positions] == candidates
+                scores[matched] += KeywordIndex._weights(segment, starts[term] + positions[matched], idfs[term],
+                                                         average_length)
+            if len(candidates) > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+                candidates, scores = candidates[top], scores[top]
+            hits.extend((float(score), segment.ids[doc]) for score, doc in zip(scores, candidates))
+        hits.sort(key=lambda hit: hit[0], reverse=True)
+        return [(chunk_id.decode(), score) for score, chunk_id in hits[:k]]
+
+    @staticmethod
+    def _weights(segment: KeywordSegment, postings: np.ndarray, idf: float, average_length: float) -> np.ndarray:
+        """
+        Compute the BM25 weights of postings of a term.
+
+        Args:
+            segment (KeywordSegment): The segment of the postings.
+            postings (np.ndarray): The positions of the postings in the segment.
+            idf (float): The inverse document frequency of the term.
+            average_length (float): The average number of terms in a chunk.
+
+        Returns:
+            np.ndarray: The weight of the term in the chunk of each posting.
+        """
+        frequencies = segment.frequencies[postings].astype(np.float32)
+        norms = KeywordIndex.K1 * (1 - KeywordIndex.B +
+                                   KeywordIndex.B * segment.lengths[segment.docs[postings]] / average_length)
+        return idf * frequencies * (KeywordIndex.K1 + 1) / (frequencies + norms)
+
+    @staticmethod
+    def _live_count(segment: KeywordSegment) -> int:
+        """
+        Count the chunks of a segment that were not removed.
+
+        Args:
+            segment (KeywordSegment): The segment.
+
+        Returns:
+            int: The number of chunks.
+        """
+        return len(segment.ids) - int(np.count_nonzero(segment.deleted))
+
+    def _build_segment(self, ids: list[str], texts: list[str]) -> KeywordSegment:
+        """
+        Build a segment from chunk texts, assigning ids to new terms.
+
+        Args:
+            ids (list[str]): The chunk ids.
+            texts (list[str]): The chunk texts.
+
+        Returns:
+            KeywordSegment: The segment.
+        """
+        term_ids, docs, frequencies, lengths = [], [], [], []
+        for doc, text in enumerate(texts):
+            counts = Counter(KeywordIndex.tokenize(text))
+            lengths.append(sum(counts.values()))
+            for term, frequency in counts.items():
+                term_id = self._term_ids.get(term)
+                if term_id is None:
+                    term_id = self._term_ids[term] = len(self._terms)
+                    self._terms.append(term)
+                term_ids.append(term_id)
+                frequencies.append(frequency)
+            docs.extend([doc] * len(counts))
+        return KeywordIndex._pack(np.array([chunk_id.encode() for chunk_id in ids]),
+                                  np.array(lengths, dtype=np.int32), np.array(term_ids, dtype=np.int32),
+                                  np.array(docs, dtype=np.int32),
+                                  np.minimum(frequencies, np.iinfo(np.uint16).max).astype(np.uint16))
+
+    @staticmethod
+    def _pack(ids: np.ndarray, lengths: np.ndarray, term_ids: np.ndarray, docs: np.ndarray,
+              frequencies: np.ndarray) -> KeywordSegment:
+        """
+        Group postings by term into a segment.
+
+        Args:
+            ids (np.ndarray): The chunk ids, as bytes.
+            lengths (np.ndarray): The number of terms in each chunk.
+            term_ids (np.ndarray): The term of each posting.
+            docs (np.ndarray): The chunk of each posting, in increasing order for each term.
+            frequencies (np.ndarray): The number of occurrences of the term in the chunk of each posting.
+
+        Returns:
+            KeywordSegment: The segment.
+        """
+        order = np.argsort(term_ids, kind="stable")
+        term_ids = term_ids[order]
+        unique_term_ids, starts = np.unique(term_ids, return_index=True)
+        return KeywordSegment(ids=ids, lengths=lengths, term_ids=unique_term_ids.astype(np.int32),
+                              offsets=np.append(starts, len(term_ids)).astype(np.int64), docs=docs[order],
+                              frequencies=frequencies[order], deleted=np.zeros(len(ids), dtype=bool),
+                              total_length=int(lengths.sum()))
+
+    @staticmethod
+    def _merge(segments: list[KeywordSegment]) -> KeywordSegment:
+        """
+        Merge segments into one, leaving out removed chunks.
+
+        Args:
+            segments (list[KeywordSegment]): The segments, in the order they were added.
+
+        Returns:
+            KeywordSegment: The merged segment.
+        """
+        ids, lengths, term_ids, docs, frequencies = [], [], [], [], []
+        base = 0
+        for segment in segments:
+            live = ~segment.deleted
+            positions = (np.cumsum(live) - 1 + base).astype(np.int32)
+            kept = live[segment.docs]
+            ids.append(segment.ids[live])
+            lengths.append(segment.lengths[live])
+            term_ids.append(np.repeat(segment.term_ids, np.diff(segment.offsets))[kept])
+            docs.append(positions[segment.docs[kept]])
+            frequencies.append(segment.frequencies[kept])
+            base += int(np.count_nonzero(live))
+        return KeywordIndex._pack(np.concatenate(ids), np.concatenate(lengths), np.concatenate(term_ids),
+                                  np.concatenate(docs), np.concatenate(frequencies))
+
+    def _save_segment(self, segment: KeywordSegment) -> KeywordSegment:
+        """
+        Save a new segment to its own file.
+
+        Args:
+            segment (KeywordSegment): The segment.
+
+        Returns:
+            KeywordSegment: The segment, with the name of its file.
+        """
+        file_name = KeywordIndex.SEGMENT_FILE_NAME.format(self._next_segment)
+        self._next_segment += 1
+        with open(os.path.join(self.directory, file_name), "wb") as file:
+            np.savez(file, ids=segment.ids, lengths=segment.lengths, term_ids=segment.term_ids,
+                     offsets=segment.offsets, docs=segment.docs, frequencies=segment.frequencies)
+        return segment._replace(file_name=file_name)
+
+    def _commit(self, segments: tuple) -> None:
+        """
+        Swap in the segments searched. For a persisted index, the new segments and terms are
+        saved and the index file replaced first, and the files of segments no longer in use
+        are deleted after.
+
+        Args:
+            segments (tuple): The segments.
+
+        Returns:
+            None
+        """
+        if self.directory is None:
+            self._segments = segments
+            return
+        segments = tuple(segment if segment.file_name else self._save_segment(segment) for segment in segments)
+        old_segments, self._segments = self._segments, segments
+        with open(os.path.join(self.directory, KeywordIndex.TERMS_FILE_NAME), "a", encoding="utf-8") as file:
+            file.writelines(term + "\n" for term in self._terms[self._saved_terms:])
+        self._saved_terms = len(self._terms)
+        index_path = os.path.join(self.directory, KeywordIndex.INDEX_FILE_NAME)
+        with open(index_path + ".tmp", "w") as file:
+            json.dump({"terms": self._saved_terms, "next_segment": self._next_segment,
+                       "segments": [segment.file_name for segment in segments]}, file)
+        os.replace(index_path + ".tmp", index_path)
+        in_use = {segment.file_name for segment in segments}
+        for segment in old_segments:
+            if segment.file_name not in in_use:
+                os.remove(os.path.join(self.directory, segment.file_name))
+
+    def _load(self) -> None:
+        """
+        Load the persisted segments and terms, deleting files a crash left behind.
+
+        Returns:
+            None
+        """
+        index_path = os.path.join(self.directory, KeywordIndex.INDEX_FILE_NAME)
+        terms_path = os.path.join(self.directory, KeywordIndex.TERMS_FILE_NAME)
+        index = {"terms": 0, "next_segment": 0, "segments": []}
+        if os.path.isfile(index_path):
+            with open(index_path, "r") as file:
+                index = json.load(file)
+
+        # Terms are appended before the index is replaced, so later ones were never committed
+        terms_size = 0
+        if os.path.isfile(terms_path):
+            with open(terms_path, "rb") as file:
+                for line in file:
+                    if len(self._terms) == index["terms"]:
+                        break
+                    self._terms.append(line[:-1].decode("utf-8"))
+                    terms_size += len(line)
+            os.truncate(terms_path, terms_size)
+        self._term_ids = {term: term_id for term_id, term in enumerate(self._terms)}
+        self._saved_terms = len(self._terms)
+        self._next_segment = index["next_segment"]
+
+        segments = []
+        for file_name in index["segments"]:
+            with np.load(os.path.join(self.directory, file_name)) as arrays:
+                segments.append(KeywordSegment(ids=arrays["ids"], lengths=arrays["lengths"],
+                                               term_ids=arrays["term_ids"], offsets=arrays["offsets"],
+                                               docs=arrays["docs"], frequencies=arrays["frequencies"],
+                                               deleted=np.zeros(len(arrays["ids"]), dtype=bool),
+                                               total_length=int(arrays["lengths"].sum()), file_name=file_name))
+        self._segments = tuple(segments)
+        for file_name in os.listdir(self.directory):
+            if file_name.startswith("segment-") and file_name not in index["segments"]:
+                os.remove(os.path.join(self.directory, file_name))
+        logger.info("Loaded keyword index with {} chunks in {} segments", self.count(), len(segments))
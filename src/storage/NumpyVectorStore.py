@@ -0,0 +1,839 @@
+import json
+import os
+from enum import Enum
+from typing import NamedTuple
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from src.chunkers.TokenChunker import TokenChunker
+from src.embeddings.BatchEmbedder import BatchEmbedder
+from src.inputs.InputFile import InputFile
+from src.storage.HybridRetriever import HybridRetriever
+from src.storage.IngestManifest import IngestManifest
+from src.storage.KeywordIndex import KeywordIndex
+from src.storage.SnapshotRetriever import SnapshotRetriever
+from src.storage.TitleIndex import ChunkFilter
+from src.storage.VectorStore import VectorStore, VectorStoreOptions
+from src.cfg.logging_config import *
+
+
+class NumpyRows(NamedTuple):
+    """
+    The rows of a NumpyVectorStore, replaced as a whole whenever rows are added or compacted.
+
+    The arrays may have more rows than count; rows past count are not yet written.
+
+    Attributes:
+        vectors (np.ndarray): The unit-length float32 embeddings, one row per chunk.
+        epochs (np.ndarray): The int64 write and retirement epochs, one row per chunk.
+        ids (list[str]): The chunk ids.
+        texts (list[str]): The chunk texts.
+        metadatas (list[dict]): The chunk metadata.
+        count (int): The number of rows.
+        codes (np.ndarray): The int8 codes of the embeddings, or None without quantization.
+        scales (np.ndarray): The float32 scale of each row of codes, or None without quantization.
+    """
+    vectors: np.ndarray
+    epochs: np.ndarray
+    ids: list
+    texts: list
+    metadatas: list
+    count: int
+    codes: np.ndarray = None
+    scales: np.ndarray = None
+
+
+class QuantizationOptions(Enum):
+    """
+    An enumeration representing options for compressing the embeddings searched.
+
+    Attributes:
+        NONE (str): Represents searching the full float32 embeddings.
+        INT8 (str): Represents searching int8 codes with a scale per row, a quarter of the size,
+            and rescoring the best candidates against the full embeddings.
+    """
+    NONE = "none"
+    INT8 = "int8"
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    A class representing an in-process vector store backed by a NumPy matrix.
+
+    Chunk embeddings are kept normalized in one contiguous float32 matrix, so the chunks most
+    similar to a query are found with a single matrix-vector product and an argpartition,
+    without a network hop or an index to maintain. Superseded chunks stay in the matrix,
+    hidden, until a compaction rewrites it once half of its rows are reclaimed.
+
+    When a persist directory is given, the matrix and the write and retirement epochs are
+    stored as raw binary files that are memory-mapped on load, so reopening the store copies
+    nothing into memory, and the chunk texts and metadata are stored as JSON lines. Files
+    written by a compaction carry a new generation number, which is committed by atomically
+    replacing the index file. The IngestManifest is persisted too, so files already embedded are
+    not embedded again.
+    With hybrid search, the chunks are also added to a KeywordIndex persisted to a subdirectory.
+    Filtered searches score only the rows of the chunks the TitleIndex finds for the filter.
+
+    With int8 quantization, each row is also kept as int8 codes with a float32 scale, and searches
+    score the codes, then rescore the best rescore_candidates rows against their full vectors.
+    The full vectors of a persisted store then stay on disk except for the rows rescored, so
+    the memory searched shrinks fourfold, at a recall cost measured by benchmark/benchmark-ann.py.
+
+    Attributes:
+        batch_embedder (BatchEmbedder): The embedder used to embed new chunks in concurrent batches.
+        persist_directory (str): The directory the store is persisted to, or None for in-memory.
+        dimension (int): The dimension of the embeddings, or None before the first chunk is added.
+        generation (int): The number of the persisted files in use.
+        quantization (QuantizationOptions): How the embeddings searched are compressed.
+        rescore_candidates (int): The number of rows rescored against their full vectors with quantization.
+    """
+
+    INDEX_FILE_NAME = "index.json"
+    MANIFEST_FILE_NAME = "manifest.json"
+    VECTORS_FILE_NAME = "vectors-{}.f32"
+    EPOCHS_FILE_NAME = "epochs-{}.i64"
+    CHUNKS_FILE_NAME = "chunks-{}.jsonl"
+    CODES_FILE_NAME = "codes-{}.i8"
+    SCALES_FILE_NAME = "scales-{}.f32"
+    KEYWORD_INDEX_DIRECTORY_NAME = "keywords"
+    # Codes are converted to float32 for scoring a block of rows at a time
+    SCAN_BLOCK_ROWS = 4096
+    # Reclaimed rows are retired at epoch 0, which hides them from every snapshot
+    RECLAIMED = 0
+    COMPACTION_RATIO = 0.5
+
+    def __init__(self, embeddings: Embeddings, persist_directory: str = None, embedding_batch_size: int = 256,
+                 embedding_batch_tokens: int = 64_000, embedding_concurrency: int = 4, chunk_tokens: int = 512,
+                 chunk_overlap_tokens: int = 64, quantization: QuantizationOptions = QuantizationOptions.NONE,
+                 rescore_candidates: int = 32, hybrid_search: bool = True):
+        """
+        Initialize a NumpyVectorStore object.
+
+        Args:
+            embeddings (Embeddings): The embeddings used by the vector store.
+            persist_directory (str): The directory to persist the store to. If None, the store is
+                kept in memory only.
+            embedding_batch_size (int): The maximum number of chunks embedded in one request.
+            embedding_batch_tokens (int): The maximum estimated number of tokens embedded in one request.
+            embedding_concurrency (int): The maximum number of embedding requests in flight.
+            chunk_tokens (int): The maximum number of tokens in a stored chunk.
+            chunk_overlap_tokens (int): The number of tokens shared by consecutive chunks of a page.
+            quantization (QuantizationOptions): How the embeddings searched are compressed, or its value.
+            rescore_candidates (int): The number of rows rescored against their full vectors with quantization.
+            hybrid_search (bool): Whether chunks are also indexed by keywords, so retrievers fuse
+                keyword and similarity rankings.
+        """
+        super().__init__(vector_store_type=VectorStoreOptions.NUMPY, embeddings=embeddings,
+                         chunker=TokenChunker(chunk_tokens, chunk_overlap_tokens))
+        self.batch_embedder = BatchEmbedder(embeddings, max_batch_size=embedding_batch_size,
+                                            max_batch_tokens=embedding_batch_tokens,
+                                            max_concurrency=embedding_concurrency)
+        self.persist_directory = persist_directory
+        self.dimension = None
+        self.generation = 0
+        self.quantization = QuantizationOptions(quantization)
+        self.rescore_candidates = rescore_candidates
+        self._rows = NumpyRows(np.empty((0, 0), dtype=np.float32), np.empty((0, 2), dtype=np.int64), [], [], [], 0)
+        self._row_of_id = {}
+        self._reclaimed = 0
+        if persist_directory is not None:
+            os.makedirs(persist_directory, exist_ok=True)
+            self.manifest = IngestManifest(os.path.join(persist_directory, NumpyVectorStore.MANIFEST_FILE_NAME))
+            self._load()
+            logger.info("Opened persistent NumPy Vector Store with {} chunks in {}", self._rows.count,
+                        persist_directory)
+        if hybrid_search:
+            self.keyword_index = KeywordIndex(None if persist_directory is None else os.path.join(
+                persist_directory, NumpyVectorStore.KEYWORD_INDEX_DIRECTORY_NAME))
+            if persist_directory is not None:
+                self.keyword_index.sync(list(self._row_of_id), lambda ids: [
+                    self._rows.texts[self._row_of_id[chunk_id]] for chunk_id in ids])
+
+    def add_document(self, input_file: InputFile) -> None:
+        """
+        Add a document to the NumPy vector store.
+
+        Args:
+            input_file (InputFile): InputFile containing the document to be added.
+
+        Returns:
+            None
+        """
+        self.add_documents([input_file])
+
+    def add_documents(self, input_files: list[InputFile]) -> None:
+        """
+        Add a batch of documents to the NumPy vector store.
+
+        The pages of all documents are embedded together by the BatchEmbedder and appended to
+        the matrix at once, except for chunks of changed files that are already stored. The new
+        chunks are published once they are all written, so a retriever never sees part of a
+        batch, unless defer_reclaim is set and the caller publishes them.
+
+        Args:
+            input_files (list[InputFile]): InputFiles containing the documents to be added.
+
+        Returns:
+            None
+        """
+        docs_per_file = [(input_file, self.build_documents(input_file)) for input_file in input_files]
+        docs = [doc for _, file_docs in docs_per_file for doc in file_docs]
+        ids, write_positions, retired_ids = self.assign_ids(docs_per_file)
+
+        if write_positions:
+            new_ids = [ids[position] for position in write_positions]
+            texts = [docs[position].page_content for position in write_positions]
+            vectors = np.asarray(self.batch_embedder.embed_documents(texts), dtype=np.float32)
+            self._append(new_ids, texts, [dict(docs[position].metadata) for position in write_positions],
+                         NumpyVectorStore.normalize(vectors), self.write_epoch)
+            if self.keyword_index is not None:
+                self.keyword_index.add(new_ids, texts)
+
+        self.record_documents(input_files, retired_ids)
+        for input_file in input_files:
+            logger.info("Successfully added {} to NumPy Vector Store", input_file.name)
+        logger.info("Wrote {} of {} chunks to NumPy Vector Store", len(write_positions), len(ids))
+
+        if not self.defer_reclaim:
+            self.publish()
+        self._flush()
+
+    def reclaim(self, ids: list[str]) -> None:
+        """
+        Hide superseded chunks from every retriever, compacting the matrix once enough rows are reclaimed.
+
+        Args:
+            ids (list[str]): The ids of the chunks to reclaim.
+
+        Returns:
+            None
+        """
+        ids = [chunk_id for chunk_id in ids if chunk_id in self._row_of_id]
+        rows = [self._row_of_id.pop(chunk_id) for chunk_id in ids]
+        if not rows:
+            return
+        self._rows.epochs[rows, 1] = NumpyVectorStore.RECLAIMED
+        self._reclaimed += len(rows)
+        self.title_index.remove(ids, [self._rows.metadatas[row] for row in rows])
+        if self.keyword_index is not None:
+            self.keyword_index.remove(ids)
+        logger.info("Removed {} superseded chunks from NumPy Vector Store", len(rows))
+        if self._reclaimed >= NumpyVectorStore.COMPACTION_RATIO * self._rows.count:
+            self._compact()
+        else:
+            self._flush()
+
+    def retire(self, ids: list[str], epoch: int) -> None:
+        """
+        Set the retirement epoch of chunks.
+
+        Args:
+            ids (list[str]): The ids of the chunks.
+            epoch (int): The epoch the chunks are retired in.
+
+        Returns:
+            None
+        """
+        rows = [self._row_of_id[chunk_id] for chunk_id in ids if chunk_id in self._row_of_id]
+        self._rows.epochs[rows, 1] = epoch
+
+    def search(self, query: str, k: int, epoch: int, chunk_filter: ChunkFilter = None) -> list[Document]:
+        """
+        Find the chunks most similar to a query among those visible at an epoch.
+
+        Args:
+            query (str): The query.
+            k (int): The maximum number of chunks returned.
+            epoch (int): The published epoch whose chunks are searched.
+            chunk_filter (ChunkFilter): The filter restricting the chunks searched, or None.
+
+        Returns:
+            list[Document]: The most similar chunks, most similar first.
+        """
+        rows = self._rows
+        if rows.count == 0:
+            return []
+        query_vector = NumpyVectorStore.normalize(np.asarray(self.embeddings.embed_query(query), dtype=np.float32))
+        return self.search_vectors(rows, query_vector[np.newaxis], k, epoch, chunk_filter)[0]
+
+    def search_many(self, queries: list[str], k: int, epoch: int,
+                    chunk_filter: ChunkFilter = None) -> list[list[Document]]:
+        """
+        Find the chunks most similar to each of several queries among those visible at an epoch.
+
+        The queries are embedded in one batch and scored against the stored chunks as one
+        matrix product.
+
+        Args:
+            queries (list[str]): The queries.
+            k (int): The maximum number of chunks returned per query.
+            epoch (int): The published epoch whose chunks are searched.
+            chunk_filter (ChunkFilter): The filter restricting the chunks searched, or None.
+
+        Returns:
+            list[list[Document]]: The most similar chunks of each query, most similar first.
+        """
+        rows = self._rows
+        if rows.count == 0 or not queries:
+            return [[] for _ in queries]
+        query_vectors = NumpyVectorStore.normalize(np.asarray(self.embeddings.embed_documents(queries),
+                                                              dtype=np.float32))
+        return self.search_vectors(rows, query_vectors, k, epoch, chunk_filter)
+
+    def search_vectors(self, rows: NumpyRows, query_vectors: np.ndarray, k: int, epoch: int,
+                       chunk_filter: ChunkFilter = None) -> list[list[Document]]:
+        """
+        Find the chunks most similar to each of several query vectors among those visible at an epoch.
+
+        Args:
+            rows (NumpyRows): The rows searched.
+            query_vectors (np.ndarray): The normalized query embeddings, one per row.
+            k (int): The maximum number of chunks returned per query.
+            epoch (int): The published epoch whose chunks are searched.
+            chunk_filter (ChunkFilter): The filter restricting the chunks searched, or None.
+
+        Returns:
+            list[list[Document]]: The most similar chunks of each query, most similar first.
+        """
+        if chunk_filter is not None:
+            return self.build_results_many(rows, self.filtered_search(rows, query_vectors, k, epoch, chunk_filter))
+        return self.build_results_many(rows, self.scan_search(rows, query_vectors, k, epoch))
+
+    def filtered_search(self, rows: NumpyRows, query_vectors: np.ndarray, k: int, epoch: int,
+                        chunk_filter: ChunkFilter) -> list[np.ndarray]:
+        """
+        Find the rows most similar to each query vector among those visible at an epoch and
+        passing a filter, by scoring only the rows the title index finds for the filter.
+
+        Args:
+            rows (NumpyRows): The rows searched.
+            query_vectors (np.ndarray): The normalized query embeddings, one per row.
+            k (int): The maximum number of rows returned per query.
+            epoch (int): The published epoch whose rows are searched.
+            chunk_filter (ChunkFilter): The filter restricting the rows searched.
+
+        Returns:
+            list[np.ndarray]: The indices of the most similar rows of each query, most similar first.
+        """
+        row_of_id = self._row_of_id
+        candidates = []
+        for chunk_id in self.title_index.lookup(chunk_filter):
+            row = row_of_id.get(chunk_id)
+            # A compaction may have renumbered the rows since they were read
+            if row is not None and row < rows.count and rows.ids[row] == chunk_id:
+                candidates.append(row)
+        candidates = np.sort(np.array(candidates, dtype=np.int64))
+        epochs = rows.epochs[candidates]
+        candidates = candidates[(epochs[:, 0] <= epoch) & (epochs[:, 1] > epoch)]
+        k = min(k, len(candidates))
+        if k == 0:
+            return [np.empty(0, dtype=np.int64) for _ in query_vectors]
+        scores = NumpyVectorStore.read_vectors(rows, candidates) @ query_vectors.T
+        return [candidates[NumpyVectorStore.top_rows(scores[:, query], k)] for query in range(len(query_vectors))]
+
+    def scan_search(self, rows: NumpyRows, query_vectors: np.ndarray, k: int, epoch: int) -> list[np.ndarray]:
+        """
+        Find the rows most similar to each query vector among those visible at an epoch, by
+        scoring every row.
+
+        All queries are scored in one pass over the rows, and with quantization the full
+        vectors of the candidates of every query are read from disk once.
+
+        Args:
+            rows (NumpyRows): The rows searched.
+            query_vectors (np.ndarray): The normalized query embeddings, one per row.
+            k (int): The maximum number of rows returned per query.
+            epoch (int): The published epoch whose rows are searched.
+
+        Returns:
+            list[np.ndarray]: The indices of the most similar rows of each query, most similar first.
+        """
+        epochs = rows.epochs[:rows.count]
+        visible = (epochs[:, 0] <= epoch) & (epochs[:, 1] > epoch)
+        visible_count = int(np.count_nonzero(visible))
+        k = min(k, visible_count)
+        if k == 0:
+            return [np.empty(0, dtype=np.int64) for _ in query_vectors]
+        if rows.codes is None:
+            scores = rows.vectors[:rows.count] @ query_vectors.T
+            scores[~visible] = -np.inf
+            return [NumpyVectorStore.top_rows(scores[:, query], k) for query in range(len(query_vectors))]
+
+        scores = np.empty((rows.count, len(query_vectors)), dtype=np.float32)
+        for start in range(0, rows.count, NumpyVectorStore.SCAN_BLOCK_ROWS):
+            stop = min(start + NumpyVectorStore.SCAN_BLOCK_ROWS, rows.count)
+            scores[start:stop] = rows.codes[start:stop].astype(np.float32) @ query_vectors.T
+        scores *= rows.scales[:rows.count, np.newaxis]
+        scores[~visible] = -np.inf
+        rescored = min(max(k, self.rescore_candidates), visible_count)
+        candidates = [NumpyVectorStore.top_rows(scores[:, query], rescored) for query in range(len(query_vectors))]
+        # Rows are rescored in file order, so the full vectors are read from disk sequentially
+        union = np.unique(np.concatenate(candidates))
+        exact_scores = NumpyVectorStore.read_vectors(rows, union) @ query_vectors.T
+        results = []
+        for query, query_candidates in enumerate(candidates):
+            positions = np.searchsorted(union, query_candidates)
+            results.append(query_candidates[NumpyVectorStore.top_rows(exact_scores[positions, query], k)])
+        return results
+
+    @staticmethod
+    def read_vectors(rows: NumpyRows, row_indices: np.ndarray) -> np.ndarray:
+        """
+        Read the full vectors of some rows.
+
+        Persisted rows are read from the vectors file rather than through its memory map, since
+        the kernel maps the pages around each one touched, which would soon bring the whole
+        matrix into memory.
+
+        Args:
+            rows (NumpyRows): The rows searched.
+            row_indices (np.ndarray): The indices of the rows read.
+
+        Returns:
+            np.ndarray: The vectors of the rows.
+        """
+        if not isinstance(rows.vectors, np.memmap) or not hasattr(os, "pread"):
+            return rows.vectors[row_indices]
+        row_size = rows.vectors.shape[1] * rows.vectors.itemsize
+        try:
+            with open(rows.vectors.filename, "rb", buffering=0) as file:
+                data = b"".join(os.pread(file.fileno(), row_size, int(row) * row_size) for row in row_indices)
+        except FileNotFoundError:
+            # A compaction removed the file after the rows were read, but its memory map is still valid
+            return rows.vectors[row_indices]
+        return np.frombuffer(data, dtype=np.float32).reshape(len(row_indices), rows.vectors.shape[1])
+
+    @staticmethod
+    def top_rows(scores: np.ndarray, k: int) -> np.ndarray:
+        """
+        Find the k highest scores.
+
+        Args:
+            scores (np.ndarray): The scores.
+            k (int): The number of scores returned, at most the number of scores.
+
+        Returns:
+            np.ndarray: The indices of the k highest scores, highest first.
+        """
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+
+    @staticmethod
+    def build_results(rows: NumpyRows, row_indices) -> list[Document]:
+        """
+        Build the Documents of search results.
+
+        Args:
+            rows (NumpyRows): The rows searched.
+            row_indices (Iterable[int]): The indices of the result rows, in result order.
+
+        Returns:
+            list[Document]: One Document per result row.
+        """
+        return [Document(page_content=rows.texts[row], metadata=dict(rows.metadatas[row])) for row in row_indices]
+
+    @staticmethod
+    def build_results_many(rows: NumpyRows, row_indices_per_query: list) -> list[list[Document]]:
+        """
+        Build the Documents of the search results of several queries.
+
+        A row found by several queries is built once and its Document shared by their results.
+
+        Args:
+            rows (NumpyRows): The rows searched.
+            row_indices_per_query (list[Iterable[int]]): The indices of the result rows of each
+                query, in result order.
+
+        Returns:
+            list[list[Document]]: The Documents of the result rows of each query.
+        """
+        docs = {}
+        for row_indices in row_indices_per_query:
+            for row in row_indices:
+                if row not in docs:
+                    docs[row] = Document(page_content=rows.texts[row], metadata=dict(rows.metadatas[row]))
+        return [[docs[row] for row in row_indices] for row_indices in row_indices_per_query]
+
+    def count(self) -> int:
+        """
+        Count the stored chunks, including superseded chunks not yet reclaimed.
+
+        Returns:
+            int: The number of chunks.
+        """
+        return self._rows.count - self._reclaimed
+
+    def is_document_current(self, file_path: str, content_hash: str = None) -> bool:
+        """
+        Check whether a file is already persisted and unchanged since it was added.
+
+        Args:
+            file_path (str): The path to the file.
+            content_hash (str): The hash of the file's content, if it is held in memory rather than on disk.
+
+        Returns:
+            bool: True if the manifest holds the file's current content hash.
+        """
+        return self.persist_directory is not None and self.manifest.is_current(file_path, content_hash)
+
+    def delete_document(self, document_id: str) -> bool:
+        """
+        Delete a document stored from a file, retiring all of its chunks.
+
+        Args:
+            document_id (str): The id of the document.
+
+        Returns:
+            bool: True if the document was found and deleted.
+        """
+        deleted = super().delete_document(document_id)
+        self._flush()
+        return deleted
+
+    def stored_ids(self, ids: list[str]) -> set[str]:
+        """
+        Find which chunks are stored, whether visible, retired or not yet reclaimed.
+
+        Args:
+            ids (list[str]): The chunk ids.
+
+        Returns:
+            set[str]: The ids of the stored chunks.
+        """
+        row_of_id = self._row_of_id
+        return {chunk_id for chunk_id in ids if chunk_id in row_of_id}
+
+    def get_chunks(self, ids: list[str], epoch: int) -> dict[str, Document]:
+        """
+        Get chunks by id, leaving out those not visible at an epoch.
+
+        Args:
+            ids (list[str]): The chunk ids.
+            epoch (int): The published epoch whose chunks are returned.
+
+        Returns:
+            dict[str, Document]: The visible chunks, keyed by id.
+        """
+        rows, row_of_id = self._rows, self._row_of_id
+        visible = []
+        for chunk_id in ids:
+            row = row_of_id.get(chunk_id)
+            # A compaction may have renumbered the rows since they were read
+            if row is not None and row < rows.count and rows.ids[row] == chunk_id and \
+                    rows.epochs[row, 0] <= epoch < rows.epochs[row, 1]:
+                visible.append(row)
+        return dict(zip((rows.ids[row] for row in visible), self.build_results(rows, visible)))
+
+    def as_retriever(self) -> BaseRetriever:
+        """
+        Convert the NumPy vector store to a retriever over the chunks published so far.
+
+        Returns:
+            BaseRetriever: A HybridRetriever with hybrid search, or else a SnapshotRetriever.
+        """
+        if self.keyword_index is not None:
+            return HybridRetriever(vector_store=self, epoch=self.published_epoch)
+        return SnapshotRetriever(vector_store=self, epoch=self.published_epoch)
+
+    @staticmethod
+    def normalize(vectors: np.ndarray) -> np.ndarray:
+        """
+        Scale vectors to unit length, so their dot products are cosine similarities.
+
+        Args:
+            vectors (np.ndarray): A vector or a matrix with one vector per row.
+
+        Returns:
+            np.ndarray: The normalized vectors. Zero vectors are left unchanged.
+        """
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1).astype(np.float32)
+
+    @staticmethod
+    def quantize(vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Quantize vectors to int8 codes, scaling each vector so its largest component maps to 127.
+
+        Args:
+            vectors (np.ndarray): A matrix with one vector per row.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The int8 codes and the float32 scale of each row, such
+                that a row is approximately its codes times its scale.
+        """
+        scales = (np.abs(vectors).max(axis=1) / 127).astype(np.float32)
+        codes = np.round(vectors / np.where(scales > 0, scales, 1)[:, None]).astype(np.int8)
+        return codes, scales
+
+    def _path(self, file_name: str, generation: int = None) -> str:
+        """
+        Get the path to a persisted file.
+
+        Args:
+            file_name (str): The file name, with a placeholder for the generation if it has one.
+            generation (int): The generation of the file. Defaults to the generation in use.
+
+        Returns:
+            str: The path to the file.
+        """
+        return os.path.join(self.persist_directory,
+                            file_name.format(self.generation if generation is None else generation))
+
+    def _columns(self) -> list[tuple]:
+        """
+        Get the arrays kept per row, each persisted to its own file.
+
+        Returns:
+            list[tuple]: The field of NumpyRows, file name, dtype and row shape of each array.
+        """
+        columns = [("vectors", NumpyVectorStore.VECTORS_FILE_NAME, np.float32, (self.dimension,)),
+                   ("epochs", NumpyVectorStore.EPOCHS_FILE_NAME, np.int64, (2,))]
+        if self.quantization == QuantizationOptions.INT8:
+            columns += [("codes", NumpyVectorStore.CODES_FILE_NAME, np.int8, (self.dimension,)),
+                        ("scales", NumpyVectorStore.SCALES_FILE_NAME, np.float32, ())]
+        return columns
+
+    def _load(self) -> None:
+        """
+        Memory-map the persisted rows, dropping any rows a crash left partly written, and resume
+        the epochs after the newest one they hold.
+
+        Rows retired but not reclaimed before the store was closed are reclaimed, since no
+        snapshot of a previous process can still read them.
+
+        Returns:
+            None
+        """
+        if not os.path.isfile(self._path(NumpyVectorStore.INDEX_FILE_NAME)):
+            return
+        with open(self._path(NumpyVectorStore.INDEX_FILE_NAME), "r") as file:
+            index = json.load(file)
+        self.dimension = index["dimension"]
+        self.generation = index["generation"]
+        for file_name in [column[1] for column in self._columns()] + [NumpyVectorStore.CHUNKS_FILE_NAME]:
+            open(self._path(file_name), "ab").close()
+
+        ids, texts, metadatas = [], [], []
+        chunks_size = 0
+        with open(self._path(NumpyVectorStore.CHUNKS_FILE_NAME), "rb") as file:
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break
+                chunk = json.loads(line)
+                ids.append(chunk["id"])
+                texts.append(chunk["text"])
+                metadatas.append(chunk["metadata"])
+                chunks_size += len(line)
+
+        # The arrays are written before the chunk lines, so they hold at least as many rows,
+        # except for codes of rows added while quantization was off
+        count = len(ids)
+        os.truncate(self._path(NumpyVectorStore.CHUNKS_FILE_NAME), chunks_size)
+        quantized_count = count
+        for name, file_name, dtype, shape in self._columns():
+            row_size = np.dtype(dtype).itemsize * int(np.prod(shape))
+            file_rows = min(count, os.path.getsize(self._path(file_name)) // row_size)
+            os.truncate(self._path(file_name), file_rows * row_size)
+            if name in ("codes", "scales"):
+                quantized_count = min(quantized_count, file_rows)
+        if quantized_count < count:
+            self._quantize_rows(quantized_count, count)
+        self._rows = self._map_rows(ids, texts, metadatas)
+        epochs = np.asarray(self._rows.epochs)
+        self.resume_epoch(int(epochs[epochs != VectorStore.NEVER_RETIRED].max(initial=0)))
+        retired = np.flatnonzero((epochs[:, 1] != VectorStore.NEVER_RETIRED) &
+                                 (epochs[:, 1] != NumpyVectorStore.RECLAIMED))
+        if len(retired):
+            logger.info("Removing {} chunks superseded before NumPy Vector Store was closed", len(retired))
+            self._rows.epochs[retired, 1] = NumpyVectorStore.RECLAIMED
+            self._flush()
+        self._row_of_id = {chunk_id: row for row, chunk_id in enumerate(ids)
+                           if self._rows.epochs[row, 1] != NumpyVectorStore.RECLAIMED}
+        self._reclaimed = count - len(self._row_of_id)
+        self.title_index.add(list(self._row_of_id), [metadatas[row] for row in self._row_of_id.values()])
+
+    def _quantize_rows(self, start: int, stop: int) -> None:
+        """
+        Write the int8 codes of persisted rows that have none, e.g. because quantization was turned on.
+
+        Args:
+            start (int): The index of the first row without codes.
+            stop (int): The number of rows.
+
+        Returns:
+            None
+        """
+        logger.info("Quantizing {} rows of NumPy Vector Store", stop - start)
+        for file_name, row_size in ((NumpyVectorStore.CODES_FILE_NAME, self.dimension),
+                                    (NumpyVectorStore.SCALES_FILE_NAME, 4)):
+            os.truncate(self._path(file_name), start * row_size)
+        vectors = np.memmap(self._path(NumpyVectorStore.VECTORS_FILE_NAME), dtype=np.float32, mode="r",
+                            shape=(stop, self.dimension))
+        with open(self._path(NumpyVectorStore.CODES_FILE_NAME), "ab") as codes_file, \
+                open(self._path(NumpyVectorStore.SCALES_FILE_NAME), "ab") as scales_file:
+            for block_start in range(start, stop, NumpyVectorStore.SCAN_BLOCK_ROWS):
+                codes, scales = NumpyVectorStore.quantize(
+                    np.asarray(vectors[block_start:min(block_start + NumpyVectorStore.SCAN_BLOCK_ROWS, stop)]))
+                codes_file.write(codes.tobytes())
+                scales_file.write(scales.tobytes())
+
+    def _map_rows(self, ids: list[str], texts: list[str], metadatas: list[dict]) -> NumpyRows:
+        """
+        Memory-map the persisted arrays of the generation in use.
+
+        Args:
+            ids (list[str]): The chunk ids.
+            texts (list[str]): The chunk texts.
+            metadatas (list[dict]): The chunk metadata.
+
+        Returns:
+            NumpyRows: The rows, backed by the persisted files.
+        """
+        count = len(ids)
+        arrays = {}
+        for name, file_name, dtype, shape in self._columns():
+            if count == 0:
+                arrays[name] = np.empty((0,) + shape, dtype=dtype)
+            else:
+                # Only epochs change in place, when chunks are retired or reclaimed
+                arrays[name] = np.memmap(self._path(file_name), dtype=dtype, mode="r+" if name == "epochs" else "r",
+                                         shape=(count,) + shape)
+        return NumpyRows(ids=ids, texts=texts, metadatas=metadatas, count=count, **arrays)
+
+    def _append(self, ids: list[str], texts: list[str], metadatas: list[dict], vectors: np.ndarray,
+                epoch: int) -> None:
+        """
+        Append rows to the store.
+
+        Rows are written past the count of the current NumpyRows before a new NumpyRows is swapped
+        in, so searches in progress are never affected.
+
+        Args:
+            ids (list[str]): The chunk ids.
+            texts (list[str]): The chunk texts.
+            metadatas (list[dict]): The chunk metadata.
+            vectors (np.ndarray): The normalized embeddings of the chunks.
+            epoch (int): The epoch the chunks are written in.
+
+        Returns:
+            None
+        """
+        if self.dimension is None:
+            self.dimension = vectors.shape[1]
+        rows = self._rows
+        count = rows.count + len(ids)
+        new_arrays = {"vectors": vectors, "epochs": np.empty((len(ids), 2), dtype=np.int64)}
+        new_arrays["epochs"][:, 0] = epoch
+        new_arrays["epochs"][:, 1] = VectorStore.NEVER_RETIRED
+        if self.quantization == QuantizationOptions.INT8:
+            new_arrays["codes"], new_arrays["scales"] = NumpyVectorStore.quantize(vectors)
+        rows.ids.extend(ids)
+        rows.texts.extend(texts)
+        rows.metadatas.extend(metadatas)
+
+        if self.persist_directory is None:
+            capacity = len(rows.vectors)
+            if count > capacity:
+                capacity = max(count, 2 * capacity, 1024)
+            arrays = {}
+            for name, _, dtype, shape in self._columns():
+                array = getattr(rows, name)
+                if array is None or len(array) < capacity:
+                    grown = np.empty((capacity,) + shape, dtype=dtype)
+                    if rows.count:
+                        grown[:rows.count] = array[:rows.count]
+                    array = grown
+                array[rows.count:count] = new_arrays[name]
+                arrays[name] = array
+            self._rows = NumpyRows(ids=rows.ids, texts=rows.texts, metadatas=rows.metadatas, count=count, **arrays)
+        else:
+            if rows.count == 0:
+                self._write_index(self.generation)
+            for name, file_name, _, _ in self._columns():
+                with open(self._path(file_name), "ab") as file:
+                    file.write(new_arrays[name].tobytes())
+            self._write_chunks(self._path(NumpyVectorStore.CHUNKS_FILE_NAME), ids, texts, metadatas, "a")
+            self._rows = self._map_rows(rows.ids, rows.texts, rows.metadatas)
+
+        for position, chunk_id in enumerate(ids):
+            self._row_of_id[chunk_id] = rows.count + position
+        self.title_index.add(ids, metadatas)
+
+    def _compact(self) -> None:
+        """
+        Rewrite the rows without the reclaimed ones.
+
+        Returns:
+            None
+        """
+        rows = self._rows
+        keep = np.flatnonzero(rows.epochs[:rows.count, 1] != NumpyVectorStore.RECLAIMED)
+        arrays = {name: np.ascontiguousarray(getattr(rows, name)[keep]) for name, _, _, _ in self._columns()}
+        ids = [rows.ids[row] for row in keep]
+        texts = [rows.texts[row] for row in keep]
+        metadatas = [rows.metadatas[row] for row in keep]
+
+        if self.persist_directory is None:
+            self._rows = NumpyRows(ids=ids, texts=texts, metadatas=metadatas, count=len(ids), **arrays)
+        else:
+            old_generation, generation = self.generation, self.generation + 1
+            for name, file_name, _, _ in self._columns():
+                arrays[name].tofile(self._path(file_name, generation))
+            self._write_chunks(self._path(NumpyVectorStore.CHUNKS_FILE_NAME, generation), ids, texts, metadatas, "w")
+            self._write_index(generation)
+            self.generation = generation
+            self._rows = self._map_rows(ids, texts, metadatas)
+            for file_name in (NumpyVectorStore.VECTORS_FILE_NAME, NumpyVectorStore.EPOCHS_FILE_NAME,
+                              NumpyVectorStore.CODES_FILE_NAME, NumpyVectorStore.SCALES_FILE_NAME,
+                              NumpyVectorStore.CHUNKS_FILE_NAME):
+                if os.path.isfile(self._path(file_name, old_generation)):
+                    os.remove(self._path(file_name, old_generation))
+
+        self._row_of_id = {chunk_id: row for row, chunk_id in enumerate(ids)}
+        self._reclaimed = 0
+        logger.info("Compacted NumPy Vector Store to {} chunks", len(ids))
+
+    def _write_chunks(self, file_path: str, ids: list[str], texts: list[str], metadatas: list[dict],
+                      mode: str) -> None:
+        """
+        Write chunk texts and metadata as JSON lines.
+
+        Args:
+            file_path (str): The path to the chunks file.
+            ids (list[str]): The chunk ids.
+            texts (list[str]): The chunk texts.
+            metadatas (list[dict]): The chunk metadata.
+            mode (str): The mode the file is opened in, "a" to append or "w" to overwrite.
+
+        Returns:
+            None
+        """
+        with open(file_path, mode) as file:
+            for chunk_id, text, metadata in zip(ids, texts, metadatas):
+                file.write(json.dumps({"id": chunk_id, "text": text, "metadata": metadata}) + "\n")
+
+    def _write_index(self, generation: int) -> None:
+        """
+        Write the index file atomically, committing a generation of persisted files.
+
+        Args:
+            generation (int): The generation to commit.
+
+        Returns:
+            None
+        """
+        tmp_path = self._path(NumpyVectorStore.INDEX_FILE_NAME) + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump({"dimension": self.dimension, "generation": generation}, file)
+        os.replace(tmp_path, self._path(NumpyVectorStore.INDEX_FILE_NAME))
+
+    def _flush(self) -> None:
+        """
+        Flush in-place epoch changes of a persisted store to disk.
+
+        Returns:
+            None
+        """
+        if isinstance(self._rows.epochs, np.memmap):
+            self._rows.epochs.flush()
@@ -0,0 +1,50 @@
+from typing import Any, Optional
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from src.storage.TitleIndex import ChunkFilter
+
+
+class SnapshotRetriever(BaseRetriever):
+    """
+    A retriever searching a vector store as it was at a published epoch.
+
+    The vector store must provide search(query, k, epoch, chunk_filter), returning the k chunks
+    most similar to the query among those visible at the epoch and passing the filter, and
+    search_many(queries, k, epoch, chunk_filter), doing so for several queries at once.
+
+    Attributes:
+        vector_store (Any): The vector store searched.
+        epoch (int): The published epoch the retriever sees.
+        k (int): The number of documents retrieved.
+        chunk_filter (ChunkFilter): The filter restricting the chunks retrieved, or None.
+    """
+    vector_store: Any
+    epoch: int
+    k: int = 4
+    chunk_filter: Optional[ChunkFilter] = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        """
+        Get the documents most similar to a query.
+
+        Args:
+            query (str): The query.
+            run_manager (CallbackManagerForRetrieverRun): The callback manager of the run.
+
+        Returns:
+            list[Document]: The most similar documents, most similar first.
+        """
+        return self.vector_store.search(query, self.k, self.epoch, self.chunk_filter)
+
+    def retrieve_many(self, queries: list[str]) -> list[list[Document]]:
+        """
+        Get the documents most similar to each of several queries, searching for all of them at once.
+
+        Args:
+            queries (list[str]): The queries.
+
+        Returns:
+            list[list[Document]]: The most similar documents of each query, most similar first.
+        """
+        return self.vector_store.search_many(queries, self.k, self.epoch, self.chunk_filter)
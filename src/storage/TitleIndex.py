@@ -0,0 +1,121 @@
+from typing import NamedTuple
+
+
+class ChunkFilter(NamedTuple):
+    """
+    A filter restricting a search to the chunks of some documents and pages.
+
+    Attributes:
+        titles (tuple[str]): The titles of the documents searched, or None for all documents.
+        first_page (int): The first page searched, or None to search from the first page.
+        last_page (int): The last page searched, or None to search up to the last page.
+    """
+    titles: tuple = None
+    first_page: int = None
+    last_page: int = None
+
+
+class TitleIndex:
+    """
+    A class indexing chunk ids by the title of their document, with the page number of each.
+
+    A filtered search looks up the chunks of the filtered documents here and only scores them,
+    so its cost follows the size of those documents rather than the size of the store. The
+    index holds chunks of every epoch; visibility is checked by the store.
+
+    Every write replaces the changed mappings rather than changing them in place, so lookups
+    run without locking while a single writer adds or removes chunks.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty TitleIndex object.
+        """
+        self._chunks = {}
+
+    def add(self, ids: list[str], metadatas: list[dict]) -> None:
+        """
+        Add chunks to the index.
+
+        Args:
+            ids (list[str]): The chunk ids.
+            metadatas (list[dict]): The chunk metadata, with their title and page number.
+
+        Returns:
+            None
+        """
+        self._update(ids, metadatas, remove=False)
+
+    def remove(self, ids: list[str], metadatas: list[dict]) -> None:
+        """
+        Remove chunks from the index.
+
+        Args:
+            ids (list[str]): The chunk ids.
+            metadatas (list[dict]): The chunk metadata, with their title.
+
+        Returns:
+            None
+        """
+        self._update(ids, metadatas, remove=True)
+
+    def titles(self) -> list[str]:
+        """
+        Get the titles of the indexed documents.
+
+        Returns:
+            list[str]: The titles, in the order they were first added.
+        """
+        return list(self._chunks)
+
+    def lookup(self, chunk_filter: ChunkFilter) -> list[str]:
+        """
+        Get the ids of the chunks passing a filter.
+
+        Args:
+            chunk_filter (ChunkFilter): The filter.
+
+        Returns:
+            list[str]: The chunk ids, grouped by title.
+        """
+        chunks = self._chunks
+        titles = chunks if chunk_filter.titles is None else chunk_filter.titles
+        first_page = float("-inf") if chunk_filter.first_page is None else chunk_filter.first_page
+        last_page = float("inf") if chunk_filter.last_page is None else chunk_filter.last_page
+        ids = []
+        for title in titles:
+            pages = chunks.get(title, {})
+            if first_page == float("-inf") and last_page == float("inf"):
+                ids.extend(pages)
+            else:
+                ids.extend(chunk_id for chunk_id, page_number in pages.items()
+                           if first_page <= page_number <= last_page)
+        return ids
+
+    def _update(self, ids: list[str], metadatas: list[dict], remove: bool) -> None:
+        """
+        Add or remove chunks in copies of the mappings of their titles, then swap the copies in.
+
+        Args:
+            ids (list[str]): The chunk ids.
+            metadatas (list[dict]): The chunk metadata, with their title and page number.
+            remove (bool): Whether the chunks are removed rather than added.
+
+        Returns:
+            None
+        """
+        chunks = dict(self._chunks)
+        copied = set()
+        for chunk_id, metadata in zip(ids, metadatas):
+            title = metadata.get("title")
+            if title not in copied:
+                chunks[title] = dict(chunks.get(title, {}))
+                copied.add(title)
+            if remove:
+                chunks[title].pop(chunk_id, None)
+            else:
+                chunks[title][chunk_id] = metadata.get("page_number", 0)
+        for title in copied:
+            if not chunks[title]:
+                del chunks[title]
+        self._chunks = chunks
@@ -1,8 +1,16 @@
+import hashlib
+import os
+import uuid
 from enum import Enum
 
+from langchain_core.documents import Document
 from langchain_core.vectorstores import VectorStoreRetriever
-from src.inputs.InputFile import InputFile
+from src.inputs.InputFile import InputFile, InputFileType
 from langchain_core.embeddings import Embeddings
+from src.chunkers.TokenChunker import TokenChunker
+from src.storage.IngestManifest import IngestManifest
+from src.storage.TitleIndex import ChunkFilter, TitleIndex
+from src.cfg.logging_config import *
 
 
 class VectorStoreOptions(Enum):
@@ -11,9 +19,13 @@ class VectorStoreOptions(Enum):
 
     Attributes:
         CHROMA (str): Represents the Chroma vector store.
+        NUMPY (str): Represents the in-process NumPy vector store.
+        HNSW (str): Represents the in-process vector store searched through an HNSW graph.
         DEFAULT (str): Represents the default vector store.
     """
     CHROMA = "Chroma"
+    NUMPY = "Numpy"
+    HNSW = "Hnsw"
     DEFAULT = "Default"
 
 
@@ -24,15 +36,46 @@ class VectorStore:
     This class defines an interface for vector stores and provides methods
     for adding documents and converting the vector store to a retriever.
 
+    Chunks are tagged with the epoch they were written in and, once superseded, the epoch they
+    were retired in. Retrievers only see chunks written up to and retired after the epoch that
+    was published when they were created. A retriever is therefore an immutable snapshot of the
+    store: chunks written by a later add_documents call are not visible to it, and chunks
+    superseded by a later call are kept for it until reclaim() is called.
+
+    Files on disk are tracked by an IngestManifest as documents with a stable id. Their chunks
+    get ids derived from the document id and their content, so adding a changed file again only
+    writes the chunks that changed and retires the ones no longer in it, and a document can be
+    deleted by its id.
+
+    Stores with a KeywordIndex can also be searched by keywords, and their retrievers fuse the
+    keyword and similarity rankings.
+
+    Searches can be restricted to some documents and pages by a ChunkFilter. The chunks passing
+    it are looked up in a TitleIndex kept by each store, and only they are scored, so a filtered
+    search costs no more as other documents are added.
+
     Attributes:
         vector_store_type (VectorStoreOptions): The type of the vector store.
         embeddings (Embeddings): The embeddings used by the vector store.
+        chunker (TokenChunker): The chunker splitting pages into the chunks that are stored.
+        published_epoch (int): The epoch of the newest chunks visible to new retrievers.
+        defer_reclaim (bool): Whether the owner of the store publishes writes and reclaims
+            superseded chunks itself, instead of add_documents() doing both immediately.
+        manifest (IngestManifest): The manifest of the documents stored from files.
+        pending_ids (dict): The chunk ids of files whose slices are still being added.
+        keyword_index (KeywordIndex): The keyword index of the stored chunks, or None.
+        title_index (TitleIndex): The index of the stored chunks by document title.
     """
 
+    # The retirement epoch of chunks that have not been superseded
+    NEVER_RETIRED = 2 ** 62
+    KEYWORD_SEARCH_OVERSAMPLING = 2
+
     def __init__(
             self,
             vector_store_type: VectorStoreOptions,
-            embeddings: Embeddings
+            embeddings: Embeddings,
+            chunker: TokenChunker = None
     ):
         """
         Initialize a VectorStore object.
@@ -40,9 +83,21 @@ class VectorStore:
         Args:
             vector_store_type (VectorStoreOptions): The type of the vector store.
             embeddings (Embeddings): The embeddings used by the vector store.
+            chunker (TokenChunker): The chunker splitting pages into chunks. If None, a
+                TokenChunker with default settings is used.
         """
         self.vector_store_type = vector_store_type
         self.embeddings = embeddings
+        self.chunker = chunker or TokenChunker()
+        # Epochs count publishes; persistent stores resume them after the newest epoch they hold
+        self.published_epoch = 0
+        self.defer_reclaim = False
+        self.superseded_ids = []
+        self.manifest = IngestManifest()
+        self.pending_ids = {}
+        self.keyword_index = None
+        self.title_index = TitleIndex()
+        self._write_epoch = None
 
     def add_document(self, input_file: InputFile) -> None:
         """
@@ -58,6 +113,417 @@ class VectorStore:
         """
         raise NotImplementedError("add_document method must be implemented in subclasses")
 
+    def add_documents(self, input_files: list[InputFile]) -> None:
+        """
+        Add a batch of documents to the vector store.
+
+        Subclasses that can write several documents at once should override this method; the
+        default implementation adds the documents one at a time.
+
+        Args:
+            input_files (list[InputFile]): InputFiles containing the documents to be added.
+
+        Returns:
+            None
+        """
+        for input_file in input_files:
+            self.add_document(input_file)
+
+    def build_documents(self, input_file: InputFile) -> list[Document]:
+        """
+        Split the pages of an InputFile into chunks and build one Document per chunk, with
+        title and page number metadata.
+
+        Page numbers count from the start of the whole file, so slices of a file streamed in
+        batches are numbered consistently with the file loaded in one piece.
+
+        Args:
+            input_file (InputFile): InputFile containing the pages.
+
+        Returns:
+            list[Document]: The Documents to be stored.
+
+        Raises:
+            ValueError: If the input file type is unsupported.
+        """
+        if input_file.input_file_type not in (InputFileType.PDF, InputFileType.TEXT):
+            logger.error("Unexpected InputFileType {}", input_file.path)
+            raise ValueError("Unsupported file format {}", input_file.path)
+
+        title = input_file.name
+        pages = input_file.data.get("pages")
+        page_offset = input_file.data.get("page_offset", 0)
+        return [Document(text=chunk, page_content=chunk, metadata={"title": title, "page_number": page_number})
+                for chunk, page_number in self.chunker.chunk_pages(pages, page_offset)]
+
+    @staticmethod
+    def chunk_id(document_id: str, page_number: int, occurrence: int, text: str) -> str:
+        """
+        Get the stable id of a chunk of a document.
+
+        Args:
+            document_id (str): The id of the document.
+            page_number (int): The number of the page the chunk came from.
+            occurrence (int): The number of identical chunks before it on the page.
+            text (str): The chunk text.
+
+        Returns:
+            str: The hex digest of the document id, position and text, shortened to 32 characters.
+        """
+        key = "{}\0{}\0{}\0{}".format(document_id, page_number, occurrence, text)
+        return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+    def is_tracked(self, input_file: InputFile) -> bool:
+        """
+        Check whether an input file is tracked as a document in the manifest.
+
+        Args:
+            input_file (InputFile): The input file.
+
+        Returns:
+            bool: True if the input file was read from a file that still exists, or from content
+                in memory whose hash is given in its data (see QuestionAnswerModel.add_files()).
+        """
+        return "content_hash" in input_file.data or os.path.isfile(input_file.path)
+
+    def assign_ids(self, docs_per_file: list[tuple[InputFile, list[Document]]]) -> \
+            tuple[list[str], list[int], list[str]]:
+        """
+        Assign ids to the chunks of a batch of input files and find the chunks that must be written.
+
+        Chunks of tracked files that are already stored are not written again. Once the last
+        slice of a tracked file is assigned, the chunks stored for it before that are no longer
+        in it are superseded. If the file failed to parse instead, the chunks written from its
+        earlier slices are superseded, and the chunks recorded for it in the manifest are kept.
+        Nothing is retired here, so a batch failing to be written leaves the stored chunks as
+        they were; record_documents() retires the superseded chunks once the batch is written.
+
+        Args:
+            docs_per_file (list[tuple[InputFile, list[Document]]]): Each input file with its chunks.
+
+        Returns:
+            tuple[list[str], list[int], list[str]]: The ids of all chunks, in order, the
+                positions of the chunks to write among them, and the ids of the chunks superseded.
+        """
+        ids, write_positions, retired_ids = [], [], []
+        for input_file, file_docs in docs_per_file:
+            if input_file.data.get("failed", False):
+                # The chunks written from earlier slices of a file that failed to parse are dropped
+                retired_ids.extend(self.drop_pending(input_file.path))
+                continue
+            if not self.is_tracked(input_file):
+                write_positions.extend(range(len(ids), len(ids) + len(file_docs)))
+                ids.extend(str(uuid.uuid4()) for _ in file_docs)
+                continue
+            if input_file.data.get("page_offset", 0) == 0:
+                self.pending_ids[input_file.path] = []
+            stored_ids = set(self.manifest.get_ids(input_file.path))
+            document_id = IngestManifest.document_id(input_file.path)
+            occurrences = {}
+            file_ids = []
+            for doc in file_docs:
+                key = (doc.metadata["page_number"], doc.page_content)
+                occurrences[key] = occurrences.get(key, -1) + 1
+                file_ids.append(VectorStore.chunk_id(document_id, key[0], occurrences[key], doc.page_content))
+            # A chunk that was retired but not reclaimed yet keeps its id, so a new copy of it gets another one
+            retired_copies = self.stored_ids([chunk_id for chunk_id in file_ids if chunk_id not in stored_ids])
+            for chunk_id in file_ids:
+                if chunk_id in retired_copies:
+                    chunk_id = hashlib.sha256("{}\0{}".format(chunk_id, self.write_epoch).encode()).hexdigest()[:32]
+                if chunk_id not in stored_ids:
+                    write_positions.append(len(ids))
+                ids.append(chunk_id)
+            pending = self.pending_ids[input_file.path]
+            pending.extend(ids[len(ids) - len(file_ids):])
+            if input_file.data.get("complete", True):
+                current_ids = set(pending)
+                retired_ids.extend(chunk_id for chunk_id in stored_ids if chunk_id not in current_ids)
+        return ids, write_positions, retired_ids
+
+    def record_documents(self, input_files: list[InputFile], retired_ids: list[str]) -> None:
+        """
+        Retire the chunks a written batch superseded in the write epoch, and record the tracked
+        files whose last slice was added in the manifest.
+
+        Args:
+            input_files (list[InputFile]): The input files added.
+            retired_ids (list[str]): The ids of the superseded chunks, as found by assign_ids().
+
+        Returns:
+            None
+        """
+        self.supersede(retired_ids)
+        for input_file in input_files:
+            if input_file.path in self.pending_ids and input_file.data.get("complete", True):
+                content_hash = input_file.data.get("content_hash") or IngestManifest.hash_file(input_file.path)
+                self.manifest.record(input_file.path, content_hash,
+                                     self.pending_ids.pop(input_file.path))
+
+    def drop_pending(self, file_path: str) -> list[str]:
+        """
+        Stop adding a file streamed in slices, keeping the chunks recorded for it in the manifest.
+
+        Args:
+            file_path (str): The path to the file.
+
+        Returns:
+            list[str]: The ids of the chunks assigned to its slices so far that are not recorded
+                for it, which must be superseded.
+        """
+        stored_ids = set(self.manifest.get_ids(file_path))
+        return [chunk_id for chunk_id in dict.fromkeys(self.pending_ids.pop(file_path, []))
+                if chunk_id not in stored_ids]
+
+    def abort_pending(self) -> None:
+        """
+        Drop the chunks written for files whose last slice was not added, after a write failed.
+
+        The chunks recorded for them in the manifest stay visible. The chunks written since are
+        retired in the write epoch they were written in, so no publish makes them visible, and
+        they are reclaimed with the superseded chunks.
+
+        Returns:
+            None
+        """
+        retired_ids = [chunk_id for file_path in list(self.pending_ids) for chunk_id in self.drop_pending(file_path)]
+        if retired_ids:
+            logger.warning("Dropping {} chunks of files left partly added", len(retired_ids))
+        self.supersede(retired_ids)
+
+    def supersede(self, ids: list[str]) -> None:
+        """
+        Retire chunks in the write epoch and add them to superseded_ids, to be reclaimed.
+
+        Args:
+            ids (list[str]): The ids of the chunks.
+
+        Returns:
+            None
+        """
+        if ids:
+            self.retire(ids, self.write_epoch)
+            self.superseded_ids.extend(ids)
+
+    def delete_document(self, document_id: str) -> bool:
+        """
+        Delete a document stored from a file, retiring all of its chunks.
+
+        The chunks are reclaimed like superseded chunks: immediately, unless defer_reclaim is
+        set and the caller publishes the deletion.
+
+        Args:
+            document_id (str): The id of the document.
+
+        Returns:
+            bool: True if the document was found and deleted.
+        """
+        file_path = self.manifest.find(document_id)
+        if file_path is None:
+            return False
+        ids = self.manifest.get_ids(file_path)
+        self.supersede(ids)
+        self.manifest.remove(file_path)
+        logger.info("Deleted document {} with {} chunks", file_path, len(ids))
+        if not self.defer_reclaim:
+            self.publish()
+        return True
+
+    def retire(self, ids: list[str], epoch: int) -> None:
+        """
+        Set the retirement epoch of chunks.
+
+        This method must be implemented by subclasses that supersede chunks.
+
+        Args:
+            ids (list[str]): The ids of the chunks.
+            epoch (int): The epoch the chunks are retired in.
+
+        Returns:
+            None
+        """
+        raise NotImplementedError("retire method must be implemented in subclasses")
+
+    def stored_ids(self, ids: list[str]) -> set[str]:
+        """
+        Find which chunks are stored, whether visible, retired or not yet reclaimed.
+
+        This method must be implemented by subclasses that track documents.
+
+        Args:
+            ids (list[str]): The chunk ids.
+
+        Returns:
+            set[str]: The ids of the stored chunks.
+        """
+        raise NotImplementedError("stored_ids method must be implemented in subclasses")
+
+    @property
+    def write_epoch(self) -> int:
+        """
+        Get the epoch that chunks written now are tagged with, which is newer than the
+        published epoch until publish() is called.
+        """
+        if self._write_epoch is None:
+            self._write_epoch = self.published_epoch + 1
+        return self._write_epoch
+
+    def resume_epoch(self, persisted_epoch: int) -> None:
+        """
+        Resume the epochs of a persistent store after the newest epoch its chunks were written or
+        retired in, so every persisted chunk is visible and every retired one hidden.
+
+        Args:
+            persisted_epoch (int): The newest write or retirement epoch of the persisted chunks,
+                leaving out NEVER_RETIRED.
+
+        Returns:
+            None
+        """
+        self.published_epoch = max(self.published_epoch, persisted_epoch)
+
+    def publish(self) -> list[str]:
+        """
+        Make the chunks written since the last publish visible to new retrievers.
+
+        Unless defer_reclaim is set, chunks superseded by the published ones are deleted.
+
+        Returns:
+            list[str]: The ids of the superseded chunks still to be reclaimed, once no
+                retriever created before this publish is in use.
+        """
+        if self._write_epoch is not None:
+            self.published_epoch = self._write_epoch
+            self._write_epoch = None
+        superseded_ids, self.superseded_ids = self.superseded_ids, []
+        if superseded_ids and not self.defer_reclaim:
+            self.reclaim(superseded_ids)
+            return []
+        return superseded_ids
+
+    def reclaim(self, ids: list[str]) -> None:
+        """
+        Delete superseded chunks.
+
+        This method must be implemented by subclasses that supersede chunks.
+
+        Args:
+            ids (list[str]): The ids of the chunks to delete.
+
+        Returns:
+            None
+        """
+        raise NotImplementedError("reclaim method must be implemented in subclasses")
+
+    def search_many(self, queries: list[str], k: int, epoch: int,
+                    chunk_filter: ChunkFilter = None) -> list[list[Document]]:
+        """
+        Find the chunks most similar to each of several queries among those visible at an epoch.
+
+        Subclasses override this to embed the queries in one batch and score them together;
+        this implementation searches for each query in turn.
+
+        Args:
+            queries (list[str]): The queries.
+            k (int): The maximum number of chunks returned per query.
+            epoch (int): The published epoch whose chunks are searched.
+            chunk_filter (ChunkFilter): The filter restricting the chunks searched, or None.
+
+        Returns:
+            list[list[Document]]: The most similar chunks of each query, most similar first.
+        """
+        return [self.search(query, k, epoch, chunk_filter) for query in queries]
+
+    def keyword_search(self, query: str, k: int, epoch: int, chunk_filter: ChunkFilter = None) -> list[Document]:
+        """
+        Find the chunks most relevant to the terms of a query among those visible at an epoch.
+
+        The keyword index holds chunks of every epoch, so a few more chunks than needed are
+        fetched and more are fetched again when too few of them are visible.
+
+        Args:
+            query (str): The query.
+            k (int): The maximum number of chunks returned.
+            epoch (int): The published epoch whose chunks are searched.
+            chunk_filter (ChunkFilter): The filter restricting the chunks searched, or None.
+
+        Returns:
+            list[Document]: The most relevant chunks, most relevant first.
+        """
+        return self.keyword_search_many([query], k, epoch, chunk_filter)[0]
+
+    def keyword_search_many(self, queries: list[str], k: int, epoch: int,
+                            chunk_filter: ChunkFilter = None) -> list[list[Document]]:
+        """
+        Find the chunks most relevant to the terms of each of several queries among those visible
+        at an epoch.
+
+        The chunks found for all queries are fetched together, and the queries with too few
+        visible chunks fetch more again together, as keyword_search() does for one query.
+
+        Args:
+            queries (list[str]): The queries.
+            k (int): The maximum number of chunks returned per query.
+            epoch (int): The published epoch whose chunks are searched.
+            chunk_filter (ChunkFilter): The filter restricting the chunks searched, or None.
+
+        Returns:
+            list[list[Document]]: The most relevant chunks of each query, most relevant first.
+        """
+        ids = None
+        if chunk_filter is not None:
+            ids = self.title_index.lookup(chunk_filter)
+            if not ids:
+                return [[] for _ in queries]
+        results = [[] for _ in queries]
+        pending = list(range(len(queries)))
+        fetch_k = k * VectorStore.KEYWORD_SEARCH_OVERSAMPLING
+        while pending:
+            hits = {position: [chunk_id for chunk_id, _ in self.keyword_index.search(queries[position], fetch_k, ids)]
+                    for position in pending}
+            hit_ids = dict.fromkeys(chunk_id for chunk_ids in hits.values() for chunk_id in chunk_ids)
+            chunks = self.get_chunks(list(hit_ids), epoch)
+            more = []
+            for position in pending:
+                docs = [chunks[chunk_id] for chunk_id in hits[position] if chunk_id in chunks]
+                if len(docs) >= k or len(hits[position]) < fetch_k:
+                    results[position] = docs[:k]
+                else:
+                    more.append(position)
+            pending = more
+            fetch_k *= VectorStore.KEYWORD_SEARCH_OVERSAMPLING
+        return results
+
+    def get_chunks(self, ids: list[str], epoch: int) -> dict[str, Document]:
+        """
+        Get chunks by id, leaving out those not visible at an epoch.
+
+        This method must be implemented by subclasses with a keyword index.
+
+        Args:
+            ids (list[str]): The chunk ids.
+            epoch (int): The published epoch whose chunks are returned.
+
+        Returns:
+            dict[str, Document]: The visible chunks, keyed by id.
+        """
+        raise NotImplementedError("get_chunks method must be implemented in subclasses")
+
+    def is_document_current(self, file_path: str, content_hash: str = None) -> bool:
+        """
+        Check whether a file is already stored and unchanged since it was added.
+
+        Vector stores without persistence never hold documents across restarts, so the
+        default implementation always returns False.
+
+        Args:
+            file_path (str): The path to the file.
+            content_hash (str): The hash of the file's content, if it is held in memory rather than on disk.
+
+        Returns:
+            bool: True if the file's current content is already stored.
+        """
+        return False
+
     def as_retriever(self) -> VectorStoreRetriever:
         """
         Convert the vector store to a retriever.
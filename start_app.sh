@@ -2,8 +2,22 @@
 
 # Start the Python backend
 python3 app.py &
+BACKEND_PID=$!
 
-sleep 20
+# Wait until the backend has loaded the model and added the setup documents, showing its progress
+until curl -sf http://localhost:5000/ready > /dev/null; do
+    if ! kill -0 $BACKEND_PID 2> /dev/null; then
+        echo "The backend exited before it was ready"
+        exit 1
+    fi
+    STATUS=$(curl -s http://localhost:5000/ready)
+    if echo "$STATUS" | grep -q '"stage":"failed"'; then
+        echo "The backend failed to start: $STATUS"
+        exit 1
+    fi
+    [ -n "$STATUS" ] && echo "Waiting for the backend: $STATUS"
+    sleep 1
+done
 cd client
 
 # Start the React frontend
@@ -0,0 +1,85 @@
+import unittest
+import time
+import zlib
+from langchain_core.embeddings import Embeddings
+from src.model.AnswerCache import AnswerCache
+
+
+class BagOfWordsEmbeddings(Embeddings):
+    embedded = 0
+
+    def embed_query(self, text):
+        self.embedded += 1
+        vector = [0.0] * 64
+        for word in text.lower().split():
+            vector[zlib.crc32(word.encode()) % 64] += 1.0
+        return vector
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+
+class TestAnswerCache(unittest.TestCase):
+    def setUp(self):
+        self.embeddings = BagOfWordsEmbeddings()
+        self.cache = AnswerCache(self.embeddings, max_entries=2, semantic_match=True, similarity_threshold=0.9)
+
+    def test_exact_match_ignores_case_and_punctuation(self):
+        self.cache.put("How much did Bumble revenue grow?", "16%")
+        self.assertEqual(self.cache.get("  how much did bumble revenue   grow "), "16%")
+
+    def test_semantic_match_above_threshold(self):
+        self.cache.put("How much did Bumble revenue grow in 2023", "16%")
+        self.assertEqual(self.cache.get("How much did Bumble revenue grow in 2023 overall"), "16%")
+        self.assertIsNone(self.cache.get("Who is the CEO of Match Group"))
+
+    def test_semantic_match_is_off_by_default(self):
+        cache = AnswerCache(self.embeddings)
+        cache.put("How much did Bumble revenue grow in 2023", "16%")
+        self.assertIsNone(cache.get("How much did Bumble revenue grow in 2023 overall"))
+        self.assertEqual(cache.get("how much did Bumble revenue grow in 2023?"), "16%")
+        self.assertEqual(self.embeddings.embedded, 0)
+
+    def test_questions_with_other_numbers_never_match(self):
+        cache = AnswerCache(self.embeddings, semantic_match=True, similarity_threshold=0.5)
+        cache.put("What was Bumble revenue in 2023", "$1,052 million")
+        self.assertIsNone(cache.get("What was Bumble revenue in 2022"))
+        self.assertIsNone(cache.get("What was Bumble revenue"))
+        self.assertEqual(cache.get("What was the Bumble revenue in 2023"), "$1,052 million")
+
+    def test_question_is_embedded_once_per_miss(self):
+        self.cache.put("first question", "first")
+        answer, vector = self.cache.lookup("How much did Bumble revenue grow in 2023")
+        self.assertIsNone(answer)
+        self.cache.put("How much did Bumble revenue grow in 2023", "16%", vector=vector)
+        self.assertEqual(self.embeddings.embedded, 2)
+        self.assertEqual(self.cache.get("How much did Bumble revenue grow in 2023 overall"), "16%")
+
+    def test_expired_and_least_recently_used_entries_are_evicted(self):
+        self.cache.put("first question", "first")
+        self.cache.put("second question", "second")
+        self.cache.get("first question")
+        self.cache.put("third question", "third")
+        self.assertIsNone(self.cache.get("second question"))
+        self.assertEqual(self.cache.get("first question"), "first")
+
+        self.cache.ttl_seconds = 0.01
+        self.cache.put("fourth question", "fourth")
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get("fourth question"))
+
+    def test_questions_in_other_scopes_never_match(self):
+        self.cache.put("How much did Bumble revenue grow in 2023", "16%", scope="10-K")
+        self.assertIsNone(self.cache.get("How much did Bumble revenue grow in 2023"))
+        self.assertIsNone(self.cache.get("How much did Bumble revenue grow in 2023 overall", scope="10-Q"))
+        self.assertEqual(self.cache.get("How much did Bumble revenue grow in 2023 overall", scope="10-K"), "16%")
+
+    def test_clear_drops_answers_computed_before_it(self):
+        generation = self.cache.generation
+        self.cache.clear()
+        self.cache.put("first question", "stale", generation)
+        self.assertIsNone(self.cache.get("first question"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+import os
+import tempfile
+from unittest import mock
+from src.chunkers.TokenChunker import TokenChunker
+
+
+class TestTokenChunker(unittest.TestCase):
+    def setUp(self):
+        # An unknown encoding makes the chunker count words, so the expected chunks do not
+        # depend on whether tiktoken can fetch its encodings on this host
+        self.chunker = TokenChunker(chunk_tokens=10, overlap_tokens=3, encoding_name="word-count")
+
+    def test_short_page_is_one_chunk(self):
+        self.assertEqual(self.chunker.chunk_page("A short page."), ["A short page."])
+        self.assertEqual(self.chunker.chunk_page("   "), [])
+
+    def test_long_page_is_cut_with_overlap(self):
+        words = ["word{}".format(i) for i in range(25)]
+        chunks = self.chunker.chunk_page(" ".join(words))
+
+        self.assertEqual([chunk.split() for chunk in chunks], [words[0:10], words[7:17], words[14:24], words[21:25]])
+
+    def test_chunks_keep_page_numbers(self):
+        pages = ["First page.", " ".join(["word"] * 15), "Third page."]
+        chunks = self.chunker.chunk_pages(pages, page_offset=4)
+
+        self.assertEqual([page_number for _, page_number in chunks], [5, 6, 6, 7])
+
+    def test_tokens_are_counted_as_when_chunking(self):
+        self.assertEqual(self.chunker.count_tokens("Five words in this text."), 5)
+        self.assertEqual(self.chunker.count_tokens(""), 0)
+
+    def test_encoding_missing_from_local_cache_is_not_downloaded(self):
+        with tempfile.TemporaryDirectory() as cache_directory, \
+                mock.patch.dict(os.environ, {"TIKTOKEN_CACHE_DIR": cache_directory}):
+            self.assertIsNone(TokenChunker.load_encoding.__wrapped__("cl100k_base"))
+            self.assertEqual(os.listdir(cache_directory), [])
+
+    def test_overlap_must_be_smaller_than_chunk(self):
+        with self.assertRaises(ValueError):
+            TokenChunker(chunk_tokens=10, overlap_tokens=10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import unittest
+from langchain_core.documents import Document
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from src.compressors.CompressingRetriever import CompressingRetriever
+from src.compressors.ContextCompressor import ContextCompressor
+from src.inputs.TextInputFile import TextInputFile
+from src.storage.NumpyVectorStore import NumpyVectorStore
+from src.storage.TitleIndex import ChunkFilter
+
+
+class TestContextCompressor(unittest.TestCase):
+    def setUp(self):
+        # An unknown encoding counts words as tokens, so budgets do not depend on tiktoken being available
+        self.compressor = ContextCompressor(budget_tokens=40, chunk_tokens=20, encoding_name="word-count",
+                                            word_tokens=1)
+
+    def test_chunks_are_trimmed_to_their_most_relevant_sentences(self):
+        doc = Document(page_content="The office moved to a new building downtown last spring. "
+                                    "Revenue grew 16% in 2023 on strong subscriptions. "
+                                    "The cafeteria now serves lunch every weekday for all staff members.",
+                       metadata={"title": "report.txt", "page_number": 3})
+        compressed, stats = ContextCompressor(chunk_tokens=12, encoding_name="word-count", word_tokens=1).compress(
+            "How much did revenue grow in 2023?", [doc])
+
+        self.assertEqual([doc.page_content for doc in compressed],
+                         ["Revenue grew 16% in 2023 on strong subscriptions."])
+        self.assertEqual(compressed[0].metadata, {"title": "report.txt", "page_number": 3})
+        self.assertEqual(stats.original_tokens, 29)
+        self.assertEqual(stats.tokens, 8)
+        self.assertEqual(stats.saved_tokens, 21)
+
+    def test_kept_sentences_keep_their_order(self):
+        doc = Document(page_content="Revenue grew in 2023. The office moved. Users grew in 2023.")
+        compressed, _ = ContextCompressor(chunk_tokens=9, encoding_name="word-count", word_tokens=1).compress(
+            "revenue users grew 2023", [doc])
+
+        self.assertEqual(compressed[0].page_content, "Revenue grew in 2023. Users grew in 2023.")
+
+    def test_near_duplicate_chunks_and_repeated_sentences_are_dropped(self):
+        docs = [Document(page_content=text) for text in (
+            "Revenue grew 16% in 2023. Paying users grew 4% in the same year.",
+            "Revenue grew 16% in 2023! Paying users grew 4% in the same year.",
+            "Paying users grew 4% in the same year. The office moved to Austin.",
+        )]
+        compressed, stats = self.compressor.compress("revenue", docs)
+
+        self.assertEqual(stats.duplicates, 1)
+        self.assertEqual([doc.page_content for doc in compressed],
+                         [docs[0].page_content, "The office moved to Austin."])
+
+    def test_context_stays_within_the_budget(self):
+        docs = [Document(page_content=" ".join("Sentence {} of chunk {} mentions revenue.".format(i, j)
+                                               for i in range(10)))
+                for j in range(6)]
+        compressed, stats = self.compressor.compress("revenue", docs)
+
+        self.assertLessEqual(stats.tokens, 40)
+        self.assertEqual(stats.tokens, sum(len(doc.page_content.split()) for doc in compressed))
+        self.assertEqual(stats.original_tokens, 6 * 10 * 7)
+        self.assertEqual(len(compressed), 2)
+
+    def test_sentence_longer_than_a_chunk_is_cut(self):
+        doc = Document(page_content=" ".join(["revenue"] * 50))
+        compressed, stats = self.compressor.compress("revenue", [doc])
+
+        self.assertEqual(compressed[0].page_content, " ".join(["revenue"] * 20))
+        self.assertEqual(stats.tokens, 20)
+
+    def test_words_are_counted_conservatively_without_encoding(self):
+        docs = [Document(page_content=" ".join("Sentence {} of chunk {} mentions revenue.".format(i, j)
+                                               for i in range(10)))
+                for j in range(6)]
+        compressed, stats = ContextCompressor(budget_tokens=40, chunk_tokens=20, encoding_name="word-count").compress(
+            "revenue", docs)
+
+        # A sentence of seven words counts as ten tokens, so a chunk of 20 tokens fits one of them
+        self.assertEqual([len(doc.page_content.split()) for doc in compressed], [7, 7, 7])
+        self.assertEqual(stats.tokens, 30)
+
+        compressed, stats = ContextCompressor(chunk_tokens=20, encoding_name="word-count").compress(
+            "revenue", [Document(page_content=" ".join(["revenue"] * 50))])
+        self.assertEqual(compressed[0].page_content, " ".join(["revenue"] * 14))
+        self.assertEqual(stats.tokens, 20)
+
+    def test_budget_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            ContextCompressor(budget_tokens=0)
+        with self.assertRaises(ValueError):
+            ContextCompressor(word_tokens=0.5)
+
+
+class TestCompressingRetriever(unittest.TestCase):
+    def setUp(self):
+        self.store = NumpyVectorStore(DeterministicFakeEmbedding(size=16))
+        self.store.add_documents([
+            TextInputFile(name="a.txt", path="a.txt", pages=["Revenue grew 16% in 2023. The office moved."]),
+            TextInputFile(name="b.txt", path="b.txt", pages=["Revenue grew 16% in 2023. The office moved!"]),
+        ])
+        self.compressor = ContextCompressor(encoding_name="word-count")
+
+    def test_retrieved_chunks_are_compressed(self):
+        retriever = CompressingRetriever(retriever=self.store.as_retriever(), compressor=self.compressor)
+        docs = retriever.invoke("revenue")
+
+        self.assertEqual(len(docs), 1)
+        self.assertEqual(docs[0].page_content, "Revenue grew 16% in 2023. The office moved.")
+
+    def test_chunk_filter_is_applied_to_inner_retriever(self):
+        retriever = CompressingRetriever(retriever=self.store.as_retriever(), compressor=self.compressor)
+        docs = retriever.copy(update={"chunk_filter": ChunkFilter(titles=("b.txt",))}).invoke("revenue")
+
+        self.assertEqual([doc.metadata["title"] for doc in docs], ["b.txt"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,185 @@
+import unittest
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import numpy as np
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from src.embeddings.BatchEmbedder import BatchEmbedder
+from src.embeddings.CachedEmbeddings import CachedEmbeddings
+from src.embeddings.HashingEmbeddings import HashingEmbeddings
+from src.embeddings.LocalEmbeddings import LocalEmbeddings
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    embedded_texts: list = []
+
+    def embed_documents(self, texts):
+        self.embedded_texts.extend(texts)
+        return super().embed_documents(texts)
+
+
+class TestCachedEmbeddings(unittest.TestCase):
+    def setUp(self):
+        self.test_directory = tempfile.mkdtemp()
+        self.base_embeddings = CountingEmbeddings(size=8, embedded_texts=[])
+
+    def tearDown(self):
+        shutil.rmtree(self.test_directory)
+
+    def test_repeated_texts_are_embedded_once(self):
+        embeddings = CachedEmbeddings(self.base_embeddings)
+        first = embeddings.embed_documents(["alpha", "beta", "alpha"])
+        second = embeddings.embed_documents(["beta", "gamma"])
+
+        self.assertEqual(self.base_embeddings.embedded_texts, ["alpha", "beta", "gamma"])
+        self.assertEqual(first[0], first[2])
+        self.assertEqual(first[1], second[0])
+        self.assertEqual(embeddings.stats()["hits"], 2)
+        self.assertEqual(embeddings.stats()["misses"], 3)
+
+    def test_async_embeddings_share_the_cache(self):
+        embeddings = CachedEmbeddings(self.base_embeddings)
+        first = asyncio.run(embeddings.aembed_documents(["alpha", "beta", "alpha"]))
+        query = asyncio.run(embeddings.aembed_query("beta"))
+        second = embeddings.embed_documents(["alpha", "beta"])
+
+        self.assertEqual(self.base_embeddings.embedded_texts, ["alpha", "beta"])
+        self.assertEqual(first[:2], second)
+        self.assertEqual(query, second[1])
+        self.assertEqual(embeddings.stats()["hits"], 4)
+        self.assertEqual(embeddings.stats()["misses"], 2)
+
+    def test_cache_survives_reopen(self):
+        cache_path = os.path.join(self.test_directory, "cache.sqlite")
+        CachedEmbeddings(self.base_embeddings, cache_path).embed_documents(["alpha"])
+        reopened = CachedEmbeddings(self.base_embeddings, cache_path)
+        reopened.embed_documents(["alpha"])
+
+        self.assertEqual(self.base_embeddings.embedded_texts, ["alpha"])
+        self.assertEqual(reopened.stats()["hits"], 1)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        embeddings = CachedEmbeddings(self.base_embeddings, max_entries=2)
+        embeddings.embed_documents(["alpha"])
+        embeddings.embed_documents(["beta"])
+        embeddings.embed_documents(["alpha"])
+        embeddings.embed_documents(["gamma"])
+        self.assertEqual(embeddings.stats()["size"], 2)
+
+        # beta was the least recently used entry, so it is the one embedded again
+        embeddings.embed_documents(["alpha", "beta"])
+        self.assertEqual(self.base_embeddings.embedded_texts, ["alpha", "beta", "gamma", "beta"])
+
+    def test_last_use_of_hits_is_written_in_batches(self):
+        embeddings = CachedEmbeddings(self.base_embeddings)
+        embeddings.embed_documents(["alpha"])
+        stored = embeddings._connection.execute("SELECT last_used FROM embeddings").fetchone()[0]
+
+        embeddings.embed_query("alpha")
+        self.assertEqual(embeddings._connection.execute("SELECT last_used FROM embeddings").fetchone()[0], stored)
+        self.assertEqual(len(embeddings._last_used), 1)
+
+        # Storing new embeddings writes the noted last uses first
+        embeddings.embed_documents(["beta"])
+        self.assertEqual(embeddings._last_used, {})
+        self.assertGreater(embeddings._connection.execute(
+            "SELECT last_used FROM embeddings WHERE key = ?", (embeddings.cache_key("alpha"),)).fetchone()[0], stored)
+
+
+# DeterministicFakeEmbedding seeds NumPy's global random state, so concurrent batches must not interleave
+EMBEDDING_LOCK = threading.Lock()
+
+
+class SerializedEmbeddings(DeterministicFakeEmbedding):
+    def embed_documents(self, texts):
+        with EMBEDDING_LOCK:
+            return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        with EMBEDDING_LOCK:
+            return super().embed_query(text)
+
+
+class RateLimitError(Exception):
+    pass
+
+
+class ThrottledEmbeddings(DeterministicFakeEmbedding):
+    failures_left: int = 0
+
+    def embed_documents(self, texts):
+        if self.failures_left > 0:
+            self.failures_left -= 1
+            raise RateLimitError("Rate limit reached")
+        return super().embed_documents(texts)
+
+
+class TestBatchEmbedder(unittest.TestCase):
+    def test_batches_respect_size_and_token_limits(self):
+        embedder = BatchEmbedder(DeterministicFakeEmbedding(size=8), max_batch_size=3, max_batch_tokens=100)
+        texts = ["a" * 40] * 5 + ["b" * 1000] + ["c" * 40] * 2
+        self.assertEqual(embedder.make_batches(texts), [(0, 3), (3, 5), (5, 6), (6, 8)])
+
+    def test_concurrent_batches_keep_text_order(self):
+        base_embeddings = SerializedEmbeddings(size=8)
+        embedder = BatchEmbedder(base_embeddings, max_batch_size=2, max_concurrency=4)
+        texts = ["text {}".format(i) for i in range(9)]
+        self.assertEqual(embedder.embed_documents(texts), base_embeddings.embed_documents(texts))
+
+    def test_throttled_batches_are_retried(self):
+        embedder = BatchEmbedder(ThrottledEmbeddings(size=8, failures_left=2), backoff_seconds=0.01)
+        self.assertEqual(len(embedder.embed_documents(["alpha", "beta"])), 2)
+
+        embedder = BatchEmbedder(ThrottledEmbeddings(size=8, failures_left=3), max_retries=2, backoff_seconds=0.01)
+        with self.assertRaises(RateLimitError):
+            embedder.embed_documents(["alpha"])
+
+
+
+class TestHashingEmbeddings(unittest.TestCase):
+    def setUp(self):
+        self.embeddings = HashingEmbeddings(dimensions=64)
+
+    def test_embeddings_are_deterministic_unit_vectors(self):
+        vectors = np.array(self.embeddings.embed_documents(["Revenue grew in 2023.", "", "the of and"]))
+
+        self.assertEqual(vectors.shape, (3, 64))
+        np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1, rtol=1e-6)
+        self.assertEqual(HashingEmbeddings(dimensions=64).embed_query("Revenue grew in 2023."), vectors[0].tolist())
+
+    def test_texts_sharing_terms_are_closer(self):
+        query = np.array(self.embeddings.embed_query("revenue growth in 2023"))
+        related, unrelated = np.array(self.embeddings.embed_documents(
+            ["Revenue growth slowed in 2023.", "The office moved to Austin."]))
+
+        self.assertGreater(query @ related, query @ unrelated)
+
+
+class TestLocalEmbeddings(unittest.TestCase):
+    def setUp(self):
+        self.test_directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_directory)
+
+    def save_model(self, name, weights):
+        model_directory = os.path.join(self.test_directory, name, "embedding_model")
+        os.makedirs(os.path.join(model_directory, "1_Pooling"))
+        with open(os.path.join(model_directory, "config.json"), "w") as file:
+            file.write('{"hidden_size": 384}')
+        with open(os.path.join(model_directory, "1_Pooling", "config.json"), "w") as file:
+            file.write('{"pooling_mode_mean_tokens": true}')
+        with open(os.path.join(model_directory, "model.safetensors"), "wb") as file:
+            file.write(weights)
+        return model_directory
+
+    def test_models_saved_to_same_directory_name_hash_differently(self):
+        first = LocalEmbeddings.hash_model(self.save_model("first", b"\x01" * 64))
+        self.assertEqual(LocalEmbeddings.hash_model(self.save_model("copy", b"\x01" * 64)), first)
+        self.assertNotEqual(LocalEmbeddings.hash_model(self.save_model("second", b"\x02" * 64)), first)
+
+
+if __name__ == '__main__':
+    unittest.main()
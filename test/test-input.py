@@ -1,8 +1,15 @@
 import unittest
+import io
 import os
 import shutil
+import tarfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+import PyPDF2
+from PyPDF2.generic import NameObject, NumberObject
 from reportlab.pdfgen import canvas
 from src.inputs.InputFile import InputFile
+from src.inputs.PdfInputFile import PdfInputFile
 from src.parsers.FileParser import FileParser
 
 
@@ -71,6 +78,174 @@ class TestFileParser(unittest.TestCase):
         self.assertIsInstance(result[0], InputFile)
         self.assertIsInstance(result[1], InputFile)
 
+    def create_multi_page_pdf(self, pdf_file_path, page_count):
+        c = canvas.Canvas(pdf_file_path)
+        for page_num in range(page_count):
+            c.drawString(100, 750, "Page {}".format(page_num + 1))
+            c.showPage()
+        c.save()
+
+    def create_broken_pdf(self, pdf_file_path, page_count, broken_page):
+        # The content of the broken page is not a stream, so extracting its text fails
+        self.create_multi_page_pdf(pdf_file_path, page_count)
+        writer = PyPDF2.PdfWriter()
+        for page in PyPDF2.PdfReader(pdf_file_path).pages:
+            writer.add_page(page)
+        writer.pages[broken_page][NameObject("/Contents")] = NumberObject(0)
+        with open(pdf_file_path, "wb") as f:
+            writer.write(f)
+
+    def test_parse_directory_parallel(self):
+        # Create a PDF spanning several page-range tasks and a corrupt PDF
+        pdf_file_path = os.path.join(self.test_directory, "multi-page.pdf")
+        self.create_multi_page_pdf(pdf_file_path, 40)
+        with open(os.path.join(self.test_directory, "corrupt.pdf"), "w") as f:
+            f.write("This is not a PDF file")
+
+        # Test that pages keep their order and the corrupt file is skipped
+        result = FileParser.parse_directory(self.test_directory, workers=4)
+        self.assertEqual(len(result), 1)
+        pages = result[0].data["pages"]
+        self.assertEqual(len(pages), 40)
+        for page_num, page in enumerate(pages):
+            self.assertIn("Page {}".format(page_num + 1), page)
+
+    def test_process_pool_is_shared(self):
+        executor = FileParser.process_pool(2)
+        self.assertIs(FileParser.process_pool(2), executor)
+        # Workers are never forked from the multithreaded server process
+        self.assertNotEqual(executor._mp_context.get_start_method(), "fork")
+
+    def test_stream_directory(self):
+        # Create a PDF spanning several batches
+        pdf_file_path = os.path.join(self.test_directory, "multi-page.pdf")
+        self.create_multi_page_pdf(pdf_file_path, 40)
+
+        # Test that batches are bounded and slices cover the file in order
+        for workers in (None, 2):
+            slices = []
+            for batch in FileParser.stream_directory(self.test_directory, batch_pages=16, workers=workers):
+                self.assertLessEqual(sum(len(input_file.data["pages"]) for input_file in batch), 16)
+                slices.extend(batch)
+            self.assertEqual([input_file.data["page_offset"] for input_file in slices], [0, 16, 32])
+            self.assertEqual([input_file.data["complete"] for input_file in slices], [False, False, True])
+            pages = [page for input_file in slices for page in input_file.data["pages"]]
+            for page_num, page in enumerate(pages):
+                self.assertIn("Page {}".format(page_num + 1), page)
+
+
+    def test_stream_files_reports_failed_files(self):
+        txt_file_path = os.path.join(self.test_directory, "test.txt")
+        corrupt_file_path = os.path.join(self.test_directory, "corrupt.pdf")
+        with open(txt_file_path, "w") as f:
+            f.write("This is a text file content")
+        with open(corrupt_file_path, "w") as f:
+            f.write("This is not a PDF file")
+
+        errors = {}
+        batches = list(FileParser.stream_files([corrupt_file_path, txt_file_path],
+                                               on_error=lambda file_path, e: errors.update({file_path: e})))
+        self.assertEqual([input_file.name for batch in batches for input_file in batch], ["test.txt"])
+        self.assertEqual(list(errors), [corrupt_file_path])
+
+    def test_stream_files_ends_file_failing_after_first_batch(self):
+        pdf_file_path = os.path.join(self.test_directory, "broken.pdf")
+        self.create_broken_pdf(pdf_file_path, 40, 20)
+
+        for workers in (None, 2):
+            errors = []
+            batches = FileParser.stream_files([pdf_file_path], batch_pages=16, workers=workers,
+                                              on_error=lambda file_path, e: errors.append(file_path))
+            slices = [(input_file.data["page_offset"], len(input_file.data["pages"]), input_file.data["complete"],
+                       input_file.data["failed"]) for batch in batches for input_file in batch]
+            # The slice already yielded is followed by an empty one marking the file as failed
+            self.assertEqual(slices, [(0, 16, False, False), (16, 0, True, True)])
+            self.assertEqual(errors, [pdf_file_path])
+
+    def test_read_zip_archive(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as f:
+            f.writestr("reports/annual.txt", "Annual report")
+            f.writestr("../escape.txt", "Outside the directory")
+            f.writestr("notes.csv", "Unsupported file")
+            f.writestr("__MACOSX/reports/._annual.txt", "Resource fork")
+        archive.seek(0)
+
+        files = FileParser.read_archive(archive, "documents.zip")
+        self.assertEqual([name for name, _ in files], ["annual.txt", "escape.txt"])
+        self.assertEqual(FileParser.parse_file(files[0][1], files[0][0]).data["pages"], ["Annual report"])
+
+    def test_read_tar_archive(self):
+        pdf_file_path = os.path.join(self.test_directory, "test.pdf")
+        self.create_dummy_pdf(pdf_file_path)
+        archive = io.BytesIO()
+        with tarfile.open(fileobj=archive, mode="w:gz") as f:
+            f.add(pdf_file_path, arcname="reports/scan")
+            member = tarfile.TarInfo("image.png")
+            member.size = 16
+            f.addfile(member, io.BytesIO(b"Unsupported file"))
+        archive.seek(0)
+
+        # The PDF is found by its content although it has no extension
+        files = FileParser.read_archive(archive, "documents.tar.gz")
+        self.assertEqual([name for name, _ in files], ["scan"])
+
+        with self.assertRaises(ValueError):
+            FileParser.read_archive(io.BytesIO(b"Not an archive"), "documents.zip")
+
+    def test_parse_content_in_memory(self):
+        pdf_file_path = os.path.join(self.test_directory, "test.pdf")
+        self.create_dummy_pdf(pdf_file_path)
+        with open(pdf_file_path, "rb") as f:
+            content = f.read()
+
+        # PDFs are sniffed from their content, whatever their name or container
+        for source in (content, bytearray(content), memoryview(content), io.BytesIO(content)):
+            result = FileParser.parse_file(source, "upload")
+            self.assertIsInstance(result, PdfInputFile)
+            self.assertEqual(result.name, "upload")
+            self.assertIn("This is a PDF file content", result.data["pages"][0])
+
+        result = FileParser.parse_file(memoryview(b"This is a text file content"), "notes.txt")
+        self.assertEqual(result.data["pages"], ["This is a text file content"])
+        result = FileParser.parse_file(b"This is a text file content", "NOTES.TXT")
+        self.assertEqual(result.data["pages"], ["This is a text file content"])
+        with self.assertRaises(ValueError):
+            FileParser.parse_file(b"%Not a PDF file", "report.pdf")
+
+    def test_stream_files_from_memory(self):
+        pdf_file_path = os.path.join(self.test_directory, "multi-page.pdf")
+        self.create_multi_page_pdf(pdf_file_path, 40)
+        with open(pdf_file_path, "rb") as f:
+            contents = {"uploads/report.pdf": f.read()}
+
+        for workers in (None, 2):
+            slices = [input_file for batch in FileParser.stream_files(list(contents), batch_pages=16, workers=workers,
+                                                                      contents=contents)
+                      for input_file in batch]
+            self.assertEqual([input_file.path for input_file in slices], ["uploads/report.pdf"] * 3)
+            pages = [page for input_file in slices for page in input_file.data["pages"]]
+            self.assertEqual(len(pages), 40)
+            self.assertIn("Page 40", pages[-1])
+
+    def test_pdf_in_memory_is_written_once_for_its_tasks(self):
+        pdf_file_path = os.path.join(self.test_directory, "multi-page.pdf")
+        self.create_multi_page_pdf(pdf_file_path, 40)
+        with open(pdf_file_path, "rb") as f:
+            content = f.read()
+
+        sources = []
+        with ThreadPoolExecutor(2) as executor:
+            submit = executor.submit
+            executor.submit = lambda function, source, *args: sources.append(source) or submit(function, source, *args)
+            pages = list(FileParser.iter_pages(content, executor, name="upload.pdf"))
+
+        # Every task opens the same temporary file, which is removed once the pages are read
+        self.assertEqual(len(pages), 40)
+        self.assertEqual(len(sources), 3)
+        self.assertEqual(len(set(sources)), 1)
+        self.assertIsInstance(sources[0], str)
+        self.assertFalse(os.path.exists(sources[0]))
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,90 @@
+import os
+import tempfile
+import unittest
+import threading
+from src.jobs.DirectoryWatcher import DirectoryWatcher
+from src.jobs.IngestJobQueue import IngestJobQueue, JobStatus
+
+
+class TestIngestJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.jobs = IngestJobQueue()
+
+    def wait_for(self, job_id):
+        finished = threading.Event()
+        self.jobs.submit("Barrier", finished.set)
+        finished.wait(timeout=5)
+        return self.jobs.get(job_id)
+
+    def test_job_result_is_reported(self):
+        job_id = self.jobs.submit("Add numbers", lambda a, b: a + b, 1, 2)
+        job = self.wait_for(job_id)
+        self.assertEqual(job["status"], JobStatus.SUCCEEDED.value)
+        self.assertEqual(job["result"], 3)
+
+    def test_job_error_is_reported(self):
+        def fail():
+            raise ValueError("Unsupported file format")
+
+        job = self.wait_for(self.jobs.submit("Fail", fail))
+        self.assertEqual(job["status"], JobStatus.FAILED.value)
+        self.assertEqual(job["error"], "Unsupported file format")
+
+    def test_untracked_function_runs_after_queued_jobs(self):
+        job_id = self.jobs.submit("Add numbers", lambda a, b: a + b, 1, 2)
+        self.assertEqual(self.jobs.execute(lambda: self.jobs.get(job_id)["status"]).result(timeout=5),
+                         JobStatus.SUCCEEDED.value)
+        self.assertEqual(len(self.jobs._jobs), 1)
+
+    def test_unknown_job(self):
+        self.assertIsNone(self.jobs.get("unknown"))
+
+
+class TestDirectoryWatcher(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.write("existing.txt", "Existing document")
+        self.watcher = DirectoryWatcher([self.directory.name], lambda changed, deleted: None,
+                                        debounce_seconds=5.0, max_delay_seconds=60.0)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, text):
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    def test_existing_files_are_not_reported(self):
+        self.assertIsNone(self.watcher.poll(now=0.0))
+        self.assertIsNone(self.watcher.poll(now=100.0))
+
+    def test_burst_of_files_is_reported_once_after_debounce(self):
+        first = self.write("first.txt", "First document")
+        self.assertIsNone(self.watcher.poll(now=0.0))
+        second = self.write("SECOND.TXT", "Second document")
+        self.write("ignored.csv", "Not a document")
+        self.assertIsNone(self.watcher.poll(now=3.0))
+        self.assertIsNone(self.watcher.poll(now=7.0))
+        changed, deleted = self.watcher.poll(now=8.0)
+        self.assertEqual(sorted(changed), sorted([first, second]))
+        self.assertEqual(deleted, [])
+        self.assertIsNone(self.watcher.poll(now=20.0))
+
+    def test_deleted_files_are_reported(self):
+        os.remove(os.path.join(self.directory.name, "existing.txt"))
+        self.assertIsNone(self.watcher.poll(now=0.0))
+        self.assertEqual(self.watcher.poll(now=5.0), ([], [os.path.join(self.directory.name, "existing.txt")]))
+
+    def test_steady_changes_are_reported_after_max_delay(self):
+        path = self.write("growing.txt", "")
+        for second in range(0, 60, 2):
+            self.write("growing.txt", "x" * (second + 1))
+            self.assertIsNone(self.watcher.poll(now=float(second)))
+        self.write("growing.txt", "done")
+        self.assertEqual(self.watcher.poll(now=60.0), ([path], []))
+
+
+if __name__ == '__main__':
+    unittest.main()
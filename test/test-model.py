@@ -1,8 +1,14 @@
+import asyncio
 import unittest
 import os
+import tempfile
+import threading
+import time
+from src.model.LlamaCppLanguageModel import LlamaCppLanguageModel
 from src.model.QuestionAnswerModel import QuestionAnswerModel, EmbeddingsOptions, ChainOptions, \
     LanguageModelOptions
 from src.parsers.FileParser import FileParser
+from src.storage.IngestManifest import IngestManifest
 from src.storage.VectorStore import VectorStoreOptions
 from src.cfg.logging_config import *
 from src.cfg.config import *
@@ -45,5 +51,148 @@ class TestQuestionAnswerModel(unittest.TestCase):
         logger.info("Answer: {}", answer)
 
 
+class TestOfflineQuestionAnswerModel(unittest.TestCase):
+    def setUp(self):
+        self.model = QuestionAnswerModel(EmbeddingsOptions.HASHING, ChainOptions.DEFAULT, VectorStoreOptions.NUMPY,
+                                         LanguageModelOptions.FAKE, language_model_config={"response": "16%"})
+        self.directory = tempfile.TemporaryDirectory()
+        with open(os.path.join(self.directory.name, "report.txt"), "w") as file:
+            file.write("Bumble revenue grew 16% in 2023. The office moved to Austin.")
+        self.model.ingest_directory(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_ask_question_without_network(self):
+        self.assertEqual(self.model.ask("How much did Bumble revenue grow?"), "16%")
+        self.assertEqual("".join(self.model.ask_stream("How did the office move?")), "16%")
+        self.assertEqual(self.model.chain.retriever.invoke("revenue")[0].metadata["title"], "report.txt")
+
+    def test_ask_many_questions_in_order(self):
+        questions = ["How much did Bumble revenue grow?", "Where did the office move?",
+                     "How much did Bumble revenue grow?"]
+
+        self.assertEqual(self.model.ask_many(questions, max_concurrency=2), ["16%", "16%", "16%"])
+        self.assertEqual(asyncio.run(self.model.aask_many(questions[:2])), ["16%", "16%"])
+        self.assertEqual(self.model.ask_many([]), [])
+
+    def test_reclaim_is_handed_to_background(self):
+        queued = []
+        model = QuestionAnswerModel(EmbeddingsOptions.HASHING, ChainOptions.DEFAULT, VectorStoreOptions.NUMPY,
+                                    LanguageModelOptions.FAKE, run_in_background=queued.append)
+        model.ingest_directory(self.directory.name)
+        with model.read_snapshot():
+            with open(os.path.join(self.directory.name, "report.txt"), "w") as file:
+                file.write("Bumble revenue grew 22% in 2024.")
+            model.ingest_directory(self.directory.name)
+        self.assertEqual(queued, [model._reclaim])
+        self.assertEqual(len(model._pending_reclaim), 1)
+
+        queued[0]()
+        self.assertEqual(model._pending_reclaim, [])
+
+    def test_file_spanning_batches_is_published_whole(self):
+        file_path = os.path.join(self.directory.name, "long.txt")
+        with open(file_path, "w") as file:
+            file.write(" ".join(["Alpha revenue grew in {}.".format(year) for year in range(1000)]))
+        self.model.ingest_directory(self.directory.name)
+
+        with open(file_path, "w") as file:
+            file.write(" ".join(["Omega revenue fell in {}.".format(year) for year in range(1000)]))
+        visible = []
+
+        def on_progress(files_done, files_total):
+            with self.model.read_snapshot() as snapshot:
+                visible.append(tuple(len(self.model.vector_store.keyword_search(term, 1000, snapshot.epoch)) > 0
+                                     for term in ("alpha", "omega")))
+
+        self.model.ingest_directory(self.directory.name, batch_pages=1, on_progress=on_progress)
+        # The old content stays visible while the new slices are written, and is replaced at once
+        self.assertGreater(visible.count((True, False)), 3)
+        self.assertEqual(visible, sorted(visible, reverse=True))
+        self.assertEqual(set(visible), {(True, False), (False, True)})
+
+    def test_files_deleted_before_ingest_are_removed(self):
+        file_path = os.path.join(self.directory.name, "notes.txt")
+        with open(file_path, "w") as file:
+            file.write("A second office opened in Denver.")
+        self.model.ingest_directory(self.directory.name)
+        self.assertEqual(len(self.model.list_documents()), 2)
+
+        os.remove(file_path)
+        self.model.ingest_directory(self.directory.name)
+        self.assertEqual([document["path"] for document in self.model.list_documents()],
+                         [os.path.join(self.directory.name, "report.txt")])
+        self.assertEqual(self.model.vector_store.keyword_search("denver", 4, self.model.vector_store.published_epoch),
+                         [])
+
+    def test_deleted_document_file_is_kept_but_not_added_back(self):
+        file_path = os.path.join(self.directory.name, "report.txt")
+        self.assertTrue(self.model.delete_document(IngestManifest.document_id(file_path)))
+        self.model.ingest_directory(self.directory.name)
+        self.model.sync_files([file_path], [])
+
+        self.assertTrue(os.path.isfile(file_path))
+        self.assertEqual(self.model.list_documents(), [])
+
+        self.assertEqual(self.model.add_files([file_path])[0]["status"], "added")
+        self.assertFalse(self.model.vector_store.manifest.is_detached(file_path))
+
+    def test_replaced_document_keeps_file_on_disk(self):
+        file_path = os.path.join(self.directory.name, "report.txt")
+        content = b"Bumble revenue grew 22% in 2024."
+        self.assertEqual(self.model.add_files([file_path], contents={file_path: content})[0]["status"], "added")
+        self.model.ingest_directory(self.directory.name)
+        self.model.sync_files([], [file_path])
+
+        with open(file_path, "r") as file:
+            self.assertEqual(file.read(), "Bumble revenue grew 16% in 2023. The office moved to Austin.")
+        self.assertEqual(self.model.chain.retriever.invoke("revenue")[0].page_content, content.decode())
+
+    def test_backends_are_loaded_once(self):
+        model = QuestionAnswerModel(EmbeddingsOptions.HASHING, ChainOptions.DEFAULT, VectorStoreOptions.NUMPY,
+                                    LanguageModelOptions.FAKE, language_model_config={"response": "16%"})
+
+        self.assertIs(model.embeddings.embeddings, self.model.embeddings.embeddings)
+        self.assertIs(model.language_model, self.model.language_model)
+
+
+class SingleContextClient:
+    """
+    Stands in for a loaded llama.cpp model, which must not generate for two prompts at once.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.overlapped = False
+
+    def __call__(self, prompt, stream, **params):
+        if not self.lock.acquire(blocking=False):
+            self.overlapped = True
+            self.lock.acquire()
+        try:
+            for token in prompt.split():
+                time.sleep(0.01)
+                yield {"choices": [{"text": token + " "}]}
+        finally:
+            self.lock.release()
+
+
+class TestLlamaCppLanguageModel(unittest.TestCase):
+    def test_concurrent_streams_are_serialized(self):
+        client = SingleContextClient()
+        language_model = LlamaCppLanguageModel.construct(client=client, model_path="model.gguf")
+
+        async def collect(prompt):
+            return "".join([token async for token in language_model.astream(prompt)])
+
+        async def stream_both():
+            return await asyncio.gather(collect("one two three"), collect("four five six"))
+
+        self.assertEqual(asyncio.run(stream_both()), ["one two three ", "four five six "])
+        self.assertFalse(client.overlapped)
+        self.assertEqual("".join(language_model.stream("seven eight")), "seven eight ")
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+from langchain_core.documents import Document
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from src.inputs.TextInputFile import TextInputFile
+from src.rerankers.LexicalReranker import LexicalReranker
+from src.rerankers.Reranker import Reranker, RerankerOptions
+from src.rerankers.RerankingRetriever import RerankingRetriever
+from src.storage.NumpyVectorStore import NumpyVectorStore
+from src.storage.TitleIndex import ChunkFilter
+
+
+class TestLexicalReranker(unittest.TestCase):
+    def setUp(self):
+        self.reranker = LexicalReranker()
+
+    def test_chunks_matching_the_whole_query_come_first(self):
+        docs = [Document(page_content=text, metadata={"title": "report.txt"}) for text in (
+            "Revenue was discussed at length by the board.",
+            "Paying users grew while total revenue stayed flat.",
+            "Total paying users grew 16% in the fourth quarter.",
+        )]
+        reranked = self.reranker.rerank("How many paying users grew?", docs, 2)
+        self.assertEqual([doc.page_content for doc in reranked], [docs[2].page_content, docs[1].page_content])
+        self.assertGreater(reranked[0].metadata["rerank_score"], reranked[1].metadata["rerank_score"])
+        self.assertEqual(reranked[0].metadata["title"], "report.txt")
+        self.assertNotIn("rerank_score", docs[2].metadata)
+
+    def test_ties_keep_the_retrieved_order(self):
+        docs = [Document(page_content=text) for text in ("First chunk.", "Second chunk.", "Third chunk.")]
+        self.assertEqual(self.reranker.rerank("unrelated", docs, 3), self.reranker.rerank("", docs, 3))
+        self.assertEqual([doc.page_content for doc in self.reranker.rerank("", docs, 2)],
+                         ["First chunk.", "Second chunk."])
+        self.assertEqual(self.reranker.rerank("revenue", [], 4), [])
+
+    def test_reranker_is_shared_across_calls(self):
+        reranker = Reranker.get(RerankerOptions.DEFAULT)
+        self.assertIs(Reranker.get(RerankerOptions.DEFAULT), reranker)
+        self.assertIsInstance(Reranker.get(RerankerOptions.LEXICAL), LexicalReranker)
+        with self.assertRaises(ValueError):
+            Reranker.get(RerankerOptions.NONE)
+
+
+class TestRerankingRetriever(unittest.TestCase):
+    def setUp(self):
+        self.store = NumpyVectorStore(DeterministicFakeEmbedding(size=16))
+        self.store.add_documents([
+            TextInputFile(name="a.txt", path="a.txt", pages=["Revenue grew 16% in 2023.", "Paying users grew 4%."]),
+            TextInputFile(name="b.txt", path="b.txt", pages=["Revenue fell in 2022.", "The office moved."]),
+        ])
+
+    def test_candidates_are_reranked_to_k(self):
+        retriever = RerankingRetriever(retriever=self.store.as_retriever().copy(update={"k": 20}),
+                                       reranker=LexicalReranker(), k=2)
+        docs = retriever.invoke("revenue grew in 2023")
+        self.assertEqual(len(docs), 2)
+        self.assertEqual(docs[0].page_content, "Revenue grew 16% in 2023.")
+
+    def test_chunk_filter_is_applied_to_candidates(self):
+        retriever = RerankingRetriever(retriever=self.store.as_retriever().copy(update={"k": 20}),
+                                       reranker=LexicalReranker(), k=4)
+        filtered = retriever.copy(update={"chunk_filter": ChunkFilter(("b.txt",))})
+        self.assertEqual({doc.metadata["title"] for doc in filtered.invoke("revenue")}, {"b.txt"})
+
+
+if __name__ == '__main__':
+    unittest.main()
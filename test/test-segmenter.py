@@ -0,0 +1,24 @@
+import unittest
+from src.segmenters.RegexSentenceSegmenter import RegexSentenceSegmenter
+from src.segmenters.SentenceSegmenter import SentenceSegmenter, SentenceSegmenterOptions
+
+
+class TestSentenceSegmenter(unittest.TestCase):
+    def test_regex_segmenter_splits_sentences(self):
+        text = "Revenue grew 16.3% to $1.05 billion. Did users grow? \"Yes,\" Mr. Jones said! See U.S. filings."
+        self.assertEqual(RegexSentenceSegmenter().tokenize(text), [
+            "Revenue grew 16.3% to $1.05 billion.",
+            "Did users grow?",
+            "\"Yes,\" Mr. Jones said!",
+            "See U.S. filings.",
+        ])
+
+    def test_segmenter_is_shared_across_calls(self):
+        segmenter = SentenceSegmenter.get()
+        self.assertIs(SentenceSegmenter.get(), segmenter)
+        self.assertIsInstance(SentenceSegmenter.get(SentenceSegmenterOptions.REGEX), RegexSentenceSegmenter)
+        self.assertEqual(segmenter.tokenize("One sentence. Another one."), ["One sentence.", "Another one."])
+
+
+if __name__ == '__main__':
+    unittest.main()
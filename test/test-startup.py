@@ -0,0 +1,58 @@
+import os
+import subprocess
+import sys
+import threading
+import unittest
+from src.jobs.StartupTask import StartupStage, StartupTask
+
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestStartup(unittest.TestCase):
+    def test_app_imports_heavy_modules_lazily(self):
+        # Importing app.py must not load the model backends, so the server binds before they are imported
+        heavy_modules = ["langchain", "langchain_openai", "langchain_community", "chromadb", "PyPDF2", "nltk"]
+        script = "import sys, app; print(','.join(m for m in {} if m in sys.modules))".format(heavy_modules)
+        result = subprocess.run([sys.executable, "-c", script], cwd=REPOSITORY_DIRECTORY, capture_output=True,
+                                text=True, env=dict(os.environ, PYTHONPATH=REPOSITORY_DIRECTORY))
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), "")
+
+
+class TestStartupTask(unittest.TestCase):
+    def test_progress_is_reported_until_ready(self):
+        ingesting, finish = threading.Event(), threading.Event()
+
+        def start_up(task):
+            task.set_stage(StartupStage.INGESTING)
+            task.set_progress(files_done=1, files_total=2)
+            ingesting.set()
+            finish.wait(timeout=5)
+
+        startup = StartupTask(start_up)
+        self.assertEqual(startup.status()["stage"], StartupStage.STARTING.value)
+        startup.start()
+        ingesting.wait(timeout=5)
+        status = startup.status()
+        self.assertFalse(startup.is_ready)
+        self.assertEqual(status["stage"], StartupStage.INGESTING.value)
+        self.assertEqual(status["progress"], {"files_done": 1, "files_total": 2})
+
+        finish.set()
+        self.assertTrue(startup.wait(timeout=5))
+        self.assertEqual(startup.status()["stage"], StartupStage.READY.value)
+
+    def test_error_is_reported(self):
+        def start_up(task):
+            task.set_stage(StartupStage.LOADING_MODEL)
+            raise ValueError("Invalid API key")
+
+        startup = StartupTask(start_up)
+        startup.start()
+        self.assertFalse(startup.wait(timeout=5))
+        self.assertEqual(startup.status()["stage"], StartupStage.FAILED.value)
+        self.assertEqual(startup.status()["error"], "Invalid API key")
+
+
+if __name__ == '__main__':
+    unittest.main()
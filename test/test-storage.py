@@ -0,0 +1,701 @@
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+import numpy as np
+import PyPDF2
+from PyPDF2.generic import NameObject, NumberObject
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from reportlab.pdfgen import canvas
+from src.parsers.FileParser import FileParser
+from src.inputs.TextInputFile import TextInputFile
+from chromadb.telemetry import Telemetry
+from src.storage.ChromaVectorStore import ChromaVectorStore, OfflineTelemetry
+from src.storage.HnswVectorStore import HnswVectorStore
+from src.storage.IngestManifest import IngestManifest
+from src.storage.KeywordIndex import KeywordIndex
+from src.storage.NumpyVectorStore import NumpyVectorStore, QuantizationOptions
+from src.storage.TitleIndex import ChunkFilter
+
+
+# DeterministicFakeEmbedding seeds NumPy's global random state, so concurrent batches must not interleave
+EMBEDDING_LOCK = threading.Lock()
+
+
+class SerializedEmbeddings(DeterministicFakeEmbedding):
+    def embed_documents(self, texts):
+        with EMBEDDING_LOCK:
+            return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        with EMBEDDING_LOCK:
+            return super().embed_query(text)
+
+
+class CountingEmbeddings(SerializedEmbeddings):
+    embedded: list = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return super().embed_documents(texts)
+
+
+class FailingEmbeddings(SerializedEmbeddings):
+    fail: bool = False
+
+    def embed_documents(self, texts):
+        if self.fail:
+            raise ValueError("Embedding backend failed")
+        return super().embed_documents(texts)
+
+
+class TestChromaVectorStore(unittest.TestCase):
+    def setUp(self):
+        # Chroma writes persisted collections again at interpreter exit, so keep them out of the tree
+        self.test_directory = tempfile.mkdtemp()
+        self.persist_directory = os.path.join(self.test_directory, "vector_store")
+        os.makedirs(self.test_directory, exist_ok=True)
+        self.embeddings = SerializedEmbeddings(size=16)
+
+    def tearDown(self):
+        if os.path.exists(self.test_directory):
+            shutil.rmtree(self.test_directory)
+
+    def create_dummy_pdf(self, file_name, content):
+        pdf_file_path = os.path.join(self.test_directory, file_name)
+        c = canvas.Canvas(pdf_file_path)
+        c.drawString(100, 750, content)
+        c.save()
+        return pdf_file_path
+
+    def test_persisted_documents_are_current_after_reopen(self):
+        pdf_file_path = self.create_dummy_pdf("test.pdf", "This is a PDF file content.")
+
+        store = ChromaVectorStore(self.embeddings, self.persist_directory)
+        self.assertFalse(store.is_document_current(pdf_file_path))
+        store.add_document(FileParser.parse_file(pdf_file_path))
+        self.assertTrue(store.is_document_current(pdf_file_path))
+
+        # Reopening the store keeps both the collection and the manifest
+        reopened = ChromaVectorStore(self.embeddings, self.persist_directory)
+        self.assertTrue(reopened.is_document_current(pdf_file_path))
+        self.assertEqual(reopened.vector_store._collection.count(), 1)
+
+    def test_changed_document_replaces_stale_chunks(self):
+        pdf_file_path = self.create_dummy_pdf("test.pdf", "This is a PDF file content.")
+        store = ChromaVectorStore(self.embeddings, self.persist_directory)
+        store.add_document(FileParser.parse_file(pdf_file_path))
+
+        self.create_dummy_pdf("test.pdf", "This is the changed PDF file content.")
+        self.assertFalse(store.is_document_current(pdf_file_path))
+        store.add_document(FileParser.parse_file(pdf_file_path))
+        self.assertTrue(store.is_document_current(pdf_file_path))
+        self.assertEqual(store.vector_store._collection.count(), 1)
+
+    def test_deleted_document_is_removed_by_id(self):
+        first_file_path = self.create_dummy_pdf("first.pdf", "This is the first PDF file content.")
+        second_file_path = self.create_dummy_pdf("second.pdf", "This is the second PDF file content.")
+        store = ChromaVectorStore(self.embeddings, self.persist_directory)
+        store.add_documents([FileParser.parse_file(first_file_path), FileParser.parse_file(second_file_path)])
+
+        self.assertFalse(store.delete_document("unknown"))
+        self.assertTrue(store.delete_document(IngestManifest.document_id(first_file_path)))
+        self.assertEqual(store.vector_store._collection.count(), 1)
+        reopened = ChromaVectorStore(self.embeddings, self.persist_directory)
+        self.assertEqual(list(reopened.manifest.entries), [second_file_path])
+        self.assertEqual([doc.page_content.strip() for doc in reopened.as_retriever().invoke("PDF")],
+                         ["This is the second PDF file content."])
+
+    def create_multi_page_pdf(self, pdf_file_path, content, page_count):
+        c = canvas.Canvas(pdf_file_path)
+        for page_num in range(page_count):
+            c.drawString(100, 750, content.format(page_num + 1))
+            c.showPage()
+        c.save()
+
+    def test_streamed_document_is_recorded_once_complete(self):
+        pdf_file_path = os.path.join(self.test_directory, "multi-page.pdf")
+        self.create_multi_page_pdf(pdf_file_path, "Page {}", 10)
+
+        store = ChromaVectorStore(self.embeddings, self.persist_directory)
+        for batch in FileParser.stream_directory(self.test_directory, batch_pages=4):
+            self.assertFalse(store.is_document_current(pdf_file_path))
+            store.add_documents(batch)
+        self.assertTrue(store.is_document_current(pdf_file_path))
+
+        page_numbers = sorted(metadata["page_number"] for metadata in store.vector_store.get()["metadatas"])
+        self.assertEqual(page_numbers, list(range(1, 11)))
+
+    def test_failed_write_keeps_stored_chunks(self):
+        embeddings = FailingEmbeddings(size=16)
+        pdf_file_path = self.create_dummy_pdf("test.pdf", "This is a PDF file content.")
+        store = ChromaVectorStore(embeddings, self.persist_directory)
+        store.add_document(FileParser.parse_file(pdf_file_path))
+        stored_ids = store.manifest.get_ids(pdf_file_path)
+
+        self.create_dummy_pdf("test.pdf", "This is the changed PDF file content.")
+        embeddings.fail = True
+        with self.assertRaises(ValueError):
+            store.add_document(FileParser.parse_file(pdf_file_path))
+        store.abort_pending()
+        embeddings.fail = False
+        store.add_document(TextInputFile(name="other.txt", path="other.txt", pages=["Another document."]))
+
+        self.assertEqual(store.manifest.get_ids(pdf_file_path), stored_ids)
+        self.assertEqual(len(store.get_chunks(stored_ids, store.published_epoch)), len(stored_ids))
+
+    def test_chunks_of_document_failing_after_first_batch_are_dropped(self):
+        pdf_file_path = os.path.join(self.test_directory, "multi-page.pdf")
+        self.create_multi_page_pdf(pdf_file_path, "Page {}", 10)
+        store = ChromaVectorStore(self.embeddings, self.persist_directory)
+        for batch in FileParser.stream_files([pdf_file_path], batch_pages=4):
+            store.add_documents(batch)
+        stored_ids = store.manifest.get_ids(pdf_file_path)
+
+        # The changed file fails to parse after its first batch was stored, so its stored chunks are kept
+        self.create_multi_page_pdf(pdf_file_path, "Revised page {}", 10)
+        writer = PyPDF2.PdfWriter()
+        for page in PyPDF2.PdfReader(pdf_file_path).pages:
+            writer.add_page(page)
+        writer.pages[6][NameObject("/Contents")] = NumberObject(0)
+        with open(pdf_file_path, "wb") as f:
+            writer.write(f)
+        for batch in FileParser.stream_files([pdf_file_path], batch_pages=4):
+            store.add_documents(batch)
+
+        self.assertEqual(store.pending_ids, {})
+        self.assertEqual(store.manifest.get_ids(pdf_file_path), stored_ids)
+        self.assertEqual(sorted(store.vector_store.get()["ids"]), sorted(stored_ids))
+        self.assertFalse(any("Revised" in doc.page_content for doc in store.as_retriever().invoke("Revised page")))
+
+    def test_retriever_sees_only_published_chunks(self):
+        first_file_path = self.create_dummy_pdf("first.pdf", "This is the first PDF file content.")
+        second_file_path = self.create_dummy_pdf("second.pdf", "This is the second PDF file content.")
+        store = ChromaVectorStore(self.embeddings, self.persist_directory)
+        store.add_document(FileParser.parse_file(first_file_path))
+        retriever = store.as_retriever()
+
+        store.add_document(FileParser.parse_file(second_file_path))
+        self.assertEqual(len(retriever.invoke("PDF file content")), 1)
+        self.assertEqual(len(store.as_retriever().invoke("PDF file content")), 2)
+
+    def test_deferred_reclaim_keeps_superseded_chunks(self):
+        pdf_file_path = self.create_dummy_pdf("test.pdf", "This is a PDF file content.")
+        store = ChromaVectorStore(self.embeddings, self.persist_directory)
+        store.defer_reclaim = True
+        store.add_document(FileParser.parse_file(pdf_file_path))
+        self.assertEqual(store.publish(), [])
+
+        self.create_dummy_pdf("test.pdf", "This is the changed PDF file content.")
+        retriever = store.as_retriever()
+        store.add_document(FileParser.parse_file(pdf_file_path))
+        self.assertEqual(store.vector_store._collection.count(), 2)
+        superseded_ids = store.publish()
+        self.assertEqual([doc.page_content.strip() for doc in retriever.invoke("PDF")], ["This is a PDF file content."])
+        self.assertEqual([doc.page_content.strip() for doc in store.as_retriever().invoke("PDF")],
+                         ["This is the changed PDF file content."])
+        self.assertEqual(len(superseded_ids), 1)
+
+        store.reclaim(superseded_ids)
+        self.assertEqual(store.vector_store._collection.count(), 1)
+
+    def test_superseded_chunks_are_reclaimed_on_reopen(self):
+        pdf_file_path = self.create_dummy_pdf("test.pdf", "This is a PDF file content.")
+        store = ChromaVectorStore(self.embeddings, self.persist_directory)
+        store.defer_reclaim = True
+        store.add_document(FileParser.parse_file(pdf_file_path))
+        self.create_dummy_pdf("test.pdf", "This is the changed PDF file content.")
+        store.add_document(FileParser.parse_file(pdf_file_path))
+        self.assertEqual(len(store.publish()), 1)
+
+        reopened = ChromaVectorStore(self.embeddings, self.persist_directory)
+        self.assertEqual(reopened.vector_store._collection.count(), 1)
+        self.assertEqual([doc.page_content.strip() for doc in reopened.as_retriever().invoke("PDF")],
+                         ["This is the changed PDF file content."])
+        self.assertEqual(reopened.keyword_index.count(), 1)
+
+    def test_in_memory_store_is_never_current(self):
+        pdf_file_path = self.create_dummy_pdf("test.pdf", "This is a PDF file content.")
+        store = ChromaVectorStore(self.embeddings)
+        store.add_document(FileParser.parse_file(pdf_file_path))
+        self.assertFalse(store.is_document_current(pdf_file_path))
+
+    def test_telemetry_is_never_sent(self):
+        for store in (ChromaVectorStore(self.embeddings), ChromaVectorStore(self.embeddings, self.persist_directory)):
+            system = store.vector_store._client._system
+            self.assertFalse(system.settings.anonymized_telemetry)
+            self.assertIsInstance(system.instance(Telemetry), OfflineTelemetry)
+
+    def test_keyword_search_sees_only_published_chunks(self):
+        pdf_file_path = self.create_dummy_pdf("test.pdf", "The company filed an 8-K in 4Q23.")
+        store = ChromaVectorStore(self.embeddings, self.persist_directory)
+        store.defer_reclaim = True
+        store.add_document(FileParser.parse_file(pdf_file_path))
+        epoch = store.published_epoch
+        self.assertEqual(store.keyword_search("8-K", 4, epoch), [])
+
+        store.publish()
+        self.assertEqual([doc.page_content.strip() for doc in store.keyword_search("8-K", 4, store.published_epoch)],
+                         ["The company filed an 8-K in 4Q23."])
+        reopened = ChromaVectorStore(self.embeddings, self.persist_directory)
+        self.assertEqual(len(reopened.keyword_search("4Q23", 4, reopened.published_epoch)), 1)
+
+    def test_filtered_search_is_restricted_to_titles_and_pages(self):
+        store = ChromaVectorStore(self.embeddings, self.persist_directory)
+        for title in ("a.txt", "b.txt"):
+            store.add_document(TextInputFile(name=title, path=title,
+                                             pages=["Page number {}.".format(page) for page in range(10)]))
+
+        chunk_filter = ChunkFilter(titles=("b.txt",), first_page=3, last_page=6)
+        for opened in (store, ChromaVectorStore(self.embeddings, self.persist_directory)):
+            docs = opened.as_retriever().copy(update={"chunk_filter": chunk_filter}).invoke("Page number 4.")
+            self.assertEqual(docs[0].metadata["page_number"], 5)
+            self.assertTrue(all(doc.metadata["title"] == "b.txt" and 3 <= doc.metadata["page_number"] <= 6
+                                for doc in docs))
+            self.assertEqual(opened.search("Page number 4.", 4, opened.published_epoch, ChunkFilter(("c.txt",))), [])
+
+    def test_filtered_search_ranks_as_unfiltered_search(self):
+        store = ChromaVectorStore(self.embeddings)
+        store.add_document(TextInputFile(name="a.txt", path="a.txt",
+                                         pages=["Page number {}.".format(page) for page in range(20)]))
+
+        # A filter passing every chunk leaves the ranking by the collection's distance unchanged
+        for query in ("Page number 4.", "Page number 17.", "Unrelated query."):
+            self.assertEqual(store.search(query, 8, store.published_epoch, ChunkFilter(("a.txt",))),
+                             store.search(query, 8, store.published_epoch))
+
+    def test_batched_search_matches_single_searches(self):
+        store = ChromaVectorStore(self.embeddings)
+        store.add_document(TextInputFile(name="a.txt", path="a.txt",
+                                         pages=["Page number {}.".format(page) for page in range(10)]))
+        epoch = store.published_epoch
+        store.add_document(TextInputFile(name="b.txt", path="b.txt",
+                                         pages=["Page number {} of b.".format(page) for page in range(10)]))
+        queries = ["Page number 4.", "Page number 8.", "number 8 of b"]
+
+        for search_epoch in (epoch, store.published_epoch):
+            for chunk_filter in (None, ChunkFilter(titles=("a.txt",), last_page=6)):
+                self.assertEqual(store.search_many(queries, 4, search_epoch, chunk_filter),
+                                 [store.search(query, 4, search_epoch, chunk_filter) for query in queries])
+                self.assertEqual(store.keyword_search_many(queries, 4, search_epoch, chunk_filter),
+                                 [store.keyword_search(query, 4, search_epoch, chunk_filter) for query in queries])
+        retriever = store.as_retriever()
+        self.assertEqual(retriever.retrieve_many(queries), [retriever.invoke(query) for query in queries])
+
+
+class TestNumpyVectorStore(unittest.TestCase):
+    def setUp(self):
+        self.test_directory = tempfile.mkdtemp()
+        self.persist_directory = os.path.join(self.test_directory, "vector_store")
+        self.embeddings = SerializedEmbeddings(size=16)
+
+    def tearDown(self):
+        if os.path.exists(self.test_directory):
+            shutil.rmtree(self.test_directory)
+
+    def create_text_file(self, file_name, content):
+        text_file_path = os.path.join(self.test_directory, file_name)
+        with open(text_file_path, "w") as file:
+            file.write(content)
+        return text_file_path
+
+    def test_most_similar_chunks_are_retrieved_first(self):
+        store = NumpyVectorStore(self.embeddings)
+        pages = ["Page number {}.".format(page_number) for page_number in range(20)]
+        store.add_document(TextInputFile(name="pages.txt", path="pages.txt", pages=pages))
+
+        docs = store.as_retriever().invoke("Page number 7.")
+        self.assertEqual(len(docs), 4)
+        self.assertEqual(docs[0].page_content, "Page number 7.")
+        self.assertEqual(docs[0].metadata, {"title": "pages.txt", "page_number": 8})
+
+    def test_hybrid_retriever_finds_exact_terms(self):
+        store = NumpyVectorStore(self.embeddings)
+        pages = ["Quarterly report number {}.".format(page_number) for page_number in range(20)]
+        pages[13] = "Form 8-K filed for 4Q23."
+        store.add_document(TextInputFile(name="pages.txt", path="pages.txt", pages=pages))
+
+        self.assertEqual([doc.page_content for doc in store.keyword_search("8-K 4Q23", 4, store.published_epoch)],
+                         ["Form 8-K filed for 4Q23."])
+        self.assertIn("Form 8-K filed for 4Q23.",
+                      [doc.page_content for doc in store.as_retriever().invoke("What did the 8-K say?")])
+
+    def test_filtered_search_is_restricted_to_titles_and_pages(self):
+        store = NumpyVectorStore(self.embeddings)
+        for title in ("a.txt", "b.txt", "c.txt"):
+            store.add_document(TextInputFile(name=title, path=title,
+                                             pages=["Page number {}.".format(page) for page in range(20)]))
+
+        docs = store.search("Page number 7.", 4, store.published_epoch, ChunkFilter(titles=("b.txt", "c.txt")))
+        self.assertEqual([doc.metadata["page_number"] for doc in docs[:2]], [8, 8])
+        self.assertEqual({doc.metadata["title"] for doc in docs[:2]}, {"b.txt", "c.txt"})
+
+        chunk_filter = ChunkFilter(titles=("a.txt",), first_page=10)
+        retriever = store.as_retriever().copy(update={"chunk_filter": chunk_filter})
+        docs = retriever.invoke("Page number 7.")
+        self.assertEqual(len(docs), 4)
+        self.assertTrue(all(doc.metadata["title"] == "a.txt" and doc.metadata["page_number"] >= 10 for doc in docs))
+        self.assertEqual(store.keyword_search("number 15", 1, store.published_epoch)[0].page_content, "Page number 15.")
+        docs = store.keyword_search("number 15", 4, store.published_epoch, ChunkFilter(("a.txt",), last_page=3))
+        self.assertEqual(sorted(doc.page_content for doc in docs),
+                         ["Page number 0.", "Page number 1.", "Page number 2."])
+
+    def test_title_index_follows_changed_documents(self):
+        text_file_path = self.create_text_file("test.txt", "This is a text file content.")
+        store = NumpyVectorStore(self.embeddings, self.persist_directory)
+        store.add_document(FileParser.parse_file(text_file_path))
+        self.create_text_file("test.txt", "This is the changed text file content.")
+        store.add_document(FileParser.parse_file(text_file_path))
+
+        chunk_filter = ChunkFilter(titles=("test.txt",))
+        for opened in (store, NumpyVectorStore(self.embeddings, self.persist_directory)):
+            self.assertEqual(len(opened.title_index.lookup(chunk_filter)), 1)
+            self.assertEqual([doc.page_content for doc in opened.search("text", 4, opened.published_epoch,
+                                                                         chunk_filter)],
+                             ["This is the changed text file content."])
+
+    def test_quantized_search_rescores_full_vectors(self):
+        pages = ["Page number {}.".format(page_number) for page_number in range(200)]
+        exact = NumpyVectorStore(self.embeddings)
+        exact.add_document(TextInputFile(name="pages.txt", path="pages.txt", pages=pages))
+        quantized = NumpyVectorStore(self.embeddings, self.persist_directory, quantization=QuantizationOptions.INT8,
+                                     rescore_candidates=16)
+        quantized.add_document(TextInputFile(name="pages.txt", path="pages.txt", pages=pages))
+
+        for store in (quantized, NumpyVectorStore(self.embeddings, self.persist_directory, quantization="int8")):
+            self.assertEqual(store._rows.codes.dtype, np.int8)
+            for query in ("Page number 7.", "Page number 123."):
+                self.assertEqual([doc.page_content for doc in store.as_retriever().invoke(query)],
+                                 [doc.page_content for doc in exact.as_retriever().invoke(query)])
+
+    def test_batched_search_matches_single_searches(self):
+        pages = ["Page number {}.".format(page_number) for page_number in range(200)]
+        queries = ["Page number 7.", "Page number 123.", "Page number 7."]
+        exact = NumpyVectorStore(self.embeddings)
+        quantized = NumpyVectorStore(self.embeddings, quantization="int8", rescore_candidates=16)
+        for store in (exact, quantized):
+            store.add_document(TextInputFile(name="pages.txt", path="pages.txt", pages=pages))
+            for chunk_filter in (None, ChunkFilter(titles=("pages.txt",), first_page=100)):
+                results = store.search_many(queries, 4, store.published_epoch, chunk_filter)
+                self.assertEqual(results, [store.search(query, 4, store.published_epoch, chunk_filter)
+                                           for query in queries])
+            # Chunks found by several queries are shared by their results
+            self.assertIs(results[0][0], results[2][0])
+            retriever = store.as_retriever()
+            self.assertEqual(retriever.retrieve_many(queries), [retriever.invoke(query) for query in queries])
+        self.assertEqual(exact.search_many([], 4, exact.published_epoch), [])
+
+    def test_epochs_resume_after_persisted_ones(self):
+        store = NumpyVectorStore(self.embeddings, self.persist_directory)
+        store.add_document(TextInputFile(name="a.txt", path="a.txt", pages=["First page."]))
+        store.add_document(TextInputFile(name="b.txt", path="b.txt", pages=["Second page."]))
+        # Chunks written while the clock was ahead, e.g. by a store using timestamps as epochs
+        store._rows.epochs[:, 0] += 10 ** 15
+        store._flush()
+
+        reopened = NumpyVectorStore(self.embeddings, self.persist_directory)
+        self.assertEqual(reopened.published_epoch, store.published_epoch + 10 ** 15)
+        reopened.add_document(TextInputFile(name="c.txt", path="c.txt", pages=["Third page."]))
+        self.assertEqual(sorted(doc.page_content for doc in reopened.as_retriever().invoke("page")),
+                         ["First page.", "Second page.", "Third page."])
+
+    def test_quantization_can_be_turned_on_for_a_persisted_store(self):
+        store = NumpyVectorStore(self.embeddings, self.persist_directory)
+        store.add_document(TextInputFile(name="a.txt", path="a.txt", pages=["First page.", "Second page."]))
+
+        quantized = NumpyVectorStore(self.embeddings, self.persist_directory, quantization="int8")
+        quantized.add_document(TextInputFile(name="b.txt", path="b.txt", pages=["Third page."]))
+        self.assertEqual(len(quantized._rows.codes), 3)
+        self.assertEqual(quantized.as_retriever().invoke("Second page.")[0].page_content, "Second page.")
+
+    def test_persisted_documents_are_current_after_reopen(self):
+        text_file_path = self.create_text_file("test.txt", "This is a text file content.")
+        store = NumpyVectorStore(self.embeddings, self.persist_directory)
+        store.add_document(FileParser.parse_file(text_file_path))
+        self.assertTrue(store.is_document_current(text_file_path))
+
+        reopened = NumpyVectorStore(self.embeddings, self.persist_directory)
+        self.assertTrue(reopened.is_document_current(text_file_path))
+        self.assertEqual(reopened.count(), 1)
+        self.assertEqual([doc.page_content for doc in reopened.as_retriever().invoke("text")],
+                         ["This is a text file content."])
+
+    def test_changed_document_replaces_stale_chunks(self):
+        text_file_path = self.create_text_file("test.txt", "This is a text file content.")
+        store = NumpyVectorStore(self.embeddings, self.persist_directory)
+        store.add_document(FileParser.parse_file(text_file_path))
+        retriever = store.as_retriever()
+
+        self.create_text_file("test.txt", "This is the changed text file content.")
+        store.add_document(FileParser.parse_file(text_file_path))
+        self.assertEqual(store.count(), 1)
+        self.assertEqual([doc.page_content for doc in store.as_retriever().invoke("text")],
+                         ["This is the changed text file content."])
+        self.assertEqual(retriever.invoke("text"), [])
+
+        # Reclaiming half of the rows compacted the persisted files
+        reopened = NumpyVectorStore(self.embeddings, self.persist_directory)
+        self.assertEqual(reopened.generation, 1)
+        self.assertEqual([doc.page_content for doc in reopened.as_retriever().invoke("text")],
+                         ["This is the changed text file content."])
+
+    def test_changed_document_writes_only_changed_chunks(self):
+        text_file_path = self.create_text_file("test.txt", "One two three four five six seven eight. "
+                                                           "Nine ten eleven twelve thirteen fourteen fifteen sixteen.")
+        embeddings = CountingEmbeddings(size=16, embedded=[])
+        store = NumpyVectorStore(embeddings, chunk_tokens=8, chunk_overlap_tokens=0)
+        store.defer_reclaim = True
+        store.add_document(FileParser.parse_file(text_file_path))
+        store.publish()
+        first_ids = store.manifest.get_ids(text_file_path)
+
+        self.create_text_file("test.txt", "One two three four five six seven eight. "
+                                          "Nine ten eleven twelve thirteen fourteen fifteen seventeen.")
+        embeddings.embedded.clear()
+        store.add_document(FileParser.parse_file(text_file_path))
+        superseded_ids = store.publish()
+        self.assertEqual(embeddings.embedded, ["Nine ten eleven twelve thirteen fourteen fifteen seventeen."])
+        self.assertEqual(store.manifest.get_ids(text_file_path)[0], first_ids[0])
+        self.assertEqual(superseded_ids, first_ids[1:])
+
+        # Changing the chunk back writes it again, although its first copy is not reclaimed yet
+        self.create_text_file("test.txt", "One two three four five six seven eight. "
+                                          "Nine ten eleven twelve thirteen fourteen fifteen sixteen.")
+        store.add_document(FileParser.parse_file(text_file_path))
+        store.reclaim(superseded_ids + store.publish())
+        self.assertEqual(store.count(), 2)
+        self.assertEqual(sorted(doc.page_content for doc in store.as_retriever().invoke("sixteen")),
+                         ["Nine ten eleven twelve thirteen fourteen fifteen sixteen.",
+                          "One two three four five six seven eight."])
+
+    def test_superseded_chunks_are_reclaimed_on_reopen(self):
+        text_file_path = self.create_text_file("test.txt", "This is a text file content.")
+        store = NumpyVectorStore(self.embeddings, self.persist_directory)
+        store.defer_reclaim = True
+        store.add_document(FileParser.parse_file(text_file_path))
+        self.create_text_file("test.txt", "This is the changed text file content.")
+        store.add_document(FileParser.parse_file(text_file_path))
+        self.assertEqual(len(store.publish()), 1)
+
+        reopened = NumpyVectorStore(self.embeddings, self.persist_directory)
+        self.assertEqual(reopened.count(), 1)
+        self.assertEqual(reopened._reclaimed, 1)
+        self.assertEqual([doc.page_content for doc in reopened.keyword_search("text", 4, reopened.published_epoch)],
+                         ["This is the changed text file content."])
+        self.assertEqual(reopened.keyword_index.count(), 1)
+
+    def test_deleted_document_is_removed_by_id(self):
+        text_file_path = self.create_text_file("test.txt", "This is a text file content.")
+        store = NumpyVectorStore(self.embeddings, self.persist_directory)
+        store.add_document(FileParser.parse_file(text_file_path))
+
+        self.assertTrue(store.delete_document(IngestManifest.document_id(text_file_path)))
+        self.assertEqual(store.count(), 0)
+        self.assertEqual(store.as_retriever().invoke("text"), [])
+        reopened = NumpyVectorStore(self.embeddings, self.persist_directory)
+        self.assertEqual(reopened.count(), 0)
+        self.assertFalse(reopened.is_document_current(text_file_path))
+
+    def test_failed_write_keeps_stored_chunks(self):
+        embeddings = FailingEmbeddings(size=16)
+        text_file_path = self.create_text_file("test.txt", "Revenue was 10 million in 4Q23.")
+        store = NumpyVectorStore(embeddings, self.persist_directory)
+        store.defer_reclaim = True
+        store.add_document(FileParser.parse_file(text_file_path))
+        store.publish()
+        stored_ids = store.manifest.get_ids(text_file_path)
+
+        # A file streamed in slices fails on its second slice, after the first was written
+        self.create_text_file("test.txt", "Revenue was 12 million in 1Q24.")
+        first_slice = FileParser.parse_file(text_file_path)
+        first_slice.data.update(complete=False)
+        store.add_documents([first_slice])
+        embeddings.fail = True
+        second_slice = TextInputFile(name="test.txt", path=text_file_path, pages=["Revenue fell in 2Q24."])
+        second_slice.data.update(page_offset=1)
+        with self.assertRaises(ValueError):
+            store.add_documents([second_slice])
+        store.abort_pending()
+        embeddings.fail = False
+        store.add_document(TextInputFile(name="other.txt", path="other.txt", pages=["Another document."]))
+        store.reclaim(store.publish())
+
+        self.assertEqual(store.manifest.get_ids(text_file_path), stored_ids)
+        self.assertEqual([doc.page_content for doc in store.keyword_search("revenue", 4, store.published_epoch)],
+                         ["Revenue was 10 million in 4Q23."])
+        self.assertEqual(store.count(), 2)
+
+    def test_detached_files_survive_reopen(self):
+        text_file_path = self.create_text_file("test.txt", "This is a text file content.")
+        store = NumpyVectorStore(self.embeddings, self.persist_directory)
+        store.add_document(FileParser.parse_file(text_file_path))
+        store.manifest.detach(text_file_path)
+
+        reopened = NumpyVectorStore(self.embeddings, self.persist_directory)
+        self.assertTrue(reopened.manifest.is_detached(text_file_path))
+        self.assertTrue(reopened.is_document_current(text_file_path))
+        reopened.manifest.attach(text_file_path)
+        self.assertFalse(NumpyVectorStore(self.embeddings, self.persist_directory).manifest.is_detached(text_file_path))
+
+    def test_document_in_memory_is_tracked_by_content_hash(self):
+        content = b"This is an uploaded text file."
+        content_hash = IngestManifest.hash_content(content)
+        upload_path = os.path.join(self.test_directory, "uploads", "upload.txt")
+        input_file = FileParser.parse_file(content, upload_path)
+        input_file.data["content_hash"] = content_hash
+
+        store = NumpyVectorStore(self.embeddings, self.persist_directory)
+        self.assertFalse(store.is_document_current(upload_path, content_hash))
+        store.add_document(input_file)
+        self.assertTrue(store.is_document_current(upload_path, content_hash))
+        self.assertFalse(store.is_document_current(upload_path, IngestManifest.hash_content(b"Changed.")))
+
+        reopened = NumpyVectorStore(self.embeddings, self.persist_directory)
+        self.assertTrue(reopened.is_document_current(upload_path, content_hash))
+        self.assertTrue(reopened.delete_document(IngestManifest.document_id(upload_path)))
+        self.assertEqual(reopened.count(), 0)
+
+    def test_keyword_index_follows_changed_documents(self):
+        text_file_path = self.create_text_file("test.txt", "Revenue was 10 million in 4Q23.")
+        store = NumpyVectorStore(self.embeddings, self.persist_directory)
+        store.add_document(FileParser.parse_file(text_file_path))
+        self.create_text_file("test.txt", "Revenue was 12 million in 1Q24.")
+        store.add_document(FileParser.parse_file(text_file_path))
+
+        for opened in (store, NumpyVectorStore(self.embeddings, self.persist_directory)):
+            self.assertEqual(opened.keyword_search("4Q23", 4, opened.published_epoch), [])
+            self.assertEqual([doc.page_content for doc in opened.keyword_search("revenue", 4, opened.published_epoch)],
+                             ["Revenue was 12 million in 1Q24."])
+
+    def test_partly_written_rows_are_dropped_on_reopen(self):
+        store = NumpyVectorStore(self.embeddings, self.persist_directory)
+        store.add_document(TextInputFile(name="a.txt", path="a.txt", pages=["First page.", "Second page."]))
+        with open(os.path.join(self.persist_directory, "vectors-0.f32"), "ab") as file:
+            file.write(b"\0" * 16 * 4)
+        with open(os.path.join(self.persist_directory, "chunks-0.jsonl"), "a") as file:
+            file.write('{"id": "partial"')
+
+        reopened = NumpyVectorStore(self.embeddings, self.persist_directory)
+        self.assertEqual(reopened.count(), 2)
+        reopened.add_document(TextInputFile(name="b.txt", path="b.txt", pages=["Third page."]))
+        self.assertEqual(NumpyVectorStore(self.embeddings, self.persist_directory).count(), 3)
+
+
+class TestHnswVectorStore(unittest.TestCase):
+    def setUp(self):
+        self.test_directory = tempfile.mkdtemp()
+        self.persist_directory = os.path.join(self.test_directory, "vector_store")
+        self.embeddings = SerializedEmbeddings(size=16)
+        self.pages = ["Page number {}.".format(page_number) for page_number in range(50)]
+
+    def tearDown(self):
+        if os.path.exists(self.test_directory):
+            shutil.rmtree(self.test_directory)
+
+    def test_graph_search_matches_exact_search(self):
+        store = HnswVectorStore(self.embeddings)
+        store.add_document(TextInputFile(name="pages.txt", path="pages.txt", pages=self.pages))
+        exact = NumpyVectorStore(self.embeddings)
+        exact.add_document(TextInputFile(name="pages.txt", path="pages.txt", pages=self.pages))
+
+        for query in ("Page number 7.", "Page number 31."):
+            self.assertEqual([doc.page_content for doc in store.as_retriever().invoke(query)],
+                             [doc.page_content for doc in exact.as_retriever().invoke(query)])
+
+    def test_batched_graph_search_matches_single_searches(self):
+        store = HnswVectorStore(self.embeddings)
+        store.add_document(TextInputFile(name="pages.txt", path="pages.txt", pages=self.pages))
+        queries = ["Page number 7.", "Page number 31.", "Page number 45."]
+
+        self.assertEqual(store.search_many(queries, 4, store.published_epoch),
+                         [store.search(query, 4, store.published_epoch) for query in queries])
+        chunk_filter = ChunkFilter(titles=("pages.txt",), last_page=20)
+        self.assertEqual(store.search_many(queries, 4, store.published_epoch, chunk_filter),
+                         [store.search(query, 4, store.published_epoch, chunk_filter) for query in queries])
+
+    def test_rows_added_after_the_graph_was_saved_are_inserted_on_reopen(self):
+        store = HnswVectorStore(self.embeddings, self.persist_directory, index_save_rows=30)
+        store.add_document(TextInputFile(name="a.txt", path="a.txt", pages=self.pages[:40]))
+        store.add_document(TextInputFile(name="b.txt", path="b.txt", pages=self.pages[40:]))
+        self.assertEqual(store._saved_rows, 40)
+
+        reopened = HnswVectorStore(self.embeddings, self.persist_directory, index_save_rows=30)
+        self.assertEqual(reopened.count(), 50)
+        self.assertEqual(reopened.as_retriever().invoke("Page number 45.")[0].page_content, "Page number 45.")
+
+    def test_graph_grows_into_a_copy(self):
+        store = HnswVectorStore(self.embeddings, hnsw_ef_search=8)
+        store.add_document(TextInputFile(name="pages.txt", path="pages.txt", pages=self.pages))
+        rows, graph = store._indexed
+
+        pages = ["Extra page {}.".format(page_number) for page_number in range(HnswVectorStore.MIN_CAPACITY)]
+        store.add_document(TextInputFile(name="extra.txt", path="extra.txt", pages=pages))
+        # A search still holding the old graph is not disturbed by the resize
+        self.assertIsNot(store._indexed[1], graph)
+        self.assertEqual(graph.get_max_elements(), HnswVectorStore.MIN_CAPACITY)
+        self.assertEqual(store.graph_search(rows, graph, np.asarray([rows.vectors[7]]), 4, store.published_epoch,
+                                            num_threads=1)[0][0].page_content, "Page number 7.")
+        # More rows than the graph's ef are returned without changing it
+        self.assertEqual(len(store.search("Extra page 7.", 40, store.published_epoch)), 40)
+        self.assertEqual(store._graph.ef, 8)
+
+    def test_reclaimed_chunks_are_not_retrieved(self):
+        text_file_path = os.path.join(self.test_directory, "test.txt")
+        with open(text_file_path, "w") as file:
+            file.write("This is a text file content.")
+        store = HnswVectorStore(self.embeddings, self.persist_directory)
+        store.add_document(TextInputFile(name="pages.txt", path="pages.txt", pages=self.pages))
+        store.add_document(FileParser.parse_file(text_file_path))
+
+        with open(text_file_path, "w") as file:
+            file.write("This is the changed text file content.")
+        store.add_document(FileParser.parse_file(text_file_path))
+        retriever = store.as_retriever()
+        self.assertEqual(retriever.invoke("This is the changed text file content.")[0].page_content,
+                         "This is the changed text file content.")
+        self.assertNotIn("This is a text file content.",
+                         [doc.page_content for doc in retriever.invoke("This is a text file content.")])
+
+
+class TestKeywordIndex(unittest.TestCase):
+    def setUp(self):
+        self.test_directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        if os.path.exists(self.test_directory):
+            shutil.rmtree(self.test_directory)
+
+    def test_rare_terms_rank_first(self):
+        index = KeywordIndex()
+        index.add(["a", "b", "c"], ["Apple filed an 8-K in 4Q23.", "Apple revenue grew.", "Apple orchard report."])
+        hits = index.search("What did the apple 8-K say?", 3)
+        self.assertEqual(len(hits), 3)
+        self.assertEqual(hits[0][0], "a")
+        self.assertGreater(hits[0][1], 2 * hits[1][1])
+        self.assertEqual(KeywordIndex.tokenize("The 8-K for FY2023 reported $3.5 billion."),
+                         ["8-k", "fy2023", "reported", "3.5", "billion"])
+
+    def test_segments_are_merged_without_removed_chunks(self):
+        index = KeywordIndex()
+        for number in range(16):
+            index.add(["chunk-{}".format(number)], ["Shared term and unique term{}.".format(number)])
+        index.remove(["chunk-3"])
+        self.assertLess(len(index._segments), 5)
+        self.assertEqual(index.count(), 15)
+        self.assertEqual(index.search("term3", 4), [])
+        self.assertEqual(index.search("term7", 4)[0][0], "chunk-7")
+
+    def test_persisted_index_is_synced_on_reopen(self):
+        index = KeywordIndex(self.test_directory)
+        index.add(["a", "b"], ["First chunk about bonds.", "Second chunk about stocks."])
+        index.remove(["a"])
+
+        reopened = KeywordIndex(self.test_directory)
+        reopened.sync(["b", "c"], lambda ids: ["Third chunk about bonds." for _ in ids])
+        self.assertEqual([chunk_id for chunk_id, _ in reopened.search("bonds", 4)], ["c"])
+        self.assertEqual(KeywordIndex(self.test_directory).count(), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()